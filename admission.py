@@ -0,0 +1,278 @@
+"""
+Admission control in front of the Gemini quota
+
+Every chat message can fan out to three Gemini calls (classification, query
+optimisation and the answer), and Streamlit runs every session as a thread of the
+same process. Without coordination a burst of users spends the quota at once and
+every in-flight request fails together.
+
+Gemini calls that miss the response cache take a token from one process-wide
+bucket refilled at GEMINI_RPM per minute. Callers wait for a token in a bounded
+queue that is served least-recently-served session first, so one busy session
+cannot starve the others. A call is shed with Overloaded when the queue is full
+or its wait would exceed ADMISSION_MAX_WAIT; callers then fall back to a local
+or extractive answer. Each session is also limited to SESSION_RATE_LIMIT
+messages per minute before any of its calls are queued.
+
+GEMINI_RPM is the budget of one process; divide the account quota between
+processes when running several.
+"""
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from config import (
+    ADMISSION_CONTROL,
+    GEMINI_RPM,
+    ADMISSION_BURST,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_WAIT,
+    SESSION_RATE_LIMIT
+)
+
+DEFAULT_SESSION = "default"
+
+# A session's rate-limit bucket and fairness record are dropped after this long
+# without a message or call; an idle session's bucket would be full again anyway
+SESSION_IDLE_SECONDS = 600.0
+IDLE_SWEEP_INTERVAL = 60.0
+
+
+class Overloaded(Exception):
+    """Raised when a call cannot be admitted within the queue and wait limits"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate tokens per second; not thread-safe"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        """Add the tokens accrued since the last refill"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        """Take one token if one is available"""
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Seconds until the given number of tokens will have accrued"""
+        self.refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+
+# The session and queue-status callback of the request running in this thread
+_session: ContextVar[str] = ContextVar("admission_session", default=DEFAULT_SESSION)
+_on_wait: ContextVar[Optional[Callable[[int, float], None]]] = ContextVar("admission_on_wait", default=None)
+
+
+@contextmanager
+def session(session_id: str, on_wait: Optional[Callable[[int, float], None]] = None):
+    """
+    Attribute the Gemini calls made inside the block to session_id
+
+    on_wait(position, eta_seconds) is called while a call waits in the queue, and
+    with position 0 once it is admitted or shed.
+    """
+    session_token = _session.set(session_id)
+    on_wait_token = _on_wait.set(on_wait)
+    try:
+        yield
+    finally:
+        _session.reset(session_token)
+        _on_wait.reset(on_wait_token)
+
+
+@contextmanager
+def quiet():
+    """
+    Drop the queue-status callback inside the block, keeping the session
+
+    For work copied into worker threads: the callback usually draws to the
+    Streamlit page, which only the request's own thread may do.
+    """
+    token = _on_wait.set(None)
+    try:
+        yield
+    finally:
+        _on_wait.reset(token)
+
+
+class AdmissionController:
+    """Process-wide token bucket with a fair, bounded wait queue and per-session rate limits"""
+
+    def __init__(self, rate_per_minute: float = GEMINI_RPM, burst: int = ADMISSION_BURST,
+                 max_queue: int = ADMISSION_MAX_QUEUE, max_wait: float = ADMISSION_MAX_WAIT,
+                 session_rate_per_minute: float = SESSION_RATE_LIMIT):
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.session_rate = session_rate_per_minute / 60.0
+        self.session_burst = max(1.0, min(float(burst), session_rate_per_minute))
+
+        self._condition = threading.Condition()
+        self._arrivals = itertools.count()
+        self._waiters = []
+        self._last_served = {}
+        self._session_buckets = {}
+        self._last_seen = {}
+        self._last_sweep = time.monotonic()
+        self._stats = {"admitted": 0, "queued": 0, "shed": 0, "rate_limited": 0, "wait": 0.0}
+
+    def _queue_order(self):
+        """Waiters in service order: least recently served session first, then arrival"""
+        return sorted(self._waiters, key=lambda waiter: (self._last_served.get(waiter[0], -1), waiter[1]))
+
+    def _eta(self, position: int) -> float:
+        """Seconds until the waiter at the given 1-based position is expected to be admitted"""
+        return self.bucket.wait_time(position)
+
+    def check_session(self, session_id: str):
+        """Count one message against the session's rate limit; raises Overloaded when exceeded"""
+        with self._condition:
+            self._touch(session_id)
+            bucket = self._session_buckets.get(session_id)
+            if bucket is None:
+                bucket = self._session_buckets[session_id] = TokenBucket(self.session_rate, self.session_burst)
+            if not bucket.take():
+                self._stats["rate_limited"] += 1
+                retry_after = bucket.wait_time()
+                raise Overloaded(
+                    f"You are sending questions too quickly. Please wait {retry_after:.0f} seconds.", retry_after
+                )
+
+    def acquire(self, session_id: Optional[str] = None, on_wait: Optional[Callable[[int, float], None]] = None):
+        """
+        Wait for a quota token on behalf of a session
+
+        Raises:
+            Overloaded: when the queue is full or the expected wait exceeds max_wait
+        """
+        session_id = session_id or _session.get()
+        on_wait = on_wait or _on_wait.get()
+
+        waiter = None
+        reported = None
+        try:
+            while True:
+                # on_wait runs outside the lock, so a slow callback cannot hold up the queue
+                with self._condition:
+                    if waiter is None:
+                        self._touch(session_id)
+                        if not self._waiters and self.bucket.take():
+                            self._admit(session_id, 0.0)
+                            return
+
+                        if len(self._waiters) >= self.max_queue:
+                            self._stats["shed"] += 1
+                            raise Overloaded("The assistant is at capacity.", self._eta(len(self._waiters) + 1))
+                        eta = self._eta(len(self._waiters) + 1)
+                        if eta > self.max_wait:
+                            self._stats["shed"] += 1
+                            raise Overloaded("The assistant is at capacity.", eta)
+
+                        waiter = (session_id, next(self._arrivals))
+                        self._waiters.append(waiter)
+                        self._stats["queued"] += 1
+                        start = time.monotonic()
+
+                    order = self._queue_order()
+                    position = order.index(waiter) + 1
+                    if position == 1 and self.bucket.take():
+                        self._waiters.remove(waiter)
+                        self._admit(session_id, time.monotonic() - start)
+                        self._condition.notify_all()
+                        return
+
+                    waited = time.monotonic() - start
+                    if waited > self.max_wait:
+                        self._waiters.remove(waiter)
+                        self._stats["shed"] += 1
+                        self._condition.notify_all()
+                        raise Overloaded("The assistant is at capacity.", self._eta(position))
+
+                    eta = self._eta(position)
+                    if not on_wait or position == reported:
+                        # Wake when the head's token accrues, or earlier if the queue changes
+                        self._condition.wait(timeout=max(0.01, min(self.bucket.wait_time(), self.max_wait - waited)))
+                        continue
+                    reported = position
+                on_wait(position, eta)
+        finally:
+            if on_wait and reported is not None:
+                on_wait(0, 0.0)
+
+    def _touch(self, session_id: str):
+        """Note activity of a session and, now and then, forget idle ones; the caller holds the condition"""
+        now = time.monotonic()
+        self._last_seen[session_id] = now
+        if now - self._last_sweep < IDLE_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        waiting = {waiter[0] for waiter in self._waiters}
+        for idle in [sid for sid, seen in self._last_seen.items()
+                     if now - seen > SESSION_IDLE_SECONDS and sid not in waiting]:
+            del self._last_seen[idle]
+            self._last_served.pop(idle, None)
+            self._session_buckets.pop(idle, None)
+
+    def _admit(self, session_id: str, waited: float):
+        """Record an admitted call; the caller holds the condition"""
+        self._last_served[session_id] = next(self._arrivals)
+        self._stats["admitted"] += 1
+        self._stats["wait"] += waited
+
+    def queue_position(self, session_id: str) -> Optional[Dict]:
+        """The session's earliest place in the queue and its ETA, or None when it is not waiting"""
+        with self._condition:
+            for position, waiter in enumerate(self._queue_order(), 1):
+                if waiter[0] == session_id:
+                    return {"position": position, "eta": self._eta(position)}
+        return None
+
+    def snapshot(self) -> Dict:
+        """Current queue length and tokens, and admission counters since start"""
+        with self._condition:
+            self.bucket.refill()
+            queued = self._stats["queued"]
+            return {
+                "queue": len(self._waiters),
+                "max_queue": self.max_queue,
+                "tokens": self.bucket.tokens,
+                "rate_per_minute": self.bucket.rate * 60,
+                "admitted": self._stats["admitted"],
+                "shed": self._stats["shed"],
+                "rate_limited": self._stats["rate_limited"],
+                "avg_wait": self._stats["wait"] / queued if queued else 0.0
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Return the process-wide admission controller; None when ADMISSION_CONTROL is off"""
+    global _controller
+    if not ADMISSION_CONTROL:
+        return None
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+    return _controller
@@ -0,0 +1,147 @@
+"""
+Normalisation of the editorial amendment markers in the statute markdown
+
+The converted PPC carries the amendment markers of the printed code:
+
+    40[three thousand rupees] 40     text substituted or inserted by amendment 40
+    5[] 5, [ ] 8                     text omitted by amendment 5 or 8
+    7[ ... ]7                        a whole section inserted, across many lines
+    [^16] ... [^16]: Reference note  footnote references and their notes
+
+Left in place they end up verbatim in chunks, BM25 postings and embeddings.
+normalize_amendments() strips them, keeping the amended text, and returns each
+marker as structured metadata with its span in the cleaned text, so parsing can
+attach the amendments to the sections they touch.
+"""
+import re
+from typing import List, Dict, Tuple
+
+# Placeholder left where a marker was removed until the final pass computes offsets
+PLACEHOLDER = re.compile(r'\x00(\d+)\x00')
+
+FOOTNOTE_DEFINITION = re.compile(r'^[ \t]*\[\^(\d+)\]:[ \t]*(.*?)[ \t]*(?:\n|$)', re.M)
+# "[^16]", "24[^24]" and the unclosed "[^129 " that runs into the text it annotates
+FOOTNOTE_REFERENCE = re.compile(r'(?:(?<![\w\]])\d+)?\[\^(\d+)(?:\]|[ \t])')
+
+# "N[ ... ] N" whose body holds no other opening marker, so nested markers resolve inside out
+AMENDMENT = re.compile(r'(?<![\w\]\x00])(\d+)[ \t]*\[((?:(?!\d+[ \t]*\[)[^\]])*?)\][ \t]*\1(?!\d)', re.S)
+# "[74][] 74" and "[122] [] [122]", the numbers written in brackets
+BRACKETED_AMENDMENT = re.compile(r'\[(\d+)\][ \t]*\[([^\[\]]*)\][ \t]*\[?\1\]?(?!\d)')
+# "2[or ideology]" whose closing number was lost
+UNCLOSED_AMENDMENT = re.compile(r'(?<![\w\]\x00])(\d+)\[([^\[\]\n]+)\](?![ \t]*\d)')
+# "[ ] 8" on a line of its own
+OMISSION_LINE = re.compile(r'^[ \t]*\[[ \t]*\](?:[ \t]*(\d+))?[ \t]*$', re.M)
+# Openers and closers left without a partner by the conversion
+STRAY_OPENER = re.compile(r'(?<![\w\]\x00])(\d+)\[[ \t]*$', re.M)
+STRAY_CLOSER = re.compile(r'^[ \t]*\][ \t]*(\d+)(?:[ \t]*\][ \t]*(\d+))*', re.M)
+
+MAX_AMENDMENT_TEXT = 200
+
+
+def normalize_amendments(text: str) -> Tuple[str, List[Dict]]:
+    """
+    Strip amendment markers and footnote references from the statute text
+
+    Returns:
+        (cleaned text, amendments) where each amendment has the marker number,
+        its kind ("amended", "omitted", "footnote" or "stray"), the amended text or
+        footnote note, and the start/end offsets of the amended text in the
+        cleaned text (equal for markers that keep no text)
+    """
+    amendments = []
+
+    def placeholder(marker: str, kind: str, body: str = "") -> str:
+        amendments.append({'marker': marker, 'kind': kind, 'text': body})
+        return f"\x00{len(amendments) - 1}\x00"
+
+    notes = {}
+
+    def footnote_definition(match):
+        notes[match.group(1)] = match.group(2)
+        return ""
+
+    text = FOOTNOTE_DEFINITION.sub(footnote_definition, text)
+    text = FOOTNOTE_REFERENCE.sub(lambda match: placeholder(match.group(1), 'footnote'), text)
+
+    def amendment(match):
+        marker, body = match.groups()
+        if not body.strip():
+            return placeholder(marker, 'omitted')
+        # A second placeholder with the same id marks where the amended text ends
+        opening = placeholder(marker, 'amended', body)
+        return opening + body + opening
+
+    while True:
+        text, count = AMENDMENT.subn(amendment, text)
+        text, bracketed = BRACKETED_AMENDMENT.subn(amendment, text)
+        if not count + bracketed:
+            break
+    text = UNCLOSED_AMENDMENT.sub(amendment, text)
+
+    text = OMISSION_LINE.sub(lambda match: placeholder(match.group(1) or "", 'omitted'), text)
+    text = STRAY_OPENER.sub(lambda match: placeholder(match.group(1), 'stray'), text)
+    text = STRAY_CLOSER.sub(lambda match: placeholder(match.group(1), 'stray'), text)
+
+    # Final pass: drop the placeholders, record offsets and close the gaps they leave
+    output = []
+    length = 0
+    position = 0
+    opened = set()
+    for match in PLACEHOLDER.finditer(text):
+        piece = text[position:match.start()]
+        if output and output[-1].endswith(' ') and piece.startswith(' '):
+            piece = piece[1:]
+        output.append(piece)
+        length += len(piece)
+        position = match.end()
+
+        index = int(match.group(1))
+        amendment = amendments[index]
+        if index in opened:
+            amendment['end'] = length
+        else:
+            opened.add(index)
+            amendment['start'] = amendment['end'] = length
+    piece = text[position:]
+    if output and output[-1].endswith(' ') and piece.startswith(' '):
+        piece = piece[1:]
+    output.append(piece)
+    cleaned = ''.join(output)
+
+    for amendment in amendments:
+        if amendment['kind'] == 'footnote':
+            amendment['text'] = notes.get(amendment['marker'], "")
+        else:
+            amendment['text'] = PLACEHOLDER.sub('', amendment['text']).strip()
+    return cleaned, amendments
+
+
+def attach_amendments(sections: List[Dict], amendments: List[Dict], text: str):
+    """
+    Add to each section the amendments whose text overlaps it, or whose marker lies in it
+
+    The spans are trimmed of surrounding whitespace first, so a marker that opens on
+    the line before a section heading belongs to that section, not the previous one.
+    """
+    for section in sections:
+        section['amendments'] = []
+
+    starts = [section['start'] for section in sections]
+    for amendment in amendments:
+        start, end = amendment['start'], amendment['end']
+        body = text[start:end]
+        if end > start and body.strip():
+            start += len(body) - len(body.lstrip())
+            end -= len(body) - len(body.rstrip())
+
+        entry = {'marker': amendment['marker'], 'kind': amendment['kind']}
+        if amendment['text']:
+            entry['text'] = (amendment['text'] if len(amendment['text']) <= MAX_AMENDMENT_TEXT
+                             else amendment['text'][:MAX_AMENDMENT_TEXT] + "...")
+
+        for i, section_start in enumerate(starts):
+            section = sections[i]
+            if section_start > end or (section_start == end and end > start):
+                break
+            if (start < section['end'] and end > section_start) or section_start <= start < section['end']:
+                section['amendments'].append(entry)
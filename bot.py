@@ -141,9 +141,16 @@ from weaviate.classes.init import Auth
 from weaviate.classes.config import Configure, Property, DataType
 import os
 import re
+import csv
+import json
+import time
+import argparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer, util
+from llm_cache import generate_content
 
 
 # Load environment variables from .env file
@@ -157,10 +164,18 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-def search_and_generate_response(client, query, collection_name=COLLECTION_NAME):
+
+@lru_cache(maxsize=1)
+def get_sentence_model():
+    """Load the sentence transformer once and share it between calls and threads"""
+    return SentenceTransformer('all-MiniLM-L12-v2')
+
+
+def search_and_generate_response(client, query, collection_name=COLLECTION_NAME, verbose=True):
     """
     Search the vector database and generate a response using Gemini API
     """
+    timings = {}
     try:
         collection = client.collections.get(collection_name)
         
@@ -171,17 +186,22 @@ def search_and_generate_response(client, query, collection_name=COLLECTION_NAME)
         #     return_metadata=["score"]
         # )
 
-        print("DEBUG: Getting Rag optimzed query")
+        if verbose:
+            print("DEBUG: Getting Rag optimzed query")
+        start = time.perf_counter()
         rag_optimized_query = query_parser(query)
-        print("DEBUG: RAG Optimized Query: ", rag_optimized_query)
-
-        print("DEBUG: Getting Chapters from the DB")
+        timings["optimize"] = time.perf_counter() - start
+        if verbose:
+            print("DEBUG: RAG Optimized Query: ", rag_optimized_query)
+            print("DEBUG: Getting Chapters from the DB")
+        start = time.perf_counter()
         response = collection.query.hybrid(
             query=rag_optimized_query,
             alpha=0.6,
             limit=2,
             return_metadata=["score"]
         )
+        timings["search"] = time.perf_counter() - start
         
         relevant_chunks = []
         for obj in response.objects:
@@ -203,9 +223,11 @@ def search_and_generate_response(client, query, collection_name=COLLECTION_NAME)
         
         # Create prompt for Gemini
 
-        print("DEBUG: Getting reranked chunks")
+        if verbose:
+            print("DEBUG: Getting reranked chunks")
         # reranked_context = semantic_reranker(query, relevant_chunks, max_chunks=2, chunk_size=700, overlap=200)
-        print("DEBUG:CONTEXT:"+ context)
+        if verbose:
+            print("DEBUG:CONTEXT:"+ context)
         # print("DEBUG:RERANKED_CONTEXT" + str(reranked_context))
 
         prompt = f"""You are a legal expert specializing in the Pakistan Penal Code. Your task is to analyze the provided sections and answer the user's legal question.
@@ -227,13 +249,16 @@ def search_and_generate_response(client, query, collection_name=COLLECTION_NAME)
         """
 
         # Generate response using Gemini
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        gemini_response = model.generate_content(prompt)
+        start = time.perf_counter()
+        answer = generate_content(prompt, model_name='gemini-2.0-flash')
+        timings["generate"] = time.perf_counter() - start
         
         return {
-            "answer": gemini_response.text,
+            "answer": answer,
             "sources": [chunk["chapter"] for chunk in relevant_chunks],
-            "relevant_chunks": relevant_chunks
+            "relevant_chunks": relevant_chunks,
+            "optimized_query": rag_optimized_query,
+            "timings": timings
         }
         
     except Exception as e:
@@ -284,10 +309,7 @@ def query_parser(query:str):
 
     # Configure and generate content in one go
     # genai.configure(api_key=os.getenv("GEMINI_API_KEY")) 
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    response = model.generate_content(PROMPT)
-
-    return response.text
+    return generate_content(PROMPT, model_name='gemini-2.0-flash')
 
 
 
@@ -306,8 +328,8 @@ def semantic_reranker(query, relevant_chunks, max_chunks, chunk_size, overlap):
         List of semantically filtered chunks with similarity scores
     """
     
-    # Initialize sentence transformer for semantic similarity
-    sentence_model = SentenceTransformer('all-MiniLM-L12-v2')
+    # Shared sentence transformer for semantic similarity
+    sentence_model = get_sentence_model()
     
     all_chunks = []
     
@@ -384,7 +406,159 @@ def interactive_chat(client):
         else:
             print(f"\nError: {result}\n")
 
+def load_questions(input_path):
+    """
+    Yield (question_id, question) pairs from a JSONL or CSV file
+
+    JSONL lines may be plain strings or objects with a "question" field and an
+    optional "id". CSV files need a "question" column and may have an "id" column.
+    Rows without an id are numbered by their position in the file.
+    """
+    with open(input_path, 'r', encoding='utf-8', newline='') as f:
+        if input_path.lower().endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for i, row in enumerate(rows, 1):
+            if isinstance(row, str):
+                row = {"question": row}
+            question = (row.get("question") or "").strip()
+            if question:
+                # An id of 0 or "" is still the row's own id; only a missing one falls back to the row number
+                yield str(row["id"] if row.get("id") is not None else i), question
+
+
+def load_completed_ids(output_path):
+    """Return the ids already answered in an output file so a batch can resume"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A run killed mid-write can leave a partial last line
+                continue
+            # Failed questions are retried on the next run
+            if "error" not in record:
+                completed.add(record["id"])
+    return completed
+
+
+def answer_question(client, question_id, question):
+    """Run one question through the pipeline and build its output record"""
+    start = time.perf_counter()
+    result = search_and_generate_response(client, question, verbose=False)
+    record = {"id": question_id, "question": question}
+
+    if isinstance(result, dict):
+        record.update({
+            "answer": result["answer"],
+            "sources": result["sources"],
+            "optimized_query": result["optimized_query"],
+            "timings": result["timings"]
+        })
+    else:
+        record["error"] = result
+
+    record["elapsed"] = time.perf_counter() - start
+    return record
+
+
+def run_batch(client, input_path, output_path, max_workers=4):
+    """
+    Answer every question in input_path and stream the results to output_path
+
+    Questions already answered in output_path are skipped, so an interrupted run
+    can simply be restarted. At most max_workers questions are in flight at once
+    and all of them share the same Weaviate client and models.
+    """
+    completed = load_completed_ids(output_path)
+    pending_questions = (
+        (question_id, question) for question_id, question in load_questions(input_path)
+        if question_id not in completed
+    )
+
+    if completed:
+        print(f"Resuming: {len(completed)} questions already answered in '{output_path}'")
+
+    # Load the shared model before the workers start racing for it
+    get_sentence_model()
+
+    latencies = []
+    errors = 0
+    batch_start = time.perf_counter()
+
+    with open(output_path, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+
+        def submit_next():
+            try:
+                question_id, question = next(pending_questions)
+            except StopIteration:
+                return False
+            in_flight.add(executor.submit(answer_question, client, question_id, question))
+            return True
+
+        # Keep a bounded window of submitted questions instead of queueing the whole file
+        while len(in_flight) < max_workers * 2 and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                record = future.result()
+
+                # Results are written from this thread only, one line per question
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+                latencies.append(record["elapsed"])
+                if "error" in record:
+                    errors += 1
+                    print(f"❌ [{record['id']}] {record['error']}")
+                else:
+                    print(f"✅ [{record['id']}] answered in {record['elapsed']:.2f}s")
+
+                submit_next()
+
+    total_time = time.perf_counter() - batch_start
+    print_batch_summary(latencies, errors, total_time)
+
+
+def print_batch_summary(latencies, errors, total_time):
+    """Print a throughput and latency summary for a batch run"""
+    print("\n" + "="*50)
+    print("Batch Summary")
+    print("="*50)
+
+    if not latencies:
+        print("No new questions to answer.")
+        return
+
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    print(f"Questions processed: {len(latencies)} ({errors} errors)")
+    print(f"Wall time: {total_time:.1f}s")
+    print(f"Throughput: {len(latencies) / total_time:.2f} questions/s")
+    print(f"Latency: mean {sum(latencies) / len(latencies):.2f}s, "
+          f"p50 {p50:.2f}s, p95 {p95:.2f}s, max {ordered[-1]:.2f}s")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pakistan Penal Code AI Assistant")
+    parser.add_argument("--batch", metavar="INPUT", help="JSONL or CSV file of questions to answer")
+    parser.add_argument("--output", default="answers.jsonl", help="JSONL file the batch results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="Number of questions processed concurrently")
+    args = parser.parse_args()
+
     # --- Connect to Weaviate ---
     print("Connecting to Weaviate Cloud...")
     try:
@@ -406,9 +580,12 @@ if __name__ == "__main__":
         client.close()
         exit()
 
-    # --- Start interactive chat ---
+    # --- Start batch run or interactive chat ---
     try:
-        interactive_chat(client)
+        if args.batch:
+            run_batch(client, args.batch, args.output, max_workers=args.workers)
+        else:
+            interactive_chat(client)
     except KeyboardInterrupt:
         print("\nExiting...")
     finally:
@@ -0,0 +1,208 @@
+"""
+Browsing of section ranges and chapters straight from the parsed section index
+
+"Show me sections 299 to 311" or "list all offences in Chapter XVII" are not
+questions: the answer is the statute text itself. Sent through the RAG pipeline
+they cost a Gemini rewrite, a vector search and a generation, and come back cut
+to DEFAULT_SEARCH_LIMIT chunks. Here they are answered from the corpus the other
+local indexes are built from, a page of full sections at a time, with no search
+and no LLM call.
+
+Requests are recognised in chat ("show sections 299 to 311", "/browse chapter
+XVII", "/more" for the next page) and on the command line:
+
+    python browse.py "sections 299 to 311" --page 2
+    python browse.py "chapter XVII" --all
+"""
+import re
+import math
+import argparse
+from typing import List, Dict, Optional, Iterator
+from corpus import load_corpus, normalize_section_id
+from config import BROWSE_PAGE_SIZE
+
+SECTION_ID = r"\d{1,3}(?:\s*-?\s*[a-z]\b)?"
+RANGE_PATTERN = re.compile(
+    rf"\b(?:sections?|secs?\.?|ss\.?)\s*({SECTION_ID})\s*(?:to|through|till|until|-|–)\s*(?:sections?\s*)?({SECTION_ID})",
+    re.I
+)
+# "/browse 302" or "/browse 299-311"
+BROWSE_COMMAND = re.compile(rf"^/browse\s+(?:sections?\s+)?({SECTION_ID})(?:\s*(?:to|through|-|–)\s*({SECTION_ID}))?$", re.I)
+CHAPTER_PATTERN = re.compile(r"\bchapter\s+([ivxl]+|\d{1,2})\b", re.I)
+# A request that starts with one of these is asking for text, not an answer
+BROWSE_VERB = re.compile(
+    r"^\s*(?:/browse\b|(?:please\s+)?(?:list|show|browse|display|print|read|open|give\s+me)\b|what\s+are\s+the\s+(?:sections|offences)\b)",
+    re.I
+)
+# Words allowed between the verb and the range or chapter: "list all offences in chapter XVII"
+FILLER_WORDS = {
+    "me", "us", "all", "the", "whole", "entire", "full", "text", "of", "in", "under", "from",
+    "section", "sections", "offences", "offenses", "provisions"
+}
+TRAILING_PLEASE = re.compile(r"[\s,]+please$", re.I)
+MORE_COMMAND = re.compile(r"^\s*(?:/more|more|next(?:\s+page)?)\s*$", re.I)
+
+ROMAN_NUMERALS = [(50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I")]
+
+
+def to_roman(number: int) -> str:
+    """Chapter number as the Roman numeral the corpus uses"""
+    numeral = ""
+    for value, letters in ROMAN_NUMERALS:
+        while number >= value:
+            numeral += letters
+            number -= value
+    return numeral
+
+
+def section_key(section_id: str, last: bool = False):
+    """Sort key of a section id; with last, an id without a suffix sorts after its lettered sections"""
+    number, _, suffix = section_id.partition('-')
+    return int(number), suffix or ("~" if last else "")
+
+
+def request_target(text: str, verb: Optional[re.Match], pattern: re.Pattern) -> Optional[re.Match]:
+    """
+    pattern's match when the request consists of nothing else
+
+    Without a verb the match must be the whole text; after a browsing verb only
+    filler words may precede it and nothing may follow it.
+    """
+    if verb is None:
+        match = pattern.search(text)
+        return match if match and match.group(0) == text else None
+    remainder = text[verb.end():]
+    match = pattern.search(remainder)
+    if match and not remainder[match.end():].strip() and set(remainder[:match.start()].lower().split()) <= FILLER_WORDS:
+        return match
+    return None
+
+
+def parse_browse_request(query: str) -> Optional[Dict]:
+    """
+    Recognise a request to read a range of sections or a chapter
+
+    The query must be the range or chapter alone, or a browsing verb ("show",
+    "list", "/browse") followed by it and at most a few filler words ("list all
+    offences in Chapter XVII"). Questions that mention sections or chapters
+    ("the punishment for theft under Chapter XVII") still go to the answer pipeline.
+
+    Returns:
+        {"kind": "range", "start", "end"}, {"kind": "chapter", "numeral"} or None
+    """
+    text = TRAILING_PLEASE.sub("", query.strip().rstrip("?.! "))
+    verb = BROWSE_VERB.match(text)
+    match = BROWSE_COMMAND.match(text) or request_target(text, verb, RANGE_PATTERN)
+    if match:
+        start, end = normalize_section_id(match.group(1)), normalize_section_id(match.group(2) or match.group(1))
+        if start and end:
+            if section_key(start) > section_key(end):
+                start, end = end, start
+            return {"kind": "range", "start": start, "end": end}
+
+    match = request_target(text, verb, CHAPTER_PATTERN)
+    if match:
+        numeral = match.group(1).upper()
+        if numeral.isdigit():
+            numeral = to_roman(int(numeral))
+        return {"kind": "chapter", "numeral": numeral}
+    return None
+
+
+def is_more_command(query: str) -> bool:
+    """Whether the message asks for the next page of the last browsing request"""
+    return bool(MORE_COMMAND.match(query))
+
+
+class SectionBrowser:
+    """Page through section ranges and chapters of the corpus"""
+
+    def __init__(self, corpus: Optional[Dict] = None):
+        corpus = corpus or load_corpus()
+        # Sections in document order, each id once (the first occurrence, as in sections_by_id)
+        self.sections = [
+            section for section in corpus['sections'] if corpus['sections_by_id'][section['section_id']] is section
+        ]
+        self.chapters = {chapter['numeral']: chapter for chapter in corpus['chapters']}
+
+    def select(self, request: Dict) -> List[Dict]:
+        """The sections a browsing request covers, in document order"""
+        if request["kind"] == "range":
+            low, high = section_key(request["start"]), section_key(request["end"], last=True)
+            return [section for section in self.sections if low <= section_key(section['section_id']) <= high]
+        chapter = self.chapters.get(request["numeral"])
+        if chapter is None:
+            return []
+        return [section for section in self.sections if section['chapter_title'] == chapter['chapter_title']]
+
+    def describe(self, request: Dict) -> str:
+        if request["kind"] == "range" and request["start"] == request["end"]:
+            return f"Section {request['start']}"
+        if request["kind"] == "range":
+            return f"Sections {request['start']} to {request['end']}"
+        chapter = self.chapters.get(request["numeral"])
+        return f"Chapter {request['numeral']}" + (f": {chapter['name'].title()}" if chapter and chapter['name'] else "")
+
+    def page(self, request: Dict, page: int = 1, page_size: int = BROWSE_PAGE_SIZE) -> Dict:
+        """
+        One page of a browsing request
+
+        Returns:
+            {"title", "sections" on this page, "contents" (every id and title, on the
+             first page of a chapter), "page", "pages", "total"}
+        """
+        sections = self.select(request)
+        pages = max(1, math.ceil(len(sections) / page_size))
+        page = min(max(page, 1), pages)
+        return {
+            "title": self.describe(request),
+            "sections": sections[(page - 1) * page_size:page * page_size],
+            "contents": [(section['section_id'], section['title']) for section in sections]
+                        if request["kind"] == "chapter" and page == 1 else [],
+            "page": page,
+            "pages": pages,
+            "total": len(sections)
+        }
+
+    def stream(self, result: Dict) -> Iterator[str]:
+        """The markdown of a page, one section at a time"""
+        if not result["total"]:
+            yield f"No sections found for {result['title']}."
+            return
+        yield f"**{result['title']}** ({result['total']} sections)\n\n"
+        if result["contents"]:
+            yield "\n".join(f"- **{section_id}.** {title}" for section_id, title in result["contents"]) + "\n\n---\n\n"
+        for section in result["sections"]:
+            yield f"**Section {section['section_id']}. {section['title']}**\n\n{section['content']}\n\n"
+        if result["page"] < result["pages"]:
+            yield f"_Page {result['page']} of {result['pages']}. Type `/more` for the next page._"
+        elif result["pages"] > 1:
+            yield f"_Page {result['page']} of {result['pages']}._"
+
+
+def main():
+    """Print a section range or chapter from the command line"""
+    parser = argparse.ArgumentParser(description="Read a range of sections or a chapter of the PPC")
+    parser.add_argument("request", help='e.g. "sections 299 to 311" or "chapter XVII"')
+    parser.add_argument("--page", type=int, default=1, help="Page to print")
+    parser.add_argument("--all", action="store_true", help="Print every page")
+    args = parser.parse_args()
+
+    request = parse_browse_request(args.request)
+    if request is None:
+        parser.error(f"not a section range or chapter: {args.request!r}")
+
+    browser = SectionBrowser()
+    page = args.page
+    while True:
+        result = browser.page(request, page)
+        for text in browser.stream(result):
+            print(text, end="", flush=True)
+        print()
+        if not args.all or result["page"] == result["pages"]:
+            break
+        page += 1
+
+
+if __name__ == "__main__":
+    main()
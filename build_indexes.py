@@ -0,0 +1,109 @@
+"""
+Build the local indexes derived from ppc.md
+
+Run this after changing ppc.md or re-populating Weaviate so the local lookups
+used at query time match the uploaded collection.
+
+Every build goes into a new, immutable snapshot under index/snapshots/ and is
+published atomically when it is complete (see snapshots.py). Serving processes
+switch to it on their next request; `python snapshots.py rollback` switches back.
+
+Section digests are carried over from the published snapshot for every section
+whose text is unchanged; pass --digests to generate the missing ones with Gemini.
+"""
+import time
+import argparse
+from sentence_transformers import SentenceTransformer
+from corpus import load_corpus
+from chapter_router import build_router_index
+from cross_references import save_cross_reference_graph
+from definitions import save_definitions_index
+from punishments import save_punishment_table
+from corpus_artifact import build_corpus_artifact
+from lexical_index import save_lexical_index
+from vector_store import save_vector_store
+from thesaurus import save_thesaurus
+from spelling import save_spelling_index
+from section_digests import save_section_digests, SectionDigests
+from snapshots import create_snapshot, finish_snapshot, activate, snapshot_dir, artifact_path, pinned
+from config import PPC_FILE_PATH, SENTENCE_TRANSFORMER_MODEL
+
+
+def build(index_dir: str, digests: bool = False):
+    """Parse the corpus once and build every local index from it into index_dir"""
+    start = time.perf_counter()
+    corpus = load_corpus(PPC_FILE_PATH)
+    amendments = sum(len(section['amendments']) for section in corpus['sections'])
+    print(f"📄 Parsed {PPC_FILE_PATH}: {len(corpus['chapters'])} chapters, {len(corpus['sections'])} sections, "
+          f"{amendments} amendment markers normalised")
+
+    print("🔗 Extracting section cross-references...")
+    print(f"✅ {save_cross_reference_graph(index_dir)}")
+
+    print("📖 Compiling Chapter II definitions automaton...")
+    print(f"✅ {save_definitions_index(index_dir)}")
+
+    print("🔎 Building FTS5 lexical index...")
+    print(f"✅ {save_lexical_index(index_dir)}")
+
+    print("📚 Compiling legal thesaurus...")
+    print(f"✅ {save_thesaurus(index_dir)}")
+
+    print("🔤 Building spelling correction index...")
+    print(f"✅ {save_spelling_index(index_dir)}")
+
+    print("⚖️ Extracting punishment table...")
+    print(f"✅ {save_punishment_table(index_dir)}")
+
+    print("📝 Generating section digests..." if digests else "📝 Carrying over unchanged section digests...")
+    print(f"✅ {save_section_digests(index_dir, generate=digests)}")
+    stats = SectionDigests(index_dir).stats()
+    print(f"   {stats['sections']} sections digested: ~{stats['full_tokens']} tokens in full, "
+          f"~{stats['digest_tokens']} as digests")
+
+    print(f"🧠 Loading sentence transformer '{SENTENCE_TRANSFORMER_MODEL}'...")
+    sentence_model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+
+    print("📦 Compiling corpus artifact with chunk embeddings...")
+    print(f"✅ {build_corpus_artifact(PPC_FILE_PATH, sentence_model, artifact_path(index_dir))}")
+
+    print("🗜️ Quantizing chunk embeddings (int8 and binary)...")
+    print(f"✅ {save_vector_store(index_dir, artifact_path(index_dir))}")
+
+    print("🧭 Building chapter router centroids...")
+    print(f"✅ {build_router_index(sentence_model, index_dir)}")
+
+    print(f"\n🎉 Indexes built in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local indexes into a new snapshot and publish it")
+    parser.add_argument("--collection", help="Weaviate collection this snapshot serves (default: COLLECTION_NAME)")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="Build the snapshot without publishing it; publish later with snapshots.py")
+    parser.add_argument("--digests", action="store_true",
+                        help="Generate digests for long sections that have none with Gemini")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("Pakistan Penal Code - Local Index Build")
+    print("="*60)
+
+    version = create_snapshot(PPC_FILE_PATH)
+    print(f"📸 Building snapshot {version}")
+
+    # Everything, including the corpus the indexes are built from, targets the new snapshot
+    with pinned(snapshot_dir(version)) as index_dir:
+        build(index_dir, args.digests)
+    finish_snapshot(version, PPC_FILE_PATH, args.collection)
+
+    if args.no_activate:
+        print(f"⏸️  Snapshot {version} built; publish it with: python snapshots.py activate {version}")
+    else:
+        pointer = activate(version)
+        print(f"✅ Published snapshot {version}" +
+              (f" (roll back with: python snapshots.py rollback → {pointer['previous']})" if pointer["previous"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Local chapter router that maps queries to the most likely PPC chapters
+
+The router combines a lexicon built from the chapter, group and section headings
+in ppc.md with precomputed chapter centroid embeddings. Routing a query is a
+handful of dictionary lookups plus a 23-row dot product, so it replaces the
+chapter list that used to be pasted into every query optimization prompt and
+lets retrieval filter on chapter_title.
+"""
+import os
+import re
+import math
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from corpus import load_corpus, tokenize, chapter_display_name, normalize_section_id
+from config import INDEX_DIR, ROUTER_TOP_K, ROUTER_MIN_SCORE, SENTENCE_TRANSFORMER_MODEL
+
+ROUTER_INDEX_FILE = "chapter_router.npz"
+
+# Weight of the embedding similarity relative to the lexical score
+CENTROID_WEIGHT = 0.5
+
+# Characters of section text used alongside the heading when embedding a section
+SECTION_EMBED_CHARS = 600
+
+# Score added to the chapter of a section the query names explicitly
+SECTION_MENTION_SCORE = 2.0
+
+SECTION_MENTION_PATTERN = re.compile(r'\b(?:section|sec\.?|s\.)\s*(\d+(?:\s*-?\s*[a-z])?)\b', re.I)
+
+
+def build_lexicon(corpus: Dict) -> Dict[str, Dict[str, float]]:
+    """
+    Build a term -> {chapter_title: weight} lexicon from the headings in ppc.md
+
+    Chapter names count three times, group headings twice and section titles once,
+    and every weight is scaled by the term's inverse chapter frequency.
+    """
+    counts = defaultdict(lambda: defaultdict(float))
+
+    for chapter in corpus['chapters']:
+        for token in tokenize(chapter['name']):
+            counts[token][chapter['chapter_title']] += 3.0
+
+    seen_groups = set()
+    for section in corpus['sections']:
+        chapter_title = section['chapter_title']
+        for token in tokenize(section['title']):
+            counts[token][chapter_title] += 1.0
+        if section['group'] and (chapter_title, section['group']) not in seen_groups:
+            seen_groups.add((chapter_title, section['group']))
+            for token in tokenize(section['group']):
+                counts[token][chapter_title] += 2.0
+
+    num_chapters = len(corpus['chapters'])
+    lexicon = {}
+    for token, chapter_counts in counts.items():
+        idf = math.log(1 + num_chapters / len(chapter_counts))
+        lexicon[token] = {
+            chapter_title: (1 + math.log(count)) * idf
+            for chapter_title, count in chapter_counts.items()
+        }
+    return lexicon
+
+
+def build_centroids(corpus: Dict, sentence_model) -> np.ndarray:
+    """Embed every section heading and opening text and average them per chapter"""
+    texts = [
+        f"{section['title']}. {section['content'][:SECTION_EMBED_CHARS]}"
+        for section in corpus['sections']
+    ]
+    embeddings = sentence_model.encode(texts, normalize_embeddings=True, show_progress_bar=True)
+
+    chapter_index = {chapter['chapter_title']: i for i, chapter in enumerate(corpus['chapters'])}
+    centroids = np.zeros((len(chapter_index), embeddings.shape[1]), dtype=np.float32)
+    for section, embedding in zip(corpus['sections'], embeddings):
+        centroids[chapter_index[section['chapter_title']]] += embedding
+
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    return centroids / np.maximum(norms, 1e-12)
+
+
+def build_router_index(sentence_model=None, index_dir: str = INDEX_DIR) -> str:
+    """Precompute the chapter centroids and save them to the index directory"""
+    if sentence_model is None:
+        from sentence_transformers import SentenceTransformer
+        sentence_model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+
+    corpus = load_corpus()
+    centroids = build_centroids(corpus, sentence_model)
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, ROUTER_INDEX_FILE)
+    np.savez(
+        path,
+        centroids=centroids,
+        chapter_titles=np.array([chapter['chapter_title'] for chapter in corpus['chapters']])
+    )
+    return path
+
+
+class ChapterRouter:
+    """Pick the top-k chapters for a query without calling an LLM"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        corpus = load_corpus()
+        self.chapters = corpus['chapters']
+        self.chapter_titles = [chapter['chapter_title'] for chapter in self.chapters]
+        self.display_names = {
+            chapter['chapter_title']: chapter_display_name(chapter) for chapter in self.chapters
+        }
+        self.lexicon = build_lexicon(corpus)
+        self.section_chapters = {
+            section_id: section['chapter_title'] for section_id, section in corpus['sections_by_id'].items()
+        }
+        self.max_idf = math.log(1 + len(self.chapters))
+
+        # Centroids are optional; without them routing is purely lexical
+        self.centroids = None
+        path = os.path.join(index_dir, ROUTER_INDEX_FILE)
+        if os.path.exists(path):
+            data = np.load(path)
+            if list(data['chapter_titles']) == self.chapter_titles:
+                self.centroids = data['centroids']
+
+    def score(self, query: str, query_embedding=None) -> Dict[str, float]:
+        """Score every chapter for the query"""
+        scores = defaultdict(float)
+        tokens = tokenize(query)
+
+        for token in tokens:
+            for chapter_title, weight in self.lexicon.get(token, {}).items():
+                scores[chapter_title] += weight
+
+        # Scale by the largest possible idf so one chapter-specific term scores about 1
+        for chapter_title in scores:
+            scores[chapter_title] /= self.max_idf
+
+        for mention in SECTION_MENTION_PATTERN.findall(query):
+            chapter_title = self.section_chapters.get(normalize_section_id(mention) or "")
+            if chapter_title:
+                scores[chapter_title] += SECTION_MENTION_SCORE
+
+        if self.centroids is not None and query_embedding is not None:
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+            similarities = self.centroids @ query_vector
+            for chapter_title, similarity in zip(self.chapter_titles, similarities):
+                scores[chapter_title] += CENTROID_WEIGHT * float(similarity)
+
+        return scores
+
+    def route(self, query: str, query_embedding=None, top_k: int = ROUTER_TOP_K,
+              min_score: float = ROUTER_MIN_SCORE) -> List[Tuple[str, float]]:
+        """
+        Return the top-k (chapter_title, score) pairs for a query
+
+        An empty list means the router is not confident and the caller should
+        search every chapter.
+        """
+        scores = self.score(query, query_embedding)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        if not ranked or ranked[0][1] < min_score:
+            return []
+        return ranked
+
+    def display_name(self, chapter_title: str) -> Optional[str]:
+        """Return the "CHAPTER V: OF ABETMENT" form of a chapter title"""
+        return self.display_names.get(chapter_title)
@@ -24,3 +24,137 @@ DEFAULT_ALPHA = 0.6
 DEFAULT_MAX_CHUNKS = 4
 DEFAULT_CHUNK_SIZE = 700
 DEFAULT_OVERLAP = 200
+
+# Reranker windows: "tokens" fits each window to the encoder's max_seq_length
+# (see windowing.py), "words" uses DEFAULT_CHUNK_SIZE-word windows
+RERANK_WINDOWING = os.getenv("RERANK_WINDOWING", "tokens")
+RERANK_OVERLAP_TOKENS = 24
+
+# Corpus and local indexes
+PPC_FILE_PATH = os.getenv("PPC_FILE_PATH", "ppc.md")
+INDEX_DIR = os.getenv("INDEX_DIR", "index")
+CORPUS_ARTIFACT_PATH = os.getenv("CORPUS_ARTIFACT_PATH", os.path.join(INDEX_DIR, "corpus.bin"))
+
+# Versioned index snapshots (see snapshots.py)
+SNAPSHOTS_DIR = os.path.join(INDEX_DIR, "snapshots")
+SNAPSHOT_POINTER = os.path.join(INDEX_DIR, "CURRENT")
+SNAPSHOTS_KEEP = 5
+# Snapshots whose loaded indexes stay in memory, so a rollback needs no reload
+SNAPSHOTS_RESIDENT = 2
+
+# Additional statutes searched alongside the PPC (see corpora.py)
+CORPORA_FILE = os.getenv("CORPORA_FILE", "corpora.json")
+FEDERATED_SEARCH_WORKERS = 4
+
+# Chapter routing
+ROUTER_TOP_K = 3
+ROUTER_MIN_SCORE = 0.5
+
+# Cross-reference expansion
+CROSS_REF_MAX_FANOUT = 3
+CROSS_REF_TOKEN_BUDGET = 1500
+
+# Definitions attached from CHAPTER II
+DEFINITIONS_TOKEN_BUDGET = 800
+
+# Spelling correction of legal terms and section ids before routing (see spelling.py)
+SPELLING_CORRECTION = os.getenv("SPELLING_CORRECTION", "true").lower() == "true"
+SPELLING_MAX_DISTANCE = 2
+# General English word list, one word per line; its words are never corrected. Skipped if missing
+SPELLING_WORDLIST = os.getenv("SPELLING_WORDLIST", "/usr/share/dict/words")
+
+# Query rewriting before retrieval (see thesaurus.py)
+# "llm" rewrites with Gemini, "thesaurus" only expands locally with PPC vocabulary;
+# the thesaurus expansion is added to the lexical search either way
+QUERY_REWRITE = os.getenv("QUERY_REWRITE", "llm")
+THESAURUS_MAX_TERMS = 8
+
+# Compound questions are split into sub-queries retrieved concurrently (see decomposition.py)
+QUERY_DECOMPOSITION = os.getenv("QUERY_DECOMPOSITION", "true").lower() == "true"
+DECOMPOSITION_MAX_PARTS = 3
+DECOMPOSITION_WORKERS = 3
+# Reranked passages each part keeps at least, however many parts there are
+DECOMPOSITION_MIN_QUOTA = 2
+
+# Section digests (see section_digests.py)
+# The top sections of an answer are sent in full, the other hits as their digests
+SECTION_DIGESTS = os.getenv("SECTION_DIGESTS", "true").lower() == "true"
+DIGEST_FULL_TEXT_SECTIONS = 2
+DIGEST_MIN_WORDS = 150
+DIGEST_WORKERS = 2
+
+# Adaptive stage policy (see stage_policy.py)
+# "adaptive" skips stages the cheap signals say are not needed, "shadow" only logs
+# what it would skip, "off" runs every stage
+STAGE_POLICY = os.getenv("STAGE_POLICY", "adaptive")
+# A query this short is a keyword query; the rewrite is skipped when BM25 also has a clear winner
+POLICY_KEYWORD_WORDS = 5
+# Times the top BM25 score must exceed the second to skip the rewrite, or the remote search
+POLICY_LEXICAL_MARGIN = 1.5
+POLICY_SEARCH_MARGIN = 2.0
+# Cosine similarity gap between the top two local vector hits to skip the remote search
+POLICY_VECTOR_GAP = 0.05
+
+# Local FTS5 lexical search
+# "fusion" merges it with the Weaviate hybrid results, "off" disables it
+LEXICAL_SEARCH_MODE = os.getenv("LEXICAL_SEARCH_MODE", "fusion")
+LEXICAL_SEARCH_LIMIT = 4
+# Answer queries that name sections ("what does section 489-F say") from the local index alone
+LEXICAL_SECTION_FAST_PATH = True
+RRF_K = 60
+
+# Local vector search over the artifact's chunk embeddings
+# "int8" or "binary" keep quantized codes in memory and rescore with float32 from disk;
+# "float" searches the float32 matrix directly and "off" disables the local vector leg
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+VECTOR_RESCORE_FACTOR = 4
+LOCAL_VECTOR_LIMIT = 4
+
+# Section range and chapter browsing (see browse.py)
+BROWSE_PAGE_SIZE = 10
+
+# Punishment table fast path
+PUNISHMENT_TABLE_USE_LLM = os.getenv("PUNISHMENT_TABLE_USE_LLM", "false").lower() == "true"
+
+# On-demand request profiler, offered in the sidebar and through ?profile=1 only when allowed
+PROFILING_ALLOWED = os.getenv("PROFILING_ALLOWED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_INTERVAL = 0.005
+PROFILE_TOP_N = 15
+
+# Chat history
+MAX_CHAT_HISTORY = 40
+CHAT_PAGE_SIZE = 10
+ARCHIVED_PREVIEW_CHARS = 300
+MAX_ARCHIVED_MESSAGES = 200
+
+# Runtime A/B experiments over the search and generation settings (see experiments.py)
+EXPERIMENTS_FILE = os.getenv("EXPERIMENTS_FILE", "experiments.json")
+# USD per million input and output tokens, for the per-arm cost metrics
+GEMINI_PRICES = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40)
+}
+
+# LLM response cache
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Query log and startup warm-up (see query_log.py and warmup.py)
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", ".cache/query_log.jsonl")
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_MB", "10")) * 1024 * 1024
+QUERY_LOG_BACKUPS = 5
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+# Off by default: replays that miss the LLM cache spend the same Gemini quota as users
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+# Admission control in front of the Gemini quota (see admission.py)
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))
+ADMISSION_BURST = 5
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "20"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+# Messages per minute one chat session may send
+SESSION_RATE_LIMIT = float(os.getenv("SESSION_RATE_LIMIT", "6"))
@@ -0,0 +1,115 @@
+"""
+Registry of the statutes the assistant can search
+
+The Pakistan Penal Code is always the primary corpus. Further statutes (CrPC,
+special laws) are registered in the JSON file named by CORPORA_FILE, each with its
+own namespace, markdown source and Weaviate collection, plus the keywords that
+route a query to it:
+
+    [
+      {"namespace": "crpc", "name": "Code of Criminal Procedure", "collection": "CrPC",
+       "file": "crpc.md", "keywords": ["crpc", "criminal procedure", "bail", "fir"]}
+    ]
+
+An optional "weight" (default 1.0, as the PPC) scales the statute's
+reciprocal-rank scores when its results are merged with the PPC's.
+Queries that match no secondary keywords search only the PPC, exactly as before.
+"""
+import os
+import re
+import json
+import threading
+from functools import lru_cache
+from typing import List, Dict
+from config import COLLECTION_NAME, PPC_FILE_PATH, CORPORA_FILE, RRF_K
+
+PRIMARY_CORPUS = "ppc"
+
+
+@lru_cache(maxsize=1)
+def load_corpora() -> Dict[str, Dict]:
+    """Return namespace -> corpus entry, the PPC first"""
+    corpora = {
+        PRIMARY_CORPUS: {
+            "namespace": PRIMARY_CORPUS,
+            "name": "Pakistan Penal Code",
+            "collection": COLLECTION_NAME,
+            "file": PPC_FILE_PATH,
+            "keywords": [],
+            "weight": 1.0
+        }
+    }
+
+    if os.path.exists(CORPORA_FILE):
+        with open(CORPORA_FILE, 'r', encoding='utf-8') as f:
+            for entry in json.load(f):
+                entry.setdefault("keywords", [])
+                entry.setdefault("weight", 1.0)
+                corpora[entry["namespace"]] = entry
+
+    for entry in corpora.values():
+        entry["keyword_pattern"] = re.compile(
+            r'\b(?:' + '|'.join(re.escape(keyword) for keyword in entry["keywords"]) + r')\b', re.I
+        ) if entry["keywords"] else None
+    return corpora
+
+
+def route_corpora(query: str) -> List[str]:
+    """Namespaces to search for a query: the PPC plus every corpus whose keywords it mentions"""
+    return [PRIMARY_CORPUS] + [
+        namespace for namespace, entry in load_corpora().items()
+        if namespace != PRIMARY_CORPUS and entry["keyword_pattern"] and entry["keyword_pattern"].search(query)
+    ]
+
+
+def rank_scores(chunks: List[Dict], weight: float = 1.0, k: int = RRF_K) -> List[Dict]:
+    """
+    Score one corpus' results by reciprocal rank so shards can be merged
+
+    Raw hybrid scores are not comparable across collections, and rescaling them
+    per corpus lifts a shard's best (or only) hit to the level of the PPC's best.
+    Merging on weight / (k + rank) keeps each shard's order and lets a statute's
+    weight, not its score scale, decide how far its hits rise.
+    """
+    return [dict(chunk, fused_score=weight / (k + rank + 1)) for rank, chunk in enumerate(chunks)]
+
+
+class CorpusMetrics:
+    """Thread-safe per-corpus latency and hit-contribution counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def record(self, namespace: str, latency: float, hits: int, contributed: int):
+        """Record one search of a corpus and how many of its hits made the merged top results"""
+        with self._lock:
+            metrics = self._metrics.setdefault(
+                namespace, {"searches": 0, "latency": 0.0, "hits": 0, "contributed": 0}
+            )
+            metrics["searches"] += 1
+            metrics["latency"] += latency
+            metrics["hits"] += hits
+            metrics["contributed"] += contributed
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-corpus searches, average latency in ms, hits and share of hits that contributed"""
+        with self._lock:
+            return {
+                namespace: {
+                    "searches": metrics["searches"],
+                    "avg_latency_ms": metrics["latency"] / metrics["searches"] * 1000,
+                    "hits": metrics["hits"],
+                    "contributed": metrics["contributed"],
+                    "contribution_rate": metrics["contributed"] / metrics["hits"] if metrics["hits"] else 0.0
+                }
+                for namespace, metrics in self._metrics.items()
+            }
+
+
+_metrics = CorpusMetrics()
+
+
+def get_corpus_metrics() -> CorpusMetrics:
+    """Process-wide corpus metrics"""
+    return _metrics
@@ -0,0 +1,299 @@
+"""
+Parsing of the Pakistan Penal Code markdown into chapters and sections
+"""
+import re
+import bisect
+from functools import lru_cache
+from typing import List, Dict, Optional
+from amendments import normalize_amendments, attach_amendments
+from config import PPC_FILE_PATH
+
+CHAPTER_PATTERN = re.compile(r'^# CHAPTER ([IVX]+)[ \t]*$', re.M)
+
+# Section headings appear as "### Section 302. Title", "### Section 225-A. Title",
+# "### Section 489- Title" (suffix letter lost in conversion), "## 171- Title"
+# and "# 310. Title"
+SECTION_PATTERN = re.compile(
+    r'^#{1,4}[ \t]*(?:Section[ \t]+)?(\d+)([A-Z]?)(?:[ \t]*(-)[ \t]*([A-Z](?![a-z]))?)?[ \t]*[.:]?[ \t]*(.*?)[ \t]*$',
+    re.M
+)
+
+# The same headings anywhere in a text. Weaviate chunks are re-joined with single
+# spaces, so the line breaks around a heading are gone and where its title ends is
+# found by comparing the following words with the corpus titles for the number
+INLINE_SECTION_PATTERN = re.compile(
+    r'(?<!\S)#{1,4}[ \t]*(?:Section[ \t]+)?(\d+)[A-Z]?(?:[ \t]*-[ \t]*(?:[A-Z](?![a-z]))?)?[ \t]*[.:]?[ \t]*'
+)
+
+# Words of a chunk looked up in the whitespace-collapsed corpus text to place it
+LOCATE_WORDS = 12
+
+# Sub-headings such as "## Of Theft" or "### Of Cheating" that group sections
+GROUP_PATTERN = re.compile(r'^#{1,4}[ \t]*(?:Section[ \t]+)?(Of [A-Za-z ,&\-]+?)[ \t]*$', re.M)
+
+SECTION_ID_PATTERN = re.compile(r'^(\d+)[ \t]*-?[ \t]*([A-Za-z]?)$')
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "into", "is", "it", "its", "of", "on", "or", "other", "such", "that", "the",
+    "their", "this", "to", "under", "what", "which", "who", "with", "etc", "certain",
+    "section", "sections", "chapter", "offence", "offences", "ppc", "pakistan", "penal", "code",
+    "punishment", "punishments", "punished", "punishable", "law", "i", "me", "my", "do", "does",
+    "how", "when", "if", "can", "someone", "person", "persons"
+}
+
+
+def normalize_section_id(section_id: str) -> Optional[str]:
+    """Normalize a section id such as "489F", "489 f" or "489-F" to "489-F"; None if invalid"""
+    match = SECTION_ID_PATTERN.match(section_id.strip())
+    if not match:
+        return None
+    number, suffix = match.groups()
+    return f"{number}-{suffix.upper()}" if suffix else number
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed; hyphenated terms stay whole"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def clean_heading(title: str) -> str:
+    """Strip markdown emphasis and trailing punctuation from a heading title"""
+    title = title.replace('**', '').strip()
+    return title.rstrip(':.-– ').strip()
+
+
+def parse_chapters(text: str) -> List[Dict]:
+    """
+    Locate the 23 chapters in the markdown text
+
+    Returns:
+        List of chapter dictionaries with the title used in the vector index
+        (e.g. "# CHAPTER XVI"), its name, and start/end character offsets
+    """
+    matches = list(CHAPTER_PATTERN.finditer(text))
+    chapters = []
+
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+
+        # The chapter name is the first heading that follows the chapter line
+        name = ""
+        for line in text[match.end():end].splitlines()[:10]:
+            line = line.strip()
+            if line.startswith('#'):
+                name = clean_heading(line.lstrip('#'))
+                break
+
+        chapters.append({
+            'chapter_title': f"# CHAPTER {match.group(1)}",
+            'numeral': match.group(1),
+            'name': name.upper(),
+            'start': match.start(),
+            'end': end
+        })
+
+    return chapters
+
+
+def parse_sections(text: str, chapters: List[Dict]) -> List[Dict]:
+    """
+    Split the markdown text into sections
+
+    Sections whose suffix letter was lost in conversion (e.g. "489-" for 489-A to
+    489-F) get consecutive letters after the last suffix seen for that number.
+
+    Returns:
+        List of section dictionaries with a normalized section_id, title, chapter
+        information, the nearest "Of ..." group heading, content and offsets
+    """
+    matches = list(SECTION_PATTERN.finditer(text))
+    groups = [(match.start(), clean_heading(match.group(1))) for match in GROUP_PATTERN.finditer(text)]
+    boundaries = sorted([match.start() for match in matches] + [chapter['start'] for chapter in chapters])
+
+    sections = []
+    last_suffix = {}
+
+    for match in matches:
+        number, letter, dash, dash_letter, title = match.groups()
+        suffix = letter or dash_letter or ""
+        if dash and not suffix:
+            suffix = chr(ord(last_suffix.get(number, '@')) + 1)
+        if suffix:
+            last_suffix[number] = suffix
+
+        start = match.start()
+        end = next((b for b in boundaries if b > start), len(text))
+        chapter = next((c for c in chapters if c['start'] <= start < c['end']), None)
+        if chapter is None:
+            continue
+
+        group = ""
+        for group_start, group_title in groups:
+            if chapter['start'] <= group_start < start:
+                group = group_title
+
+        sections.append({
+            'section_id': f"{number}-{suffix}" if suffix else number,
+            'title': clean_heading(title),
+            'chapter_title': chapter['chapter_title'],
+            'chapter_name': chapter['name'],
+            'group': group,
+            'heading': match.group(0).strip(),
+            'content': text[match.end():end].strip(),
+            'start': start,
+            'end': end
+        })
+
+    return sections
+
+
+def parse_corpus(text: str) -> Dict:
+    """
+    Parse the PPC markdown text into the corpus dictionary
+
+    Amendment markers are stripped first; the corpus text and offsets refer to the
+    cleaned text and each section lists the amendments that touch it.
+    """
+    text, amendments = normalize_amendments(text)
+    chapters = parse_chapters(text)
+    sections = parse_sections(text, chapters)
+    attach_amendments(sections, amendments, text)
+    return index_corpus(text, chapters, sections)
+
+
+def index_corpus(text: Optional[str], chapters: List[Dict], sections: List[Dict]) -> Dict:
+    """
+    Assemble the corpus dictionary and its lookups from parsed chapters and sections
+
+    text may be None when the caller serves it lazily (see corpus_artifact.MappedCorpus).
+
+    Returns:
+        Dictionary with the raw text, chapters, sections and a section_id lookup
+    """
+    # The first occurrence wins when a section number is repeated in the source
+    sections_by_id = {}
+    sections_by_heading = {}
+    for section in sections:
+        sections_by_id.setdefault(section['section_id'], section)
+        sections_by_heading.setdefault(heading_key(section['section_id'], section['title']), section['section_id'])
+
+    # Titles per section number, longest first, for headings found inside running text
+    headings_by_number = {}
+    for (number, title), section_id in sections_by_heading.items():
+        headings_by_number.setdefault(number, []).append((title, section_id))
+    for titles in headings_by_number.values():
+        titles.sort(key=lambda entry: len(entry[0]), reverse=True)
+
+    corpus = {
+        'chapters': chapters,
+        'sections': sections,
+        'sections_by_id': sections_by_id,
+        'sections_by_heading': sections_by_heading,
+        'headings_by_number': headings_by_number
+    }
+    if text is not None:
+        corpus['text'] = text
+    return corpus
+
+
+def load_corpus(file_path: str = PPC_FILE_PATH) -> Dict:
+    """
+    Load the corpus of the current index snapshot, once per process and snapshot
+
+    The snapshot's compiled corpus artifact is memory-mapped when it exists (and,
+    outside snapshots, is up to date with file_path); otherwise the markdown file
+    is read and parsed.
+    """
+    from snapshots import current_snapshot_dir, artifact_path, is_snapshot
+
+    index_dir = current_snapshot_dir()
+    return _load_corpus(file_path, artifact_path(index_dir), not is_snapshot(index_dir))
+
+
+@lru_cache(maxsize=4)
+def _load_corpus(file_path: str, artifact_path: str, check_source: bool) -> Dict:
+    from corpus_artifact import load_corpus_from_artifact
+
+    corpus = load_corpus_from_artifact(file_path, artifact_path, check_source)
+    if corpus is not None:
+        return corpus
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return parse_corpus(f.read())
+
+
+def heading_key(number: str, title: str):
+    """Key that identifies a section heading even when its suffix letter is missing"""
+    return number.split('-')[0], ' '.join(clean_heading(title).lower().split())
+
+
+def section_ids_in_text(text: str, corpus: Dict) -> List[str]:
+    """
+    Return the ids of the sections whose headings appear in a chunk of text, in order
+
+    Headings are recognised inside running text as well as on their own lines. A
+    heading cut off by the end of the chunk still counts if what is left of its
+    title matches.
+    """
+    section_ids = []
+    for match in INLINE_SECTION_PATTERN.finditer(text):
+        following = ' '.join(text[match.end():match.end() + 400].replace('**', '').split()).lower()
+        for title, section_id in corpus['headings_by_number'].get(match.group(1), []):
+            complete = following.startswith(title) and not (title and following[len(title):len(title) + 1].isalnum())
+            if complete or (following and title.startswith(following)):
+                if section_id not in section_ids:
+                    section_ids.append(section_id)
+                break
+    return section_ids
+
+
+@lru_cache(maxsize=4)
+def _collapsed_text(text: str):
+    """The text with every run of whitespace collapsed to one space, and where each word starts in both"""
+    words = list(re.finditer(r'\S+', text))
+    collapsed_starts = []
+    position = 0
+    for word in words:
+        collapsed_starts.append(position)
+        position += len(word.group(0)) + 1
+    return ' '.join(word.group(0) for word in words), collapsed_starts, [word.start() for word in words]
+
+
+def locate_text(text: str, corpus: Dict) -> Optional[int]:
+    """Offset in the corpus text where a chunk or passage starts, ignoring how it was re-spaced; None if not found"""
+    probe = ' '.join(text.split()[:LOCATE_WORDS])
+    if not probe:
+        return None
+    # A corpus mapped from the artifact searches its stored collapsed text instead
+    if hasattr(corpus, 'locate'):
+        return corpus.locate(probe)
+    collapsed, collapsed_starts, starts = _collapsed_text(corpus['text'])
+    position = collapsed.find(probe)
+    if position < 0:
+        return None
+    return starts[bisect.bisect_right(collapsed_starts, position) - 1]
+
+
+def section_at(offset: int, corpus: Dict) -> Optional[str]:
+    """The id of the section containing a corpus text offset, or None outside every section"""
+    sections = corpus['sections']
+    index = bisect.bisect_right([section['start'] for section in sections], offset) - 1
+    if index >= 0 and offset < sections[index]['end']:
+        return sections[index]['section_id']
+    return None
+
+
+def chunk_section_ids(text: str, corpus: Dict) -> List[str]:
+    """The ids of the sections a chunk covers: the one it starts in, then those whose headings it contains"""
+    offset = locate_text(text, corpus)
+    first = section_at(offset, corpus) if offset is not None else None
+    section_ids = section_ids_in_text(text, corpus)
+    return list(dict.fromkeys(([first] if first else []) + section_ids))
+
+
+def chapter_display_name(chapter: Dict) -> str:
+    """Format a chapter as "CHAPTER V: OF ABETMENT" """
+    return f"CHAPTER {chapter['numeral']}: {chapter['name']}"
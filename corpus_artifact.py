@@ -0,0 +1,415 @@
+"""
+Compiled corpus artifact
+
+build_indexes.py compiles ppc.md once into a single versioned binary file holding
+the UTF-8 text blob, the chapter, section and chunk offset tables, the chunk
+embedding matrix and the lexical postings. At query time the file is memory-mapped
+and every table is a zero-copy numpy view over the mapping, so startup is a page-in
+instead of a parse and processes serving the app share the same physical pages.
+
+Layout:
+    header   MAGIC, format version, table-of-contents offset and length
+    blocks   64-byte aligned arrays (text, collapsed text, offsets, postings, embeddings)
+    toc      JSON with the metadata and the offset, dtype and shape of every block
+"""
+import os
+import re
+import json
+import mmap
+import time
+import struct
+import hashlib
+from collections.abc import Mapping
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from config import PPC_FILE_PATH, CORPUS_ARTIFACT_PATH, SENTENCE_TRANSFORMER_MODEL
+
+MAGIC = b"PPCCORP\0"
+# Version 2 stores the text with amendment markers stripped and per-section amendments;
+# version 3 adds the whitespace-collapsed text and its word table for locate()
+FORMAT_VERSION = 3
+HEADER = struct.Struct("<8sIIQQ")
+ALIGNMENT = 64
+
+# Word-window chunking of each section, matching weaviate_populate_v2.py
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 50
+
+# With a sentence model, chunks are instead windows that fit its max_seq_length
+# (see windowing.py), overlapping by this many tokens
+CHUNK_OVERLAP_TOKENS = 24
+
+WORD_PATTERN = re.compile(r'\S+')
+
+# Columns of the section offset table
+SECTION_COLUMNS = ["heading_byte", "content_byte", "end_byte", "start_char", "end_char", "chapter"]
+# Columns of the word table: where each word starts in the collapsed text and in the text
+WORD_COLUMNS = ["collapsed_byte", "start_char"]
+
+
+def _byte_offsets(text: str, char_offsets: List[int]) -> Dict[int, int]:
+    """Map character offsets to UTF-8 byte offsets in a single pass over the text"""
+    mapping = {}
+    position = 0
+    byte_position = 0
+    for offset in sorted(set(char_offsets)):
+        byte_position += len(text[position:offset].encode('utf-8'))
+        position = offset
+        mapping[offset] = byte_position
+    return mapping
+
+
+def _chunk_spans(content: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the overlapping word windows of a section"""
+    words = [(match.start(), match.end()) for match in WORD_PATTERN.finditer(content)]
+    if not words:
+        return []
+
+    spans = []
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    for i in range(0, len(words), step):
+        window = words[i:i + CHUNK_SIZE]
+        spans.append((window[0][0], window[-1][1]))
+        if i + CHUNK_SIZE >= len(words):
+            break
+    return spans
+
+
+def _postings(token_lists: List[List[str]]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Build CSR postings (vocabulary, term offsets, section ids, term frequencies)"""
+    index = {}
+    for doc, tokens in enumerate(token_lists):
+        for token in tokens:
+            counts = index.setdefault(token, {})
+            counts[doc] = counts.get(doc, 0) + 1
+
+    vocabulary = sorted(index)
+    term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    docs = []
+    frequencies = []
+    for i, term in enumerate(vocabulary):
+        for doc, count in sorted(index[term].items()):
+            docs.append(doc)
+            frequencies.append(count)
+        term_offsets[i + 1] = len(docs)
+
+    return vocabulary, term_offsets, np.array(docs, dtype=np.int32), np.array(frequencies, dtype=np.int32)
+
+
+def source_fingerprint(file_path: str) -> Dict:
+    """Cheap identity of the source file used to detect a stale artifact without reading it"""
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_corpus_artifact(file_path: str = PPC_FILE_PATH, sentence_model=None,
+                          path: str = CORPUS_ARTIFACT_PATH) -> str:
+    """
+    Compile ppc.md into the binary corpus artifact
+
+    The chunk embedding matrix is included when a sentence model is given, and the
+    chunks are then sized in the model's tokens so that no chunk is truncated.
+    The file is written next to its destination and renamed into place.
+    """
+    from corpus import parse_corpus, tokenize
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        corpus = parse_corpus(f.read().replace('\r\n', '\n'))
+    text = corpus['text']
+    chapters = corpus['chapters']
+    sections = corpus['sections']
+    chapter_index = {chapter['chapter_title']: i for i, chapter in enumerate(chapters)}
+
+    if sentence_model is not None:
+        from windowing import encoder_token_budget, token_window_spans
+        chunk_tokens = encoder_token_budget(sentence_model)
+    else:
+        chunk_tokens = None
+
+    def chunk_section(content):
+        if chunk_tokens is None:
+            return _chunk_spans(content)
+        return token_window_spans(content, sentence_model.tokenizer, chunk_tokens, CHUNK_OVERLAP_TOKENS)
+
+    # Character positions of every boundary, converted to byte offsets in one pass
+    section_spans = []
+    chunk_spans = []
+    for i, section in enumerate(sections):
+        raw = text[section['start']:section['end']]
+        heading_end = section['start'] + raw.index(section['heading']) + len(section['heading'])
+        body = text[heading_end:section['end']]
+        content_start = heading_end + (len(body) - len(body.lstrip()))
+        section_spans.append((section['start'], content_start, content_start + len(section['content'])))
+        for start, end in chunk_section(section['content']):
+            chunk_spans.append((content_start + start, content_start + end, i))
+
+    char_offsets = [chapter[key] for chapter in chapters for key in ('start', 'end')]
+    char_offsets += [offset for span in section_spans for offset in span]
+    char_offsets += [offset for start, end, _ in chunk_spans for offset in (start, end)]
+    to_bytes = _byte_offsets(text, char_offsets)
+
+    chapter_table = np.array([
+        [to_bytes[chapter['start']], to_bytes[chapter['end']], chapter['start'], chapter['end']]
+        for chapter in chapters
+    ], dtype=np.int64)
+    section_table = np.array([
+        [to_bytes[heading], to_bytes[content], to_bytes[end], section['start'], section['end'],
+         chapter_index[section['chapter_title']]]
+        for (heading, content, end), section in zip(section_spans, sections)
+    ], dtype=np.int64)
+    chunk_table = np.array(
+        [[to_bytes[start], to_bytes[end], section] for start, end, section in chunk_spans], dtype=np.int64
+    )
+
+    # The text with every run of whitespace collapsed to one space, which chunks are
+    # located in however they were re-spaced, and where each of its words starts
+    words = list(WORD_PATTERN.finditer(text))
+    collapsed = ' '.join(word.group(0) for word in words).encode('utf-8')
+    word_table = np.zeros((len(words), 2), dtype=np.int64)
+    position = 0
+    for i, word in enumerate(words):
+        word_table[i] = position, word.start()
+        position += len(word.group(0).encode('utf-8')) + 1
+
+    vocabulary, term_offsets, posting_sections, posting_frequencies = _postings(
+        [tokenize(f"{section['title']} {section['content']}") for section in sections]
+    )
+
+    blocks = {
+        'text': np.frombuffer(text.encode('utf-8'), dtype=np.uint8),
+        'chapters': chapter_table,
+        'sections': section_table,
+        'chunks': chunk_table,
+        'collapsed_text': np.frombuffer(collapsed, dtype=np.uint8),
+        'words': word_table,
+        'term_offsets': term_offsets,
+        'posting_sections': posting_sections,
+        'posting_frequencies': posting_frequencies
+    }
+
+    embedding_model = None
+    if sentence_model is not None:
+        chunk_texts = [text[start:end] for start, end, _ in chunk_spans]
+        blocks['embeddings'] = np.asarray(
+            sentence_model.encode(chunk_texts, normalize_embeddings=True, show_progress_bar=True),
+            dtype=np.float32
+        )
+        embedding_model = SENTENCE_TRANSFORMER_MODEL
+
+    meta = {
+        'source': source_fingerprint(file_path),
+        'source_sha256': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+        'built_at': time.time(),
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP,
+        'chunk_tokens': chunk_tokens,
+        'embedding_model': embedding_model,
+        'section_columns': SECTION_COLUMNS,
+        'word_columns': WORD_COLUMNS,
+        'chapters': [
+            {key: chapter[key] for key in ('chapter_title', 'numeral', 'name')} for chapter in chapters
+        ],
+        'sections': [
+            {key: section[key] for key in ('section_id', 'title', 'group', 'amendments')} for section in sections
+        ],
+        'vocabulary': vocabulary
+    }
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    toc = {}
+    with open(tmp_path, 'wb') as f:
+        f.write(b"\0" * HEADER.size)
+        for name, array in blocks.items():
+            array = np.ascontiguousarray(array)
+            f.write(b"\0" * (-f.tell() % ALIGNMENT))
+            toc[name] = {
+                'offset': f.tell(),
+                'dtype': array.dtype.str,
+                'shape': list(array.shape)
+            }
+            f.write(array.tobytes())
+
+        toc_bytes = json.dumps({'meta': meta, 'blocks': toc}).encode('utf-8')
+        toc_offset = f.tell()
+        f.write(toc_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, toc_offset, len(toc_bytes)))
+
+    os.replace(tmp_path, path)
+    return path
+
+
+class CorpusArtifact:
+    """Read-only, memory-mapped view of the compiled corpus"""
+
+    def __init__(self, path: str = CORPUS_ARTIFACT_PATH):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, toc_offset, toc_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a corpus artifact")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+
+        toc = json.loads(self._mmap[toc_offset:toc_offset + toc_length])
+        self.meta = toc['meta']
+        self._block_offsets = {name: block['offset'] for name, block in toc['blocks'].items()}
+        self.blocks = {}
+        for name, block in toc['blocks'].items():
+            dtype = np.dtype(block['dtype'])
+            count = int(np.prod(block['shape']))
+            self.blocks[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=block['offset']
+            ).reshape(block['shape'])
+
+        self.vocabulary = {term: i for i, term in enumerate(self.meta['vocabulary'])}
+
+    def is_current(self, file_path: str = PPC_FILE_PATH) -> bool:
+        """Whether the artifact was built from the current version of the source file"""
+        if not os.path.exists(file_path):
+            return True
+        return source_fingerprint(file_path) == self.meta['source']
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        return self.blocks.get('embeddings')
+
+    def text(self, start: int, end: int) -> str:
+        """Decode a byte range of the text blob"""
+        return self.blocks['text'][start:end].tobytes().decode('utf-8')
+
+    def locate(self, probe: str) -> Optional[int]:
+        """
+        Character offset in the text of the word where probe first occurs; None if it does not
+
+        probe is matched against the collapsed text, with single spaces between
+        words, by searching the mapping itself, so nothing is decoded.
+        """
+        start = self._block_offsets['collapsed_text']
+        position = self._mmap.find(probe.encode('utf-8'), start, start + len(self.blocks['collapsed_text']))
+        if position < 0:
+            return None
+        words = self.blocks['words']
+        index = int(np.searchsorted(words[:, 0], position - start, side='right')) - 1
+        return int(words[index, 1])
+
+    def section_content(self, index: int) -> str:
+        _, content, end = self.blocks['sections'][index][:3]
+        return self.text(content, end)
+
+    def chunk(self, index: int) -> Dict:
+        """Return one chunk with its section and chapter"""
+        start, end, section_index = (int(value) for value in self.blocks['chunks'][index])
+        section = self.meta['sections'][section_index]
+        chapter = self.meta['chapters'][int(self.blocks['sections'][section_index][5])]
+        return {
+            'chunk_index': index,
+            'section_id': section['section_id'],
+            'chapter_title': chapter['chapter_title'],
+            'content': self.text(start, end)
+        }
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (section indices, term frequencies) for a token, empty if unknown"""
+        i = self.vocabulary.get(term)
+        if i is None:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty
+        start, end = self.blocks['term_offsets'][i:i + 2]
+        return self.blocks['posting_sections'][start:end], self.blocks['posting_frequencies'][start:end]
+
+    def to_corpus(self) -> Dict:
+        """
+        Rebuild the dictionary returned by corpus.load_corpus without parsing
+
+        Only the metadata and offsets live in Python objects: section headings and
+        content, and the full text, are decoded from the mapping when they are read,
+        so the text stays in the page cache shared by every process.
+        """
+        from corpus import index_corpus
+
+        chapters = [
+            dict(chapter, start=int(row[2]), end=int(row[3]))
+            for chapter, row in zip(self.meta['chapters'], self.blocks['chapters'])
+        ]
+
+        sections = []
+        for index, (section, row) in enumerate(zip(self.meta['sections'], self.blocks['sections'])):
+            chapter = chapters[int(row[5])]
+            sections.append(MappedSection(self, index, dict(
+                section,
+                chapter_title=chapter['chapter_title'],
+                chapter_name=chapter['name'],
+                start=int(row[3]),
+                end=int(row[4])
+            )))
+
+        return MappedCorpus(self, index_corpus(None, chapters, sections))
+
+
+class MappedSection(Mapping):
+    """A corpus section whose heading and content are decoded from the artifact on access"""
+
+    MAPPED_KEYS = ('heading', 'content')
+
+    def __init__(self, artifact: CorpusArtifact, index: int, fields: Dict):
+        self._artifact = artifact
+        self._index = index
+        self._fields = fields
+
+    def __getitem__(self, key):
+        if key == 'heading':
+            heading, content = self._artifact.blocks['sections'][self._index][:2]
+            return self._artifact.text(heading, content).strip()
+        if key == 'content':
+            return self._artifact.section_content(self._index)
+        return self._fields[key]
+
+    def __iter__(self):
+        yield from self._fields
+        yield from self.MAPPED_KEYS
+
+    def __len__(self):
+        return len(self._fields) + len(self.MAPPED_KEYS)
+
+
+class MappedCorpus(dict):
+    """
+    Corpus dictionary whose full text is only decoded, once, if something reads corpus['text']
+
+    corpus.locate_text uses locate(), which searches the artifact's collapsed text,
+    so serving never needs the full text.
+    """
+
+    def __init__(self, artifact: CorpusArtifact, corpus: Dict):
+        super().__init__(corpus)
+        self._artifact = artifact
+
+    def __missing__(self, key):
+        if key != 'text':
+            raise KeyError(key)
+        return self.setdefault('text', self._artifact.text(0, len(self._artifact.blocks['text'])))
+
+    def locate(self, probe: str) -> Optional[int]:
+        return self._artifact.locate(probe)
+
+
+def load_corpus_from_artifact(file_path: str = PPC_FILE_PATH, path: str = CORPUS_ARTIFACT_PATH,
+                              check_source: bool = True) -> Optional[Dict]:
+    """
+    Return the corpus from the artifact, or None if it is missing, stale or unreadable
+
+    Index snapshots pass check_source=False: a published snapshot serves the text
+    it was built from even after ppc.md is edited for the next build.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        artifact = CorpusArtifact(path)
+    except (ValueError, OSError, struct.error):
+        return None
+    if check_source and not artifact.is_current(file_path):
+        return None
+    return artifact.to_corpus()
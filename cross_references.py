@@ -0,0 +1,159 @@
+"""
+Cross-reference graph between PPC sections
+
+Sections constantly cite each other ("punishable under section 302", "as defined
+in section 24"). The ingest step extracts every such reference from ppc.md into
+an adjacency list stored in the index directory, so retrieval can pull in the
+sections a hit depends on from memory instead of running more vector queries.
+"""
+import os
+import re
+import json
+from typing import List, Dict
+from corpus import load_corpus, normalize_section_id
+from config import INDEX_DIR, CROSS_REF_MAX_FANOUT, CROSS_REF_TOKEN_BUDGET
+
+CROSS_REFERENCE_FILE = "cross_references.json"
+
+SECTION_ID = r'\d+(?:-?[A-Z]\b)?'
+
+# "section 302", "Sections 161 and 165", "sections 299 to 311", "Section 221, Section 222 or Section 223"
+REFERENCE_PATTERN = re.compile(
+    rf'\b[Ss]ections?\s+({SECTION_ID}(?:\s*(?:,|and|or|to|&)\s*(?:[Ss]ections?\s+)?{SECTION_ID})*)'
+)
+
+REFERENCE_PART_PATTERN = re.compile(rf'({SECTION_ID})|\bto\b')
+
+# References into other statutes, e.g. "section 87 of the Code of Criminal Procedure"
+EXTERNAL_PATTERN = re.compile(
+    r'\s*,?\s*(?:of|in)\s+the\s+(?:Code of Criminal Procedure|[\w ()]{0,60}?\b(?:Act|Ordinance|Order)\b)'
+)
+
+# Ranges such as "sections 299 to 311" wider than this are treated as unbounded and skipped
+MAX_RANGE = 40
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count used for context budgets (about four characters per token)"""
+    return len(text) // 4
+
+
+def _numeric(section_id: str) -> int:
+    return int(section_id.split('-')[0])
+
+
+def extract_references(text: str, corpus: Dict) -> List[str]:
+    """Return the ids of the PPC sections cited in a piece of text, in order of appearance"""
+    sections_by_id = corpus['sections_by_id']
+    references = []
+
+    for match in REFERENCE_PATTERN.finditer(text):
+        if EXTERNAL_PATTERN.match(text, match.end()):
+            continue
+
+        cited = []
+        range_pending = False
+        for part in REFERENCE_PART_PATTERN.finditer(match.group(1)):
+            if part.group(1) is None:
+                range_pending = True
+                continue
+
+            section_id = normalize_section_id(part.group(1))
+            if range_pending and cited:
+                low, high = _numeric(cited[-1]), _numeric(section_id)
+                if 0 < high - low <= MAX_RANGE:
+                    cited.extend(
+                        other for other in sections_by_id
+                        if low < _numeric(other) < high
+                    )
+            range_pending = False
+            cited.append(section_id)
+
+        for section_id in cited:
+            if section_id in sections_by_id and section_id not in references:
+                references.append(section_id)
+
+    return references
+
+
+def build_cross_reference_graph(corpus: Dict) -> Dict[str, List[str]]:
+    """Build the section_id -> [cited section_ids] adjacency list for the whole corpus"""
+    graph = {}
+    for section in corpus['sections']:
+        cited = [
+            section_id for section_id in extract_references(section['content'], corpus)
+            if section_id != section['section_id']
+        ]
+        if cited:
+            existing = graph.setdefault(section['section_id'], [])
+            existing.extend(section_id for section_id in cited if section_id not in existing)
+    return graph
+
+
+def save_cross_reference_graph(index_dir: str = INDEX_DIR) -> str:
+    """Extract the cross-reference graph from ppc.md and store it in the index directory"""
+    graph = build_cross_reference_graph(load_corpus())
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, CROSS_REFERENCE_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(graph, f, indent=1)
+    return path
+
+
+class CrossReferenceGraph:
+    """In-memory section graph used for one-hop context expansion"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.corpus = load_corpus()
+
+        path = os.path.join(index_dir, CROSS_REFERENCE_FILE)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.graph = json.load(f)
+        else:
+            # Extraction takes milliseconds, so a missing index is rebuilt in memory
+            self.graph = build_cross_reference_graph(self.corpus)
+
+    def neighbours(self, section_id: str) -> List[str]:
+        """Sections cited by section_id"""
+        return self.graph.get(section_id, [])
+
+    def expand(self, section_ids: List[str], max_fanout: int = CROSS_REF_MAX_FANOUT,
+               token_budget: int = CROSS_REF_TOKEN_BUDGET) -> List[Dict]:
+        """
+        Collect the sections cited by the given hits
+
+        Hits are expanded in rank order, at most max_fanout neighbours per hit.
+        A neighbour whose text would take the total past token_budget is skipped,
+        and later, shorter neighbours may still fit in what remains.
+
+        Returns:
+            List of {'section_id', 'chapter', 'cited_by', 'content'} dictionaries
+        """
+        sections_by_id = self.corpus['sections_by_id']
+        seen = set(section_ids)
+        expanded = []
+        tokens_used = 0
+
+        for section_id in section_ids:
+            for neighbour in self.neighbours(section_id)[:max_fanout]:
+                if neighbour in seen:
+                    continue
+                seen.add(neighbour)
+
+                section = sections_by_id[neighbour]
+                content = f"{section['heading']}\n{section['content']}"
+                cost = estimate_tokens(content)
+                if tokens_used + cost > token_budget:
+                    continue
+
+                tokens_used += cost
+                expanded.append({
+                    'section_id': neighbour,
+                    'chapter': section['chapter_title'],
+                    'cited_by': section_id,
+                    'content': content
+                })
+
+        return expanded
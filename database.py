@@ -1,11 +1,26 @@
 """
 Database connection and client management module
 """
+import functools
 import streamlit as st
 import weaviate
 from weaviate.classes.init import Auth
 from sentence_transformers import SentenceTransformer
-from config import WEAVIATE_URL, WEAVIATE_API_KEY, COHERE_APIKEY, SENTENCE_TRANSFORMER_MODEL
+from chapter_router import ChapterRouter
+from cross_references import CrossReferenceGraph
+from definitions import DefinitionsIndex
+from punishments import PunishmentTable
+from lexical_index import LexicalIndex
+from vector_store import QuantizedVectorStore
+from section_digests import SectionDigests
+from thesaurus import Thesaurus
+from spelling import SpellingCorrector
+from browse import SectionBrowser
+from snapshots import current_snapshot_dir, artifact_path, pinned
+from config import (
+    WEAVIATE_URL, WEAVIATE_API_KEY, COHERE_APIKEY, SENTENCE_TRANSFORMER_MODEL, VECTOR_QUANTIZATION,
+    SNAPSHOTS_RESIDENT
+)
 
 
 @st.cache_resource
@@ -29,3 +44,86 @@ def initialize_weaviate_client():
 def load_sentence_transformer():
     """Load and cache the sentence transformer model"""
     return SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+
+
+def per_snapshot(loader):
+    """
+    Cache a loader once per index snapshot and call it with the current snapshot
+
+    The current and previous snapshots stay resident, so publishing a snapshot
+    or rolling back takes effect on the next request without a reload stall.
+    """
+    cached = st.cache_resource(max_entries=SNAPSHOTS_RESIDENT)(loader)
+
+    @functools.wraps(loader)
+    def load():
+        index_dir = current_snapshot_dir()
+        # The index reads its corpus from the same snapshot
+        with pinned(index_dir):
+            return cached(index_dir)
+    return load
+
+
+@per_snapshot
+def load_chapter_router(index_dir):
+    """Load and cache the local chapter router"""
+    return ChapterRouter(index_dir)
+
+
+@per_snapshot
+def load_cross_reference_graph(index_dir):
+    """Load and cache the section cross-reference graph"""
+    return CrossReferenceGraph(index_dir)
+
+
+@per_snapshot
+def load_definitions_index(index_dir):
+    """Load and cache the Chapter II definitions index"""
+    return DefinitionsIndex(index_dir)
+
+
+@per_snapshot
+def load_punishment_table(index_dir):
+    """Load and cache the structured punishment table"""
+    return PunishmentTable(index_dir)
+
+
+@per_snapshot
+def load_lexical_index(index_dir):
+    """Load and cache the SQLite FTS5 lexical index"""
+    return LexicalIndex(index_dir)
+
+
+@per_snapshot
+def load_spelling_corrector(index_dir):
+    """Load and cache the symmetric-delete spelling index"""
+    return SpellingCorrector(index_dir)
+
+
+@per_snapshot
+def load_section_browser(index_dir):
+    """Load and cache the section range and chapter browser"""
+    return SectionBrowser()
+
+
+@per_snapshot
+def load_thesaurus(index_dir):
+    """Load and cache the legal thesaurus used for query expansion"""
+    return Thesaurus(index_dir)
+
+
+@per_snapshot
+def load_section_digests(index_dir):
+    """Load and cache the precomputed section digests; empty if none were generated"""
+    return SectionDigests(index_dir)
+
+
+@per_snapshot
+def load_vector_store(index_dir):
+    """Load and cache the quantized local vector store; None if disabled or not built"""
+    if VECTOR_QUANTIZATION == "off":
+        return None
+    try:
+        return QuantizedVectorStore(VECTOR_QUANTIZATION, index_dir, artifact_path(index_dir))
+    except (OSError, ValueError):
+        return None
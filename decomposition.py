@@ -0,0 +1,209 @@
+"""
+Local decomposition of compound legal questions into sub-queries
+
+"Difference between theft and robbery and their punishments" used to become one
+optimized query, and its single hybrid search returned a mix that often missed
+one side of the comparison. Compound questions are split here into one
+sub-query per side, so each is retrieved on its own and the context gets a
+share of passages for every part:
+
+- several questions in one message: "What is qisas? Can it be waived?"; a
+  message that states facts and then asks about them stays whole
+- comparisons: "difference between theft and robbery and their punishments"
+  -> "theft punishments", "robbery punishments"
+- coordinated offences under a shared head: "punishment for theft and robbery"
+  -> "punishment for theft", "punishment for robbery"
+
+Coordinations are only split after a comparison cue or a head from HEAD_WORDS,
+and only when every item is PPC vocabulary in the thesaurus, so names such as
+"weights and measures" or "abduction of women and children" stay whole.
+
+Splitting is a few regular expressions and dictionary lookups, so it costs
+microseconds and no Gemini call. Anything it is unsure of is left as a single query.
+"""
+import re
+import time
+from typing import List
+from corpus import tokenize
+from thesaurus import Thesaurus
+from config import DECOMPOSITION_MAX_PARTS
+
+# Sentence ends, or "and" before a new question word; only a capital after a full stop starts a sentence
+CLAUSE_BOUNDARY = re.compile(
+    r"\s*(\?)\s*|\s*;\s*|\.\s+(?=[A-Z])"
+    r"|(?i:,?\s+(?:and|also|and also)\s+(?=(?:what|how|is|are|can|does|do|which|who|when|where|why|will)\b))"
+)
+# Words whose full stop does not end a sentence ("Mr. Khan", "s. 302"); single letters are initials
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "sr", "jr", "st", "no", "nos", "s", "ss", "sec", "secs", "art", "vs", "etc", "ch"}
+COMPARISON = re.compile(
+    r"^(?:what\s+(?:is|are)\s+|what's\s+|explain\s+|tell\s+me\s+)?(?:the\s+)?"
+    r"(?:(?:main|key)\s+)?(?:difference|differences|distinction)\s+(?:between|among|in)\s+"
+    r"|^(?:compare|contrast|distinguish(?:\s+between)?)\s+",
+    re.I
+)
+CONJUNCTION_SPLIT = re.compile(r"\s*,\s*(?:and\s+|or\s+)?|\s+(?:and|or|vs\.?|versus)\s+", re.I)
+# "their punishments" applies to every item of the comparison
+SHARED_ATTRIBUTE = re.compile(r"^(?:their|its|both|the\s+respective|respective)\s+", re.I)
+# The head a list of offences hangs from: "the punishment for theft and robbery"
+HEAD_PREPOSITION = re.compile(r"^(.*\b(?:for|about|under|on|of|in))\s+(.+)$", re.I)
+# A shared head must contain one of these words, so "breach of trust" and
+# "abetment of theft and robbery" stay whole
+HEAD_WORDS = {
+    "punishment", "punishments", "penalty", "penalties", "sentence", "definition", "meaning",
+    "ingredients", "elements", "section", "sections", "law", "laws", "provisions", "bail"
+}
+
+# A clause or item starting with one of these is a whole question, not context or a term
+# ("is adultery and fornication a crime")
+QUESTION_WORDS = {
+    "what", "how", "is", "are", "can", "does", "do", "which", "who", "when", "where", "why", "will",
+    "was", "were", "did", "should", "could", "would", "shall", "may", "whether"
+}
+
+MAX_ITEM_WORDS = 4
+
+
+def clauses(query: str) -> List[str]:
+    """
+    The separate questions in a message, or [] unless it holds several questions and nothing else
+
+    Every clause must be a question of its own (ending in "?" or starting with a
+    question word) with at least one content word. Facts followed by a question
+    ("Ali killed Bashir in a fight. Is it murder?") are context for that question
+    and are never split from it, and no clause is ever dropped.
+    """
+    parts = []
+    start = 0
+    for match in CLAUSE_BOUNDARY.finditer(query):
+        if match.group(0).startswith('.'):
+            previous = query[start:match.start()].split()
+            word = previous[-1].lower().strip('(') if previous else ""
+            if len(word) == 1 or word in ABBREVIATIONS:
+                continue
+        parts.append((query[start:match.start()].strip(), bool(match.group(1))))
+        start = match.end()
+    parts.append((query[start:].strip(), False))
+    parts = [(text, asked) for text, asked in parts if text]
+
+    if len(parts) < 2:
+        return []
+    for text, asked in parts:
+        if not (asked or text.split()[0].lower() in QUESTION_WORDS) or not tokenize(text):
+            return []
+    return [text for text, _ in parts]
+
+
+def coordinated_items(query: str, thesaurus: Thesaurus) -> List[str]:
+    """
+    One sub-query per coordinated offence or term in query, or [] if it is not a coordination
+
+    The comparison cue is dropped, a shared head ("punishment for") is prefixed to
+    every item and shared attributes ("their punishments") are appended to every item.
+    Without a comparison cue or a shared head, or if any item is not a term the
+    thesaurus knows, the query is not a coordination.
+    """
+    text = query.strip().rstrip("?.! ")
+    comparison = COMPARISON.search(text)
+    if comparison:
+        text = text[comparison.end():]
+
+    pieces = [piece for piece in CONJUNCTION_SPLIT.split(text) if piece]
+    items = []
+    attributes = []
+    for piece in pieces:
+        attribute = SHARED_ATTRIBUTE.match(piece)
+        if attribute and items:
+            attributes.append(piece[attribute.end():])
+        else:
+            items.append(piece)
+    if len(items) < 2:
+        return []
+
+    prefix = ""
+    head = HEAD_PREPOSITION.match(items[0]) if not comparison else None
+    if head and HEAD_WORDS & set(head.group(1).lower().split()):
+        prefix, items[0] = head.group(1) + " ", head.group(2)
+
+    if not comparison and not prefix:
+        return []
+    if any(len(item.split()) > MAX_ITEM_WORDS or not thesaurus.knows(item) for item in items):
+        return []
+    suffix = "".join(f" {attribute}" for attribute in attributes)
+    return [f"{prefix}{item}{suffix}" for item in items]
+
+
+def decompose(query: str, thesaurus: Thesaurus, max_parts: int = DECOMPOSITION_MAX_PARTS) -> List[str]:
+    """
+    Split a compound question into sub-queries
+
+    Returns:
+        The sub-queries, or [query] when the question is not compound or would
+        split into more than max_parts parts
+    """
+    parts = clauses(query)
+    if len(parts) < 2:
+        parts = coordinated_items(query, thesaurus)
+    parts = list(dict.fromkeys(parts))
+    if len(parts) < 2 or len(parts) > max_parts:
+        return [query]
+    return parts
+
+
+# Example questions and the number of sub-queries each should split into
+EXAMPLES = [
+    ("difference between theft and robbery and their punishments", 2),
+    ("What is the punishment for theft and robbery?", 2),
+    ("what is qisas? can it be waived by the heirs?", 2),
+    ("compare kidnapping vs abduction", 2),
+    ("what is criminal breach of trust and what is cheating", 2),
+    ("punishment for hurt, grievous hurt or qatl-i-khata", 3),
+    ("criminal breach of trust", 1),
+    ("what happens if someone steals my phone and threatens me", 1),
+    ("punishment for theft, robbery, dacoity and extortion", 4),
+    ("is adultery and fornication a crime", 1),
+    ("Ali killed Bashir in a fight. Is it murder?", 1),
+    ("Mr. Khan stole a car. What is the punishment?", 1),
+    ("What does s. 34 say? What is common intention?", 2),
+    ("What is theft? What is the punishment?", 1),
+    # Names and phrases joined by "and" that are not lists of offences
+    ("sale of obscene books and objects", 1),
+    ("abduction of women and children", 1),
+    ("offences relating to marriage and divorce", 1),
+    ("weights and measures", 1),
+    ("law and order", 1),
+    ("terms and conditions of bail", 1),
+    ("abetment of theft and robbery", 1),
+]
+
+
+def main():
+    """Show how the example questions decompose, flag unexpected splits and time decomposition"""
+    print("="*60)
+    print("Query Decomposition")
+    print("="*60)
+
+    thesaurus = Thesaurus()
+    unexpected = 0
+    for query, expected in EXAMPLES:
+        parts = decompose(query, thesaurus)
+        print(f"\n{'❓' if len(parts) == expected else '❌'} {query}")
+        for part in parts if len(parts) > 1 else []:
+            print(f"   ↳ {part}")
+        if len(parts) == 1:
+            print("   (single query)")
+        if len(parts) != expected:
+            unexpected += 1
+            print(f"   expected {expected} sub-queries")
+
+    runs = 1000
+    start = time.perf_counter()
+    for _ in range(runs):
+        for query, _ in EXAMPLES:
+            decompose(query, thesaurus)
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 {len(EXAMPLES) - unexpected}/{len(EXAMPLES)} examples split as expected")
+    print(f"📊 {elapsed / (runs * len(EXAMPLES)) * 1e6:.1f} µs per question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Definitions index for the terms defined in CHAPTER II (General Explanations)
+
+Terms such as "dishonestly", "wrongful gain" or "public servant" are defined once
+and used everywhere. The ingest step compiles every defined term into an
+Aho-Corasick automaton so retrieved text can be scanned for all of them in a
+single linear pass and the matching definitions attached to the context.
+"""
+import os
+import re
+import json
+from collections import deque
+from typing import List, Dict, Tuple
+from corpus import load_corpus
+from cross_references import estimate_tokens
+from config import INDEX_DIR, DEFINITIONS_TOKEN_BUDGET
+
+DEFINITIONS_FILE = "definitions.json"
+
+DEFINITIONS_CHAPTER = "# CHAPTER II"
+
+QUOTED_TERM_PATTERN = re.compile(r'"([^"]+)"')
+
+# Unquoted section titles that are themselves defined terms
+UNQUOTED_TERMS = {"22": ["Movable property"], "29": ["Document"]}
+
+# Defined words so common that attaching their definition would only add noise
+GENERIC_TERMS = {
+    "man", "woman", "person", "public", "government", "judge", "act", "omission",
+    "offence", "injury", "life", "death", "animal", "year", "month", "section",
+    "illegal", "a will"
+}
+
+# Defined nouns that take no plural
+UNCOUNTABLE_NOUNS = {"faith"}
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher over lowercase text"""
+
+    def __init__(self, goto=None, fail=None, output=None):
+        # State 0 is the root; goto[state] maps a character to the next state
+        self.goto = goto or [{}]
+        self.fail = fail or [0]
+        self.output = output or [[]]
+
+    @classmethod
+    def build(cls, patterns: List[str]) -> "AhoCorasick":
+        """Compile the automaton for a list of patterns"""
+        automaton = cls()
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = automaton.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(automaton.goto)
+                    automaton.goto[state][char] = next_state
+                    automaton.goto.append({})
+                    automaton.fail.append(0)
+                    automaton.output.append([])
+                state = next_state
+            automaton.output[state].append(index)
+
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(automaton.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in automaton.goto[state].items():
+                queue.append(next_state)
+                fallback = automaton.fail[state]
+                while fallback and char not in automaton.goto[fallback]:
+                    fallback = automaton.fail[fallback]
+                automaton.fail[next_state] = automaton.goto[fallback].get(char, 0)
+                automaton.output[next_state] = automaton.output[next_state] + automaton.output[automaton.fail[next_state]]
+
+        return automaton
+
+    def search(self, text: str) -> List[Tuple[int, int]]:
+        """Return (end_index, pattern_index) for every match in text"""
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern_index in self.output[state]:
+                matches.append((position, pattern_index))
+        return matches
+
+    def to_dict(self) -> Dict:
+        """Plain data form of the automaton for JSON storage"""
+        return {'goto': self.goto, 'fail': self.fail, 'output': self.output}
+
+
+def extract_defined_terms(corpus: Dict) -> List[Tuple[str, str]]:
+    """Return (term, section_id) pairs for the terms defined in CHAPTER II"""
+    terms = []
+    for section in corpus['sections']:
+        if section['chapter_title'] != DEFINITIONS_CHAPTER:
+            continue
+
+        candidates = QUOTED_TERM_PATTERN.findall(section['title'])
+        candidates += UNQUOTED_TERMS.get(section['section_id'], [])
+        for candidate in candidates:
+            term = ' '.join(candidate.lower().split())
+            if term not in GENERIC_TERMS:
+                terms.append((term, section['section_id']))
+    return terms
+
+
+def pluralize(noun: str) -> str:
+    """Regular English plural of a noun: property -> properties, loss -> losses, gain -> gains"""
+    if re.search(r'[^aeiou]y$', noun):
+        return noun[:-1] + 'ies'
+    if re.search(r'(?:s|x|z|ch|sh)$', noun):
+        return noun + 'es'
+    return noun + 's'
+
+
+def plural_forms(term: str) -> List[str]:
+    """
+    Plural of a defined noun phrase, pluralising its head noun
+
+    The head is the last word, or the word before "of" ("servants of the state").
+    Adverbs ("dishonestly"), verb phrases ("reason to believe", "gaining
+    wrongfully") and mass nouns ("good faith") have no plural.
+    """
+    words = term.split()
+    head = words.index('of', 1) - 1 if 'of' in words[1:] else len(words) - 1
+    if 'to' in words or words[0].endswith('ing') or words[head].endswith('ly') or words[head] in UNCOUNTABLE_NOUNS:
+        return []
+    return [' '.join(words[:head] + [pluralize(words[head])] + words[head + 1:])]
+
+
+def build_definitions_index(corpus: Dict) -> Dict:
+    """Compile the defined terms, their plural forms and definitions into a serializable index"""
+    patterns = []
+    pattern_sections = []
+    for term, section_id in extract_defined_terms(corpus):
+        for variant in [term] + plural_forms(term):
+            if variant not in patterns:
+                patterns.append(variant)
+                pattern_sections.append(section_id)
+
+    definitions = {}
+    for section_id in set(pattern_sections):
+        section = corpus['sections_by_id'][section_id]
+        definitions[section_id] = f"{section['heading']}\n{section['content']}"
+
+    return {
+        'patterns': patterns,
+        'pattern_sections': pattern_sections,
+        'definitions': definitions,
+        'automaton': AhoCorasick.build(patterns).to_dict()
+    }
+
+
+def save_definitions_index(index_dir: str = INDEX_DIR) -> str:
+    """Build the definitions index from ppc.md and store it in the index directory"""
+    index = build_definitions_index(load_corpus())
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, DEFINITIONS_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    return path
+
+
+class DefinitionsIndex:
+    """Find the Chapter II definitions that apply to a piece of retrieved text"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        path = os.path.join(index_dir, DEFINITIONS_FILE)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            automaton = index['automaton']
+            self.automaton = AhoCorasick(automaton['goto'], automaton['fail'], automaton['output'])
+        else:
+            index = build_definitions_index(load_corpus())
+            self.automaton = AhoCorasick.build(index['patterns'])
+
+        self.patterns = index['patterns']
+        self.pattern_sections = index['pattern_sections']
+        self.definitions = index['definitions']
+
+    def find_terms(self, text: str) -> List[Tuple[str, str]]:
+        """Return the (term, section_id) pairs found in text as whole words, in order of appearance"""
+        lowered = text.lower()
+        found = []
+        seen = set()
+        for end, pattern_index in self.automaton.search(lowered):
+            pattern = self.patterns[pattern_index]
+            start = end - len(pattern) + 1
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            if end + 1 < len(lowered) and lowered[end + 1].isalnum():
+                continue
+            if pattern_index not in seen:
+                seen.add(pattern_index)
+                found.append((pattern, self.pattern_sections[pattern_index]))
+        return found
+
+    def attach(self, texts: List[str], exclude_sections=(),
+               token_budget: int = DEFINITIONS_TOKEN_BUDGET) -> List[Dict]:
+        """
+        Scan retrieved texts once and collect the definitions of the terms they use
+
+        Returns:
+            List of {'section_id', 'terms', 'content'} dictionaries within token_budget
+        """
+        terms_by_section = {}
+        for term, section_id in self.find_terms("\n".join(texts)):
+            if section_id not in exclude_sections:
+                terms_by_section.setdefault(section_id, []).append(term)
+
+        attached = []
+        tokens_used = 0
+        for section_id, terms in terms_by_section.items():
+            content = self.definitions[section_id]
+            cost = estimate_tokens(content)
+            if tokens_used + cost > token_budget:
+                continue
+            tokens_used += cost
+            attached.append({'section_id': section_id, 'terms': terms, 'content': content})
+        return attached
@@ -0,0 +1,309 @@
+"""
+Runtime A/B experiments over retrieval and generation settings
+
+The search and generation settings in config.py are fixed at import, so trying
+a different alpha, chunk size or Gemini model meant a redeploy and gave no data
+on what it cost. An experiment is instead a set of named parameter profiles
+(arms) in the JSON file named by EXPERIMENTS_FILE:
+
+    {
+      "name": "lean-context",
+      "arms": [
+        {"name": "control", "weight": 1, "params": {}},
+        {"name": "lean", "weight": 1,
+         "params": {"search_limit": 3, "max_chunks": 3, "chunk_size": 500, "model": "gemini-2.0-flash-lite"}}
+      ]
+    }
+
+Every chat session is assigned an arm by a hash of the experiment name and the
+session id, so a session keeps its arm across reruns and restarts, and the split
+follows the weights. The file is re-read when it changes, so experiments start,
+stop and change without a restart; an invalid file keeps the last valid one.
+
+Each answered question is logged with its arm, the Gemini tokens it used and
+their cost. The sidebar shows the running totals of this process, and
+`python experiments.py` reports latency, tokens and cost per arm from the query log.
+"""
+import os
+import json
+import hashlib
+import threading
+import argparse
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Optional, Any
+from config import (
+    EXPERIMENTS_FILE,
+    DEFAULT_ALPHA,
+    DEFAULT_SEARCH_LIMIT,
+    DEFAULT_MAX_CHUNKS,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_OVERLAP,
+    GEMINI_MODEL,
+    GEMINI_PRICES
+)
+
+# Settings an arm may override, with their defaults
+PARAMETERS = {
+    "alpha": DEFAULT_ALPHA,
+    "search_limit": DEFAULT_SEARCH_LIMIT,
+    "max_chunks": DEFAULT_MAX_CHUNKS,
+    "chunk_size": DEFAULT_CHUNK_SIZE,
+    "overlap": DEFAULT_OVERLAP,
+    "model": GEMINI_MODEL
+}
+
+LATENCY_SAMPLES = 1000
+
+_arm: ContextVar[Optional[Dict]] = ContextVar("experiment_arm", default=None)
+
+
+def _is_number(value) -> bool:
+    """Whether a JSON value is a number; true and false are not"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_param(arm_name: str, name: str, value):
+    """Raise ValueError unless value has the type of the parameter's default"""
+    default = PARAMETERS[name]
+    if isinstance(default, float):
+        valid = _is_number(value)
+    elif isinstance(default, int):
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, type(default))
+    if not valid:
+        raise ValueError(f"arm {arm_name!r} sets {name} to {value!r}, expected {type(default).__name__}")
+
+
+def validate(experiment: Dict) -> Dict:
+    """Check an experiment definition; raises ValueError if it cannot be run"""
+    if not isinstance(experiment, dict):
+        raise ValueError("an experiment must be a JSON object")
+    if not experiment.get("name") or not isinstance(experiment["name"], str):
+        raise ValueError("an experiment needs a name")
+    if not experiment.get("arms") or not isinstance(experiment["arms"], list):
+        raise ValueError("an experiment needs a list of at least one arm")
+    names = set()
+    for arm in experiment["arms"]:
+        if not isinstance(arm, dict):
+            raise ValueError(f"every arm must be a JSON object: {arm!r}")
+        if not arm.get("name") or not isinstance(arm["name"], str) or arm["name"] in names:
+            raise ValueError(f"arm names must be present, strings and unique: {arm.get('name')!r}")
+        names.add(arm["name"])
+        weight = arm.get("weight", 1)
+        if not _is_number(weight) or not 0 <= weight < float("inf"):
+            raise ValueError(f"arm {arm['name']!r} has weight {weight!r}, expected a non-negative number")
+        params = arm.get("params", {})
+        if not isinstance(params, dict):
+            raise ValueError(f"arm {arm['name']!r} has params {params!r}, expected an object")
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f"arm {arm['name']!r} sets unknown parameters: {', '.join(sorted(unknown))}")
+        for name, value in params.items():
+            _check_param(arm["name"], name, value)
+    if not sum(arm.get("weight", 1) for arm in experiment["arms"]):
+        raise ValueError("every arm has weight 0")
+    return experiment
+
+
+class ExperimentRegistry:
+    """The running experiment, reloaded whenever its file changes"""
+
+    def __init__(self, path: str = EXPERIMENTS_FILE):
+        self.path = path
+        self.error = None
+        self._lock = threading.Lock()
+        self._stat = None
+        self._experiment = None
+
+    def current(self) -> Optional[Dict]:
+        """The running experiment, or None if there is none or it is disabled"""
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        with self._lock:
+            if signature != self._stat:
+                self._stat = signature
+                if signature is None:
+                    self._experiment, self.error = None, None
+                else:
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            self._experiment, self.error = validate(json.load(f)), None
+                    except Exception as e:
+                        # A bad edit must not take down traffic; the last valid experiment keeps running
+                        self.error = str(e) or type(e).__name__
+            experiment = self._experiment
+        return experiment if experiment and experiment.get("enabled", True) else None
+
+    def assign(self, session_id: str) -> Optional[Dict]:
+        """
+        The arm of the running experiment a session belongs to
+
+        Returns:
+            {"experiment", "arm", "params"} with every parameter filled in, or None
+        """
+        experiment = self.current()
+        if experiment is None:
+            return None
+        digest = hashlib.sha256(f"{experiment['name']}:{session_id}".encode('utf-8')).digest()
+        total = sum(arm.get("weight", 1) for arm in experiment["arms"])
+        point = int.from_bytes(digest[:8], 'big') / 2 ** 64 * total
+        for arm in experiment["arms"]:
+            point -= arm.get("weight", 1)
+            if point < 0:
+                break
+        return {"experiment": experiment["name"], "arm": arm["name"], "params": dict(PARAMETERS, **arm.get("params", {}))}
+
+
+_registry = ExperimentRegistry()
+
+
+def get_experiment_registry() -> ExperimentRegistry:
+    """Process-wide experiment registry"""
+    return _registry
+
+
+@contextmanager
+def experiment_arm(session_id: str):
+    """Run the enclosed request with the settings of the session's arm; yields the arm or None"""
+    arm = _registry.assign(session_id)
+    token = _arm.set(arm)
+    try:
+        yield arm
+    finally:
+        _arm.reset(token)
+
+
+def current_arm() -> Optional[Dict]:
+    """The arm of the current request, or None outside an experiment"""
+    return _arm.get()
+
+
+def experiment_param(name: str) -> Any:
+    """A setting as the current request's arm has it, or its config.py default"""
+    arm = _arm.get()
+    return arm["params"][name] if arm else PARAMETERS[name]
+
+
+def usage_cost(usage: List[Dict]) -> Dict:
+    """
+    Total the Gemini calls of one request
+
+    Returns:
+        {"calls", "cached", "input_tokens", "output_tokens", "usd"}; cached calls cost nothing
+    """
+    totals = {"calls": len(usage), "cached": 0, "input_tokens": 0, "output_tokens": 0, "usd": 0.0}
+    for call in usage:
+        totals["cached"] += call["cached"]
+        totals["input_tokens"] += call["input_tokens"]
+        totals["output_tokens"] += call["output_tokens"]
+        input_price, output_price = GEMINI_PRICES.get(call["model"], (0.0, 0.0))
+        totals["usd"] += (call["input_tokens"] * input_price + call["output_tokens"] * output_price) / 1_000_000
+    return totals
+
+
+class ExperimentMetrics:
+    """Thread-safe per-arm latency, token and cost counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def record(self, arm: Dict, latency: float, cost: Dict):
+        """Record one answered request of an arm"""
+        key = (arm["experiment"], arm["arm"])
+        with self._lock:
+            metrics = self._metrics.setdefault(key, {
+                "requests": 0, "latencies": deque(maxlen=LATENCY_SAMPLES),
+                "input_tokens": 0, "output_tokens": 0, "cached": 0, "calls": 0, "usd": 0.0
+            })
+            metrics["requests"] += 1
+            metrics["latencies"].append(latency)
+            for field in ("input_tokens", "output_tokens", "cached", "calls", "usd"):
+                metrics[field] += cost[field]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-arm requests, p50 and p95 latency in ms, tokens and cost per request"""
+        with self._lock:
+            return {
+                f"{experiment}/{arm}": summarize(
+                    metrics["requests"], list(metrics["latencies"]), metrics["input_tokens"],
+                    metrics["output_tokens"], metrics["cached"], metrics["calls"], metrics["usd"]
+                )
+                for (experiment, arm), metrics in self._metrics.items()
+            }
+
+
+def summarize(requests: int, latencies: List[float], input_tokens: int, output_tokens: int,
+              cached: int, calls: int, usd: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "p50_ms": ordered[len(ordered) // 2] * 1000 if ordered else 0.0,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000 if ordered else 0.0,
+        "input_tokens": input_tokens / requests if requests else 0.0,
+        "output_tokens": output_tokens / requests if requests else 0.0,
+        "cache_rate": cached / calls if calls else 0.0,
+        "usd_per_1k": usd / requests * 1000 if requests else 0.0
+    }
+
+
+_metrics = ExperimentMetrics()
+
+
+def get_experiment_metrics() -> ExperimentMetrics:
+    """Process-wide experiment metrics"""
+    return _metrics
+
+
+def main():
+    """Report latency, tokens and cost per arm from the query log"""
+    from query_log import get_query_log
+
+    parser = argparse.ArgumentParser(description="Compare experiment arms on logged traffic")
+    parser.add_argument("--experiment", help="Only this experiment (default: every experiment in the log)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("Experiment Report")
+    print("="*60)
+
+    experiment = get_experiment_registry().current()
+    if get_experiment_registry().error:
+        print(f"⚠️  {EXPERIMENTS_FILE} is invalid: {get_experiment_registry().error}")
+    print(f"🧪 Running: {experiment['name'] if experiment else 'none'}")
+
+    arms = {}
+    for entry in get_query_log().entries():
+        if "x" not in entry or (args.experiment and not entry["x"]["arm"].startswith(f"{args.experiment}/")):
+            continue
+        arm = arms.setdefault(entry["x"]["arm"], {
+            "requests": 0, "latencies": [], "input_tokens": 0, "output_tokens": 0, "cached": 0, "calls": 0, "usd": 0.0
+        })
+        arm["requests"] += 1
+        arm["latencies"].append(entry["ms"] / 1000)
+        arm["input_tokens"] += entry["x"]["in"]
+        arm["output_tokens"] += entry["x"]["out"]
+        arm["cached"] += entry["x"]["cached"]
+        arm["calls"] += entry["x"]["calls"]
+        arm["usd"] += entry["x"]["usd"]
+
+    if not arms:
+        print("\nNo logged requests ran under an experiment.")
+        return
+    for name, arm in sorted(arms.items()):
+        summary = summarize(**arm)
+        print(f"\n📊 {name}: {summary['requests']} requests")
+        print(f"   latency p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms")
+        print(f"   tokens {summary['input_tokens']:.0f} in / {summary['output_tokens']:.0f} out per request, "
+              f"{summary['cache_rate']:.0%} of Gemini calls cached")
+        print(f"   cost ${summary['usd_per_1k']:.3f} per 1,000 requests")
+
+
+if __name__ == "__main__":
+    main()
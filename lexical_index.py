@@ -0,0 +1,177 @@
+"""
+Embedded SQLite FTS5 lexical index over the PPC sections
+
+The keyword half of retrieval otherwise lives inside Weaviate's hybrid query,
+where it cannot be tuned, inspected or run offline. This index is built from the
+parsed sections with a tokenizer that treats '-' as a word character, so section
+ids such as "489-F" and transliterated terms such as "qatl-i-amd" stay single
+tokens. Queries are ranked with BM25 and return highlighted snippets.
+"""
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Dict, Optional
+from corpus import load_corpus, tokenize, normalize_section_id
+from config import INDEX_DIR, LEXICAL_SEARCH_LIMIT
+
+LEXICAL_INDEX_FILE = "lexical.sqlite"
+
+TOKENIZER = "unicode61 tokenchars '-'"
+
+# BM25 column weights: section_id, chapter_title, title, group_heading, content
+COLUMN_WEIGHTS = (10.0, 0.0, 5.0, 2.0, 1.0)
+
+SECTION_MENTION_PATTERN = re.compile(r'\b(?:section|sec\.?|s\.)\s*(\d+(?:\s*-?\s*[a-z]\b)?)', re.I)
+
+SNIPPET_TOKENS = 24
+
+
+def section_mentions(query: str) -> List[str]:
+    """Normalized ids of the sections a query names explicitly, e.g. "section 489F" -> "489-F" """
+    mentions = []
+    for mention in SECTION_MENTION_PATTERN.findall(query):
+        section_id = normalize_section_id(mention)
+        if section_id and section_id not in mentions:
+            mentions.append(section_id)
+    return mentions
+
+
+def fts_query(query: str) -> str:
+    """Turn free text into an FTS5 OR-query of quoted tokens; empty if nothing is searchable"""
+    terms = [section_id.lower() for section_id in section_mentions(query)]
+    for token in tokenize(query):
+        if token not in terms:
+            terms.append(token)
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def build_lexical_index(path: str):
+    """Create the FTS5 table at path from the parsed sections"""
+    corpus = load_corpus()
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE sections USING fts5(
+            section_id, chapter_title, title, group_heading, content, heading UNINDEXED,
+            tokenize="{TOKENIZER}"
+        )
+    """)
+    seen = set()
+    rows = []
+    for section in corpus['sections']:
+        if section['section_id'] in seen:
+            continue
+        seen.add(section['section_id'])
+        rows.append((
+            section['section_id'], section['chapter_title'], section['title'],
+            section['group'], section['content'], section['heading']
+        ))
+    conn.executemany("INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.execute("INSERT INTO sections(sections) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+
+    os.replace(tmp_path, path)
+
+
+def save_lexical_index(index_dir: str = INDEX_DIR) -> str:
+    """Build the FTS5 index from ppc.md and store it in the index directory"""
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, LEXICAL_INDEX_FILE)
+    build_lexical_index(path)
+    return path
+
+
+class LexicalIndex:
+    """BM25 keyword search over the sections, one read-only connection per thread"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.path = os.path.join(index_dir, LEXICAL_INDEX_FILE)
+        if not os.path.exists(self.path):
+            # Building takes well under a second, so a missing index is created on first use
+            save_lexical_index(index_dir)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def search(self, query: str, limit: int = LEXICAL_SEARCH_LIMIT,
+               chapter_titles: Optional[List[str]] = None,
+               section_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Rank sections against the query with BM25
+
+        Args:
+            query: Free-text query
+            limit: Maximum number of sections to return
+            chapter_titles: Only search these chapters (e.g. ["# CHAPTER XVII"])
+            section_ids: Only search these sections (e.g. ["489-F"])
+
+        Returns:
+            List of {'section_id', 'chapter', 'title', 'content', 'snippet', 'score'}
+            dictionaries, best first; higher scores are better
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+
+        sql = f"""
+            SELECT section_id, chapter_title, title, heading, content,
+                   snippet(sections, 4, '**', '**', ' ... ', {SNIPPET_TOKENS}) AS snippet,
+                   bm25(sections, {', '.join(str(weight) for weight in COLUMN_WEIGHTS)}) AS rank
+            FROM sections
+            WHERE sections MATCH ?
+        """
+        params = [match]
+        if chapter_titles:
+            sql += f" AND chapter_title IN ({', '.join('?' for _ in chapter_titles)})"
+            params.extend(chapter_titles)
+        if section_ids:
+            sql += f" AND section_id IN ({', '.join('?' for _ in section_ids)})"
+            params.extend(section_ids)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        return [
+            {
+                'section_id': row['section_id'],
+                'chapter': row['chapter_title'],
+                'title': row['title'],
+                'content': f"{row['heading']}\n{row['content']}",
+                'snippet': row['snippet'],
+                # FTS5 bm25() is negative with lower meaning better
+                'score': round(-row['rank'], 4)
+            }
+            for row in self._connection().execute(sql, params)
+        ]
+
+    def get_sections(self, section_ids: List[str]) -> List[Dict]:
+        """Fetch sections by id in the given order, without ranking"""
+        if not section_ids:
+            return []
+        rows = self._connection().execute(
+            f"""SELECT section_id, chapter_title, title, heading, content FROM sections
+                WHERE section_id IN ({', '.join('?' for _ in section_ids)})""",
+            section_ids
+        ).fetchall()
+        by_id = {row['section_id']: row for row in rows}
+        return [
+            {
+                'section_id': section_id,
+                'chapter': by_id[section_id]['chapter_title'],
+                'title': by_id[section_id]['title'],
+                'content': f"{by_id[section_id]['heading']}\n{by_id[section_id]['content']}",
+                'snippet': '',
+                'score': 'exact'
+            }
+            for section_id in section_ids if section_id in by_id
+        ]
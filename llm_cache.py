@@ -0,0 +1,304 @@
+"""
+Persistent response cache for Gemini calls
+
+Responses are stored in a SQLite database in WAL mode, keyed by a hash of the
+model name, prompt and generation parameters. The database is shared by every
+process that points at the same file, so Streamlit workers, the CLI and batch
+runs all reuse each other's answers and nothing is lost on restart.
+"""
+import os
+import json
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+import google.generativeai as genai
+from contextlib import contextmanager
+from contextvars import ContextVar
+from admission import get_admission_controller
+from experiments import experiment_param
+from config import GEMINI_API_KEY, LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES
+
+# Configure Gemini
+genai.configure(api_key=GEMINI_API_KEY)
+
+# Fraction of the size limit the cache is trimmed down to when it overflows,
+# so eviction does not run again on the very next insert
+EVICTION_TARGET = 0.9
+
+# Hit and miss counts and access times are kept in memory and written out at
+# most this often (and with every insert), so lookups never take the write lock
+FLUSH_INTERVAL = 30.0
+
+
+class LLMCache:
+    """Disk-backed, size-bounded cache of LLM responses"""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._pending = {"hits": 0, "misses": 0, "accessed": {}}
+        self._last_flush = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+        # Running totals of the response sizes and count, kept in step by put and _evict
+        conn.execute("INSERT OR IGNORE INTO stats SELECT 'bytes', COALESCE(SUM(size), 0) FROM responses")
+        conn.execute("INSERT OR IGNORE INTO stats SELECT 'entries', COUNT(*) FROM responses")
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; writes use explicit IMMEDIATE transactions
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model, prompt, params=None):
+        """Hash the model, prompt and generation parameters into a cache key"""
+        payload = json.dumps([model, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        conn = self._connect()
+        row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+
+        with self._pending_lock:
+            if row is None:
+                self._pending["misses"] += 1
+            else:
+                self._pending["hits"] += 1
+                accessed = self._pending["accessed"]
+                hits, _ = accessed.get(key, (0, 0.0))
+                accessed[key] = (hits + 1, time.time())
+            due = time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+
+        if due:
+            self.flush()
+        return row[0] if row else None
+
+    def _take_pending(self):
+        """Hand over the counts gathered since the last flush and start new ones"""
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = {"hits": 0, "misses": 0, "accessed": {}}
+            self._last_flush = time.monotonic()
+        return pending
+
+    def _write_pending(self, conn, pending):
+        """Apply gathered counts and access times inside the caller's write transaction"""
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (pending["hits"],))
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (pending["misses"],))
+        conn.executemany(
+            "UPDATE responses SET last_access = MAX(last_access, ?), hits = hits + ? WHERE key = ?",
+            [(accessed, hits, key) for key, (hits, accessed) in pending["accessed"].items()]
+        )
+
+    def flush(self):
+        """Write the hit and miss counts and access times gathered in memory to the database"""
+        pending = self._take_pending()
+        if not (pending["hits"] or pending["misses"]):
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn, pending)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, key, model, response):
+        """Store a response and evict the least recently used entries if over the limit"""
+        conn = self._connect()
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        # The insert takes the write lock anyway, so gathered counts go out with it
+        pending = self._take_pending()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_pending(conn, pending)
+            replaced = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            conn.execute(
+                "UPDATE stats SET value = value + ? WHERE name = 'bytes'",
+                (size - (replaced[0] if replaced else 0),)
+            )
+            if not replaced:
+                conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'entries'")
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        """Delete least recently used entries until the cache fits its size limit"""
+        total = conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * EVICTION_TARGET
+        evicted = 0
+        freed = 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total - freed <= target:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            freed += size
+            evicted += 1
+
+        conn.execute("UPDATE stats SET value = value - ? WHERE name = 'bytes'", (freed,))
+        conn.execute("UPDATE stats SET value = value - ? WHERE name = 'entries'", (evicted,))
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = 'evictions'", (evicted,))
+
+    def stats(self):
+        """
+        Return hit-rate and size statistics aggregated over all processes
+
+        Read-only: this process' unflushed counts are added in memory, other
+        processes' appear once they flush.
+        """
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        with self._pending_lock:
+            counters["hits"] += self._pending["hits"]
+            counters["misses"] += self._pending["misses"]
+        entries = counters["entries"]
+        total_bytes = counters["bytes"]
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    def clear(self):
+        """Remove every cached response and reset the statistics"""
+        self._take_pending()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM responses")
+            conn.execute("UPDATE stats SET value = 0")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache instance"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+            # Counts gathered since the last flush would otherwise be lost on exit
+            atexit.register(_cache.flush)
+    return _cache
+
+
+_usage: ContextVar = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage():
+    """Collect the Gemini calls made in the enclosed block; yields the list they are appended to"""
+    usage = []
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def current_usage():
+    """The Gemini calls of the current track_usage block so far, or [] outside one"""
+    return _usage.get() or []
+
+
+def generate_content(prompt, model_name=None, generation_config=None):
+    """
+    Generate text with Gemini, serving identical requests from the cache
+
+    model_name defaults to the model of the request's experiment arm, which is
+    GEMINI_MODEL outside an experiment. Only cache misses spend quota; they wait
+    for admission and raise admission.Overloaded when shed.
+    """
+    model_name = model_name or experiment_param("model")
+    cache = get_cache()
+    key = cache.make_key(model_name, prompt, generation_config)
+    usage = _usage.get()
+
+    cached = cache.get(key)
+    if cached is not None:
+        if usage is not None:
+            usage.append({"model": model_name, "cached": True, "input_tokens": 0, "output_tokens": 0})
+        return cached
+
+    controller = get_admission_controller()
+    if controller:
+        controller.acquire()
+
+    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+    response = model.generate_content(prompt)
+    text = response.text
+    cache.put(key, model_name, text)
+    if usage is not None:
+        metadata = getattr(response, "usage_metadata", None)
+        usage.append({
+            "model": model_name,
+            "cached": False,
+            "input_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+            "output_tokens": getattr(metadata, "candidates_token_count", 0) or 0
+        })
+    return text
+
+
+if __name__ == "__main__":
+    stats = get_cache().stats()
+    print(f"LLM cache: {LLM_CACHE_PATH}")
+    print(f"Entries: {stats['entries']} ({stats['bytes'] / 1024 / 1024:.1f} MB "
+          f"of {stats['max_bytes'] / 1024 / 1024:.0f} MB)")
+    print(f"Hits: {stats['hits']}, Misses: {stats['misses']}, Hit rate: {stats['hit_rate']:.1%}")
+    print(f"Evictions: {stats['evictions']}")
@@ -0,0 +1,337 @@
+"""
+Concurrent-user load test for the chat pipeline
+
+Simulates N chat sessions, each a thread like a Streamlit session, that send a
+realistic mix of questions through the same path as streamlit_app.process_user_input:
+punishment table fast path, classification, then retrieval and generation.
+Concurrency is ramped up step by step, and every step reports throughput, latency
+percentiles, error rate and the per-stage latencies recorded by search_engine. A
+stage is flagged as saturated at the first step where its median latency exceeds
+SATURATION_FACTOR times its single-user median.
+
+By default Weaviate and Gemini are replaced with mocks that sleep for a
+lognormal latency, so only the local stages (encoding, routing, local search,
+reranking) compete for the CPU. With --real the upstreams configured in .env
+are used.
+
+Usage:
+    python loadtest.py
+    python loadtest.py --levels 1 2 4 8 16 32 --duration 30 --think-time 2
+    python loadtest.py --real --levels 1 2 4 --output loadtest.json
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+from typing import List, Dict, Tuple
+import numpy as np
+
+# Weighted mix of the question shapes users send
+QUERY_MIX = [
+    (3, "What is the punishment for theft?"),
+    (2, "penalty for dishonestly issuing a cheque"),
+    (3, "What does section 489-F say?"),
+    (2, "Explain section 302 and section 34"),
+    (4, "What is the difference between culpable homicide and murder?"),
+    (3, "Can a person be punished for attempting to commit an offence?"),
+    (3, "What counts as criminal breach of trust by a public servant?"),
+    (2, "Is abetment of suicide an offence in Pakistan?"),
+    (2, "What are the defences available for acts done in private defence?"),
+    (2, "Explain qatl-i-khata and its punishment"),
+    (1, "Hello, who are you?"),
+    (1, "Thanks for the help")
+]
+
+# Median latencies of the mocked upstreams, in seconds
+MOCK_WEAVIATE_LATENCY = 0.08
+MOCK_GEMINI_LATENCY = 1.2
+MOCK_LATENCY_SIGMA = 0.35
+
+# A stage is saturated once its median latency exceeds this multiple of the single-user median
+SATURATION_FACTOR = 2.0
+
+# Throughput gain below which adding sessions no longer helps
+KNEE_GAIN = 0.10
+
+
+def _mock_sleep(median: float):
+    time.sleep(median * random.lognormvariate(0, MOCK_LATENCY_SIGMA))
+
+
+class MockCollection:
+    """Weaviate collection stand-in that answers hybrid queries from the local FTS index"""
+
+    def __init__(self, latency: float):
+        from lexical_index import LexicalIndex
+        self.latency = latency
+        self.lexical_index = LexicalIndex()
+        self.query = self
+
+    def hybrid(self, query, limit=4, **kwargs):
+        _mock_sleep(self.latency)
+        hits = self.lexical_index.search(query, limit)
+        return SimpleNamespace(objects=[
+            SimpleNamespace(
+                properties={"chapter_title": hit["chapter"], "content": hit["content"]},
+                metadata=SimpleNamespace(score=hit["score"])
+            )
+            for hit in hits
+        ])
+
+
+class MockClient:
+    """Weaviate client stand-in returning one MockCollection for every collection name"""
+
+    def __init__(self, latency: float):
+        collection = MockCollection(latency)
+        self.collections = SimpleNamespace(get=lambda name: collection)
+
+
+class MockGenerativeModel:
+    """Gemini model stand-in: sleeps, then classifies or returns a canned answer"""
+
+    latency = MOCK_GEMINI_LATENCY
+
+    def __init__(self, model_name, generation_config=None):
+        self.model_name = model_name
+
+    def generate_content(self, prompt):
+        _mock_sleep(self.latency)
+        if "query classification assistant" in prompt:
+            general = any(word in prompt.lower() for word in ("**user query:** hello", "**user query:** thanks"))
+            return SimpleNamespace(text="GENERAL" if general else "LEGAL")
+        return SimpleNamespace(text="Mock answer. (Chapter XVII, Section 379)")
+
+
+class ColdCache:
+    """Response cache stand-in that never hits, so every request reaches the LLM"""
+
+    def make_key(self, *args):
+        return ""
+
+    def get(self, key):
+        return None
+
+    def put(self, *args):
+        pass
+
+    def stats(self):
+        return {"hit_rate": 0.0, "entries": 0}
+
+
+def install_mocks(weaviate_latency: float, gemini_latency: float, cold: bool):
+    """Swap Gemini and the response cache for mocks and return a mock Weaviate client"""
+    import llm_cache
+    import admission
+
+    MockGenerativeModel.latency = gemini_latency
+    # The mock has no quota, so the admission queue would only measure itself
+    admission.ADMISSION_CONTROL = False
+    llm_cache.genai.GenerativeModel = MockGenerativeModel
+    # Mocked answers must never land in the real response cache
+    llm_cache._cache = ColdCache() if cold else llm_cache.LLMCache(
+        path=os.path.join(tempfile.mkdtemp(prefix="ppc-loadtest-"), "llm_cache.sqlite")
+    )
+    return MockClient(weaviate_latency)
+
+
+def answer_question(client, query: str) -> Dict[str, float]:
+    """Answer one question the way process_user_input does and return its stage timings"""
+    from database import load_punishment_table
+    from query_processing import query_classifier, handle_general_query
+    from search_engine import search_and_generate_response
+
+    timings = {}
+    start = time.perf_counter()
+    if load_punishment_table().answer(query):
+        timings["punishment_table"] = time.perf_counter() - start
+        return timings
+
+    start = time.perf_counter()
+    query_type = query_classifier(query)
+    timings["classify"] = time.perf_counter() - start
+
+    if query_type == "GENERAL":
+        handle_general_query(query)
+        return timings
+
+    result = search_and_generate_response(client, query)
+    if not isinstance(result, dict):
+        raise RuntimeError(result)
+    timings.update(result["timings"])
+    return timings
+
+
+def run_session(client, queries: List[Tuple[int, str]], deadline: float, think_time: float,
+                seed: int, records: List[Dict], lock: threading.Lock):
+    """One simulated user: ask, wait for the answer, think, repeat until the deadline"""
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in queries]
+    texts = [text for _, text in queries]
+
+    while time.perf_counter() < deadline:
+        query = rng.choices(texts, weights)[0]
+        start = time.perf_counter()
+        try:
+            stages, error = answer_question(client, query), None
+        except Exception as e:
+            stages, error = {}, str(e)
+        record = {"latency": time.perf_counter() - start, "stages": stages, "error": error}
+        with lock:
+            records.append(record)
+
+        if think_time > 0:
+            time.sleep(rng.expovariate(1.0 / think_time))
+
+
+def run_level(client, sessions: int, duration: float, think_time: float,
+              queries: List[Tuple[int, str]]) -> Dict:
+    """Run one concurrency step and summarize it"""
+    records = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(client, queries, deadline, think_time, seed, records, lock),
+            daemon=True
+        )
+        for seed in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [record["latency"] for record in records if record["error"] is None]
+    stage_samples = {}
+    for record in records:
+        for stage, seconds in record["stages"].items():
+            stage_samples.setdefault(stage, []).append(seconds)
+
+    def percentile(samples, q):
+        return float(np.percentile(samples, q)) if samples else 0.0
+
+    return {
+        "sessions": sessions,
+        "requests": len(records),
+        "throughput": len(latencies) / elapsed,
+        "error_rate": sum(record["error"] is not None for record in records) / len(records) if records else 0.0,
+        "errors": sorted({record["error"] for record in records if record["error"]})[:3],
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "stages": {
+            stage: {"p50": percentile(samples, 50), "p95": percentile(samples, 95), "count": len(samples)}
+            for stage, samples in stage_samples.items()
+        }
+    }
+
+
+def find_saturation(levels: List[Dict]) -> Dict:
+    """Locate the throughput knee and the first saturated step of every stage"""
+    knee = None
+    for previous, current in zip(levels, levels[1:]):
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 + KNEE_GAIN):
+            knee = previous["sessions"]
+            break
+
+    baseline = levels[0]["stages"] if levels else {}
+    saturated = {}
+    for stage, stats in baseline.items():
+        for level in levels[1:]:
+            current = level["stages"].get(stage)
+            if current and stats["p50"] and current["p50"] > SATURATION_FACTOR * stats["p50"]:
+                saturated[stage] = level["sessions"]
+                break
+
+    return {"knee_sessions": knee, "saturated_stages": saturated}
+
+
+def print_level(level: Dict):
+    print(f"👥 {level['sessions']:>3} sessions  {level['requests']:>5} requests  "
+          f"{level['throughput']:6.2f} req/s  p50 {level['p50']:6.2f}s  p95 {level['p95']:6.2f}s  "
+          f"p99 {level['p99']:6.2f}s  errors {level['error_rate']:.1%}")
+    stages = "  ".join(
+        f"{stage} {stats['p50'] * 1000:.0f}/{stats['p95'] * 1000:.0f}ms"
+        for stage, stats in level["stages"].items()
+    )
+    print(f"     stages p50/p95: {stages}")
+    for error in level["errors"]:
+        print(f"     ❌ {error[:120]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent sessions against the chat pipeline")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Concurrent sessions at each step of the ramp")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per step")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="Mean pause between a session's questions, in seconds")
+    parser.add_argument("--real", action="store_true", help="Use the real Weaviate and Gemini upstreams")
+    parser.add_argument("--cold", action="store_true", help="Bypass the LLM response cache (mock mode)")
+    parser.add_argument("--weaviate-latency", type=float, default=MOCK_WEAVIATE_LATENCY)
+    parser.add_argument("--gemini-latency", type=float, default=MOCK_GEMINI_LATENCY)
+    parser.add_argument("--queries", help="Text file with one question per line instead of the built-in mix")
+    parser.add_argument("--output", help="Write the curve and saturation report to this JSON file")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("Pakistan Penal Code - Pipeline Load Test")
+    print("="*60)
+
+    queries = QUERY_MIX
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [(1, line.strip()) for line in f if line.strip()]
+
+    if args.real:
+        from database import initialize_weaviate_client
+        client = initialize_weaviate_client()
+        if client is None:
+            print("❌ Could not connect to Weaviate")
+            return
+        print("🌐 Using real Weaviate and Gemini upstreams")
+    else:
+        client = install_mocks(args.weaviate_latency, args.gemini_latency, args.cold)
+        print(f"🧪 Mock upstreams: Weaviate ~{args.weaviate_latency * 1000:.0f} ms, "
+              f"Gemini ~{args.gemini_latency * 1000:.0f} ms{', cache bypassed' if args.cold else ''}")
+
+    # Load models and indexes before measuring
+    answer_question(client, queries[0][1])
+    print(f"📋 {len(queries)} distinct questions, {args.duration:.0f}s per step\n")
+
+    levels = []
+    for sessions in args.levels:
+        level = run_level(client, sessions, args.duration, args.think_time, queries)
+        levels.append(level)
+        print_level(level)
+
+    report = find_saturation(levels)
+    print()
+    if report["knee_sessions"]:
+        print(f"📈 Throughput stops scaling beyond {report['knee_sessions']} concurrent sessions")
+    else:
+        print("📈 Throughput kept scaling across the tested range")
+    for stage, sessions in report["saturated_stages"].items():
+        print(f"🔥 Stage '{stage}' saturates at {sessions} sessions "
+              f"(median above {SATURATION_FACTOR:.0f}x its single-user median)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"levels": levels, **report}, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+
+    if args.real:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
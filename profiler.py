@@ -0,0 +1,206 @@
+"""
+On-demand profiler for a single chat request
+
+RequestProfiler wraps one request in a sampling profiler and tracemalloc. A
+background thread samples the request thread's Python stack through
+sys._current_frames() every few milliseconds, and tracemalloc tracks the peak
+and the largest allocation sites. The result holds the hot functions, folded
+stacks for a flame graph and the top allocations. It is saved as JSON plus a
+.folded file that flamegraph.pl or speedscope can open.
+
+Concurrent requests may be profiled at once. tracemalloc is process-wide, so it
+is started by the first active profiler and stopped by the last, and the peak
+is only reset when no other profiler is running. A profile that overlapped
+another one reports a peak that includes the other request's allocations.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict
+from config import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_TOP_N
+
+# Shared tracemalloc state: active profilers, profilers entered so far, and
+# whether a profiler (rather than the process) started tracing
+_tracemalloc_lock = threading.Lock()
+_active_profilers = 0
+_entered_profilers = 0
+_started_tracemalloc = False
+
+
+def frame_label(frame) -> str:
+    """Identify a frame by function, file and first line so all lines of a function merge"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfiler:
+    """Context manager that profiles the calling thread until exit"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, profile_dir: str = PROFILE_DIR):
+        self.interval = interval
+        self.profile_dir = profile_dir
+        self.stacks = Counter()
+        self.samples = 0
+        self.result = None
+        self._stop = threading.Event()
+        self._thread_id = None
+        self._sampler = None
+        self._entry = 0
+        self._overlapped = False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def __enter__(self):
+        global _active_profilers, _entered_profilers, _started_tracemalloc
+        self._thread_id = threading.get_ident()
+        with _tracemalloc_lock:
+            if _active_profilers == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracemalloc = True
+            self._overlapped = _active_profilers > 0
+            if not self._overlapped:
+                tracemalloc.reset_peak()
+            _active_profilers += 1
+            _entered_profilers += 1
+            self._entry = _entered_profilers
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active_profilers, _started_tracemalloc
+        duration = time.perf_counter() - self._start
+        self._stop.set()
+        self._sampler.join()
+
+        with _tracemalloc_lock:
+            current, peak = tracemalloc.get_traced_memory()
+            try:
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__)
+                ])
+            except RuntimeError:
+                # Tracing was stopped outside the profiler
+                snapshot = None
+            self._overlapped = self._overlapped or _entered_profilers > self._entry
+            _active_profilers -= 1
+            if _active_profilers == 0 and _started_tracemalloc:
+                tracemalloc.stop()
+                _started_tracemalloc = False
+
+        self.result = self._summarize(duration, peak - self._memory_start, current - self._memory_start, snapshot)
+        self.result["paths"] = self.save()
+        return False
+
+    def _summarize(self, duration: float, peak: int, retained: int, snapshot) -> Dict:
+        """Reduce the samples and the allocation snapshot to the rendered profile"""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+
+        seconds_per_sample = duration / self.samples if self.samples else 0.0
+        hot_functions = [
+            {
+                "function": label,
+                "total_ms": total_counts[label] * seconds_per_sample * 1000,
+                "self_ms": self_counts[label] * seconds_per_sample * 1000,
+                "total_pct": total_counts[label] / self.samples
+            }
+            for label, _ in self_counts.most_common(PROFILE_TOP_N)
+        ]
+
+        allocations = [
+            {
+                "location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "size_kb": stat.size / 1024,
+                "count": stat.count
+            }
+            for stat in (snapshot.statistics("lineno")[:PROFILE_TOP_N] if snapshot is not None else [])
+        ]
+
+        return {
+            "id": f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}",
+            "duration_ms": duration * 1000,
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "hot_functions": hot_functions,
+            "folded": {";".join(stack): count for stack, count in self.stacks.items()},
+            "peak_kb": max(peak, 0) / 1024,
+            "retained_kb": retained / 1024,
+            "overlapped": self._overlapped,
+            "allocations": allocations
+        }
+
+    def save(self) -> Dict[str, str]:
+        """Write the profile as JSON and as folded stacks; returns the file paths"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, self.result["id"])
+
+        with open(base + ".json", 'w', encoding='utf-8') as f:
+            json.dump(self.result, f, indent=1)
+        with open(base + ".folded", 'w', encoding='utf-8') as f:
+            for stack, count in self.result["folded"].items():
+                f.write(f"{stack} {count}\n")
+        return {"json": base + ".json", "folded": base + ".folded"}
+
+
+def flame_graph_rows(folded: Dict[str, int], max_depth: int = 14, min_share: float = 0.01):
+    """
+    Lay out folded stacks as icicle rows for rendering
+
+    Returns:
+        List of rows (root first), each a list of (label, start, width) with
+        start and width as fractions of all samples
+    """
+    total = sum(folded.values())
+    if not total:
+        return []
+
+    # Merge stacks into a tree of {label: [count, children]}
+    tree = {}
+    for stack, count in folded.items():
+        level = tree
+        for label in stack.split(";")[:max_depth]:
+            node = level.setdefault(label, [0, {}])
+            node[0] += count
+            level = node[1]
+
+    rows = []
+    frontier = [(tree, 0.0)]
+    while frontier:
+        row = []
+        next_frontier = []
+        for level, start in frontier:
+            offset = start
+            for label, (count, children) in sorted(level.items(), key=lambda item: -item[1][0]):
+                width = count / total
+                if width >= min_share:
+                    row.append((label, offset, width))
+                    next_frontier.append((children, offset))
+                offset += width
+        if not row:
+            break
+        rows.append(row)
+        frontier = next_frontier
+    return rows
@@ -0,0 +1,322 @@
+"""
+Structured punishment table extracted from ppc.md
+
+"What is the punishment for ..." is the most common query shape. The ingest step
+extracts, for every section that prescribes a punishment, the imprisonment range,
+fine, death/life flags and the qisas/diyat/ta'zir classification into a small
+SQLite table. Matching queries are then answered from the table in milliseconds
+with an exact citation; the LLM is only used to phrase the answer if enabled.
+"""
+import os
+import re
+import sqlite3
+from typing import List, Dict, Optional
+from corpus import load_corpus, tokenize, normalize_section_id
+from config import INDEX_DIR, PUNISHMENT_TABLE_USE_LLM
+
+PUNISHMENT_TABLE_FILE = "punishments.sqlite"
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18,
+    "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50
+}
+
+NUMBER = r'(\d+|(?:twenty|thirty|forty|fifty)(?:[- ](?:one|two|three|four|five|six|seven|eight|nine))?|' \
+         r'one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|' \
+         r'fifteen|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty)'
+UNIT = r'(years?|months?|days?)'
+
+MAX_TERM_PATTERN = re.compile(rf'(?:extend to|more than|exceeding)\s+{NUMBER}\s+{UNIT}', re.I)
+MIN_TERM_PATTERN = re.compile(rf'(?:not be less than|not less than)\s+{NUMBER}\s+{UNIT}', re.I)
+FINE_AMOUNT_PATTERN = re.compile(r'fine\s+(?:which may extend to|of|not less than|up to)\s+([\w,. -]{1,40}?rupees)', re.I)
+
+# Bare brackets, emphasis and table rules; amendment markers are already stripped by the corpus
+MARKER_PATTERN = re.compile(r'[\[\]|]|\*\*|-{3,}')
+
+# Punishments of other offences the section only refers to ("an offence punishable with death")
+REFERRED_PUNISHMENT_PATTERN = re.compile(r'punishable\s+(?:with|under)\b[^,.;]*', re.I)
+
+# Longest quoted clause kept in the table
+MAX_CLAUSE_CHARS = 400
+
+PENALTY_QUERY_PATTERN = re.compile(
+    r'\b(?:punishments?|penalt(?:y|ies)|penality|sentences?|jail|imprisonment|fine)\s+'
+    r'(?:is\s+there\s+)?(?:for|of|under|in)\s+(.+)',
+    re.I
+)
+
+SECTION_QUERY_PATTERN = re.compile(r'\b(?:section|sec\.?|s\.)\s*(\d+(?:\s*-?\s*[a-z])?)\b', re.I)
+
+SUFFIXES = ("ing", "tion", "ion", "ment", "ed", "es", "s")
+
+COLUMNS = [
+    "section_id", "chapter_title", "offence", "clause", "min_months", "max_months",
+    "imprisonment_kind", "fine", "fine_amount", "death", "life", "qisas", "diyat",
+    "arsh", "daman", "tazir", "forfeiture"
+]
+
+
+def _to_number(word: str) -> int:
+    word = word.lower().replace('-', ' ')
+    if word.isdigit():
+        return int(word)
+    return sum(NUMBER_WORDS[part] for part in word.split())
+
+
+def _to_months(number: str, unit: str) -> int:
+    value = _to_number(number)
+    unit = unit.lower()
+    if unit.startswith('year'):
+        return value * 12
+    if unit.startswith('month'):
+        return value
+    return max(1, value // 30)
+
+
+def stem(token: str) -> str:
+    """Crude suffix stripping so "abducting", "abduction" and "abducts" compare equal"""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[:-len(suffix)]
+    return token
+
+
+def stems(text: str) -> set:
+    return {stem(token) for token in tokenize(text)}
+
+
+def extract_punishment(section: Dict) -> Optional[Dict]:
+    """Extract the structured punishment of a section, or None if it prescribes none"""
+    text = ' '.join(MARKER_PATTERN.sub(' ', section['content']).split())
+    lowered = REFERRED_PUNISHMENT_PATTERN.sub(' ', text).lower()
+    if 'punish' not in lowered and 'liable to' not in lowered:
+        return None
+
+    max_terms = [_to_months(*match) for match in MAX_TERM_PATTERN.findall(lowered)]
+    min_terms = [_to_months(*match) for match in MIN_TERM_PATTERN.findall(lowered)]
+    fine_amount = FINE_AMOUNT_PATTERN.search(lowered)
+
+    record = {
+        "section_id": section['section_id'],
+        "chapter_title": section['chapter_title'],
+        "offence": section['title'],
+        "clause": "",
+        "min_months": min(min_terms) if min_terms else None,
+        "max_months": max(max_terms) if max_terms else None,
+        "imprisonment_kind": (
+            "rigorous" if "rigorous imprisonment" in lowered else
+            "simple" if "simple imprisonment" in lowered else
+            "either description" if "either description" in lowered else ""
+        ),
+        "fine": int("fine" in lowered),
+        "fine_amount": fine_amount.group(1).strip() if fine_amount else "",
+        "death": int(bool(re.search(r'\b(?:with|by) death\b|\bdeath as qisas\b', lowered))),
+        "life": int("imprisonment for life" in lowered),
+        "qisas": int("qisas" in lowered),
+        "diyat": int("diyat" in lowered),
+        "arsh": int(bool(re.search(r'\barsh\b', lowered))),
+        "daman": int(bool(re.search(r'\bdaman\b', lowered))),
+        "tazir": int("ta'zir" in lowered or "tazir" in lowered),
+        "forfeiture": int("forfeiture of property" in lowered)
+    }
+
+    has_punishment = any([
+        record["max_months"], record["min_months"], record["death"], record["life"],
+        record["fine"], record["qisas"], record["diyat"], record["arsh"], record["daman"]
+    ])
+    if not has_punishment:
+        return None
+
+    # Keep the first sentence that prescribes the punishment as the quoted clause
+    for sentence in re.split(r'(?<=\.)\s+', text):
+        if 'punish' in sentence.lower() or 'liable to' in sentence.lower():
+            clause = sentence.strip()
+            if len(clause) > MAX_CLAUSE_CHARS:
+                clause = clause[:MAX_CLAUSE_CHARS].rsplit(' ', 1)[0] + " ..."
+            record["clause"] = clause
+            break
+
+    return record
+
+
+def build_punishment_table(corpus: Dict) -> List[Dict]:
+    """Extract punishment records for every section that prescribes one"""
+    records = []
+    seen = set()
+    for section in corpus['sections']:
+        if section['section_id'] in seen:
+            continue
+        record = extract_punishment(section)
+        if record:
+            seen.add(section['section_id'])
+            records.append(record)
+    return records
+
+
+def save_punishment_table(index_dir: str = INDEX_DIR) -> str:
+    """Extract the punishment table from ppc.md and write it to a SQLite file"""
+    records = build_punishment_table(load_corpus())
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, PUNISHMENT_TABLE_FILE)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(f"CREATE TABLE punishments ({', '.join(COLUMNS)}, PRIMARY KEY (section_id))")
+    conn.executemany(
+        f"INSERT INTO punishments VALUES ({', '.join('?' for _ in COLUMNS)})",
+        [[record[column] for column in COLUMNS] for record in records]
+    )
+    conn.commit()
+    conn.close()
+
+    # Swap the finished file in so readers never see a half-written table
+    os.replace(tmp_path, path)
+    return path
+
+
+def format_term(months: int) -> str:
+    if months % 12 == 0:
+        years = months // 12
+        return f"{years} year{'s' if years != 1 else ''}"
+    return f"{months} month{'s' if months != 1 else ''}"
+
+
+def format_punishment(record: Dict, chapter_name: str = "") -> str:
+    """Render a punishment record as a cited markdown answer"""
+    chapter_numeral = record["chapter_title"].split()[-1]
+    lines = [f"**Section {record['section_id']}: {record['offence']}**"]
+    if chapter_name:
+        lines[0] += f" (CHAPTER {chapter_numeral}: {chapter_name})"
+    lines.append("")
+
+    if record["death"]:
+        lines.append("- **Death** may be awarded")
+    if record["life"]:
+        lines.append("- **Imprisonment for life** may be awarded")
+    if record["max_months"] or record["min_months"]:
+        term = "- **Imprisonment**"
+        if record["imprisonment_kind"]:
+            term += f" ({record['imprisonment_kind']})"
+        if record["min_months"] and record["max_months"]:
+            term += f": {format_term(record['min_months'])} to {format_term(record['max_months'])}"
+        elif record["max_months"]:
+            term += f": up to {format_term(record['max_months'])}"
+        else:
+            term += f": not less than {format_term(record['min_months'])}"
+        lines.append(term)
+    if record["fine"]:
+        lines.append(f"- **Fine**{': ' + record['fine_amount'] if record['fine_amount'] else ''}")
+    if record["forfeiture"]:
+        lines.append("- **Forfeiture of property**")
+
+    classification = [
+        label for key, label in [
+            ("qisas", "qisas"), ("diyat", "diyat"), ("arsh", "arsh"), ("daman", "daman"), ("tazir", "ta'zir")
+        ] if record[key]
+    ]
+    if classification:
+        lines.append(f"- **Classification:** {', '.join(classification)}")
+
+    if record["clause"]:
+        lines.extend(["", f"> {record['clause']}"])
+
+    lines.extend(["", f"(Chapter {chapter_numeral}, Section {record['section_id']})"])
+    return "\n".join(lines)
+
+
+class PunishmentTable:
+    """Answer "what is the punishment for X" queries from the extracted table"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        path = os.path.join(index_dir, PUNISHMENT_TABLE_FILE)
+        if os.path.exists(path):
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self.records = [dict(row) for row in conn.execute("SELECT * FROM punishments")]
+            conn.close()
+        else:
+            self.records = build_punishment_table(load_corpus())
+
+        self.by_section = {record["section_id"]: record for record in self.records}
+        self.title_stems = [(record, stems(record["offence"])) for record in self.records]
+        self.chapter_names = {
+            chapter['chapter_title']: chapter['name'] for chapter in load_corpus()['chapters']
+        }
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """Return the punishment record a query asks about, or None if it is not a confident match"""
+        match = PENALTY_QUERY_PATTERN.search(query)
+        if not match:
+            return None
+        subject = match.group(1)
+
+        section_match = SECTION_QUERY_PATTERN.search(subject)
+        if section_match:
+            return self.by_section.get(normalize_section_id(section_match.group(1)) or "")
+
+        subject_stems = stems(subject)
+        if not subject_stems:
+            return None
+
+        # Every word of the offence asked about must appear in the section title,
+        # and must cover most of it so "murder" does not match "Dacoity with murder"
+        candidates = [
+            record for record, title_stems in self.title_stems
+            if subject_stems <= title_stems and len(subject_stems) / len(title_stems) > 0.5
+        ]
+        if not candidates:
+            return None
+
+        # Prefer "Punishment for ..." sections and the shortest, most specific titles
+        candidates.sort(key=lambda record: (
+            not record["offence"].lower().startswith("punishment"),
+            len(record["offence"])
+        ))
+        return candidates[0]
+
+    def answer(self, query: str) -> Optional[Dict]:
+        """Answer a punishment query from the table in the shape returned by the RAG pipeline"""
+        record = self.lookup(query)
+        if record is None:
+            return None
+
+        chapter_name = self.chapter_names.get(record["chapter_title"], "")
+        answer = format_punishment(record, chapter_name)
+
+        if PUNISHMENT_TABLE_USE_LLM:
+            from llm_cache import generate_content
+            from admission import Overloaded
+            prompt = f"""Rewrite the following Pakistan Penal Code punishment summary as a short, clear answer to
+                the question. Keep the citation line exactly as given and do not add information.
+
+                **Question:** {query}
+
+                **Summary:**
+                {answer}
+                """
+            try:
+                answer = generate_content(prompt)
+            except Overloaded:
+                # The table's own wording is a complete answer
+                pass
+
+        section = load_corpus()['sections_by_id'][record["section_id"]]
+        return {
+            "answer": answer,
+            "sources": [record["chapter_title"]],
+            "relevant_chunks": [{
+                "chapter": record["chapter_title"],
+                "content": f"{section['heading']}\n{section['content']}",
+                "score": "punishment table"
+            }],
+            "optimized_query": f"punishment table: Section {record['section_id']}",
+            "routed_chapters": [record["chapter_title"]],
+            "cross_references": [],
+            "definitions": [],
+            "section_ids": [record["section_id"]]
+        }
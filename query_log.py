@@ -0,0 +1,146 @@
+"""
+Compact, privacy-scrubbed log of the questions users ask
+
+Every answered question is appended as one JSON line holding the normalised
+query, how it was answered, the routed chapters, the retrieved section ids and
+the stage timings. Contact details, CNIC numbers, URLs and other long digit
+runs are replaced with placeholders before anything is written, and timestamps
+are kept to the minute. Files rotate at QUERY_LOG_MAX_BYTES and keep
+QUERY_LOG_BACKUPS old files.
+
+The log is what warmup.py replays at startup.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from typing import List, Dict, Iterator, Optional, Tuple
+from config import QUERY_LOG_PATH, QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUPS
+
+# Personal data patterns, most specific first
+SCRUB_PATTERNS = [
+    (re.compile(r'\b[\w.+-]+@[\w-]+\.[\w.-]+\b'), '<email>'),
+    (re.compile(r'\bhttps?://\S+|\bwww\.\S+', re.I), '<url>'),
+    (re.compile(r'\b\d{5}-\d{7}-\d\b|\b\d{13}\b'), '<cnic>'),
+    (re.compile(r'(?:\+92|\b0092|\b0)[\s-]?3\d{2}[\s-]?\d{7}\b'), '<phone>'),
+    # Section numbers are short, so any longer run of digits is treated as personal
+    (re.compile(r'\b\d[\d\s-]{5,}\d\b'), '<number>')
+]
+
+MAX_QUERY_CHARS = 300
+
+# Logged query types of questions that were turned away or failed
+UNANSWERED_TYPES = {"rate_limited", "error"}
+
+
+def scrub(text: str) -> str:
+    """Replace personal data in text with placeholders"""
+    for pattern, placeholder in SCRUB_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def normalize_query(query: str) -> str:
+    """Scrubbed query with collapsed whitespace, as logged"""
+    return re.sub(r'\s+', ' ', scrub(query)).strip()[:MAX_QUERY_CHARS]
+
+
+def query_key(query: str) -> str:
+    """Case- and punctuation-insensitive form under which repeats of a query are counted"""
+    return query.lower().rstrip('?.! ')
+
+
+class QueryLog:
+    """Rotating JSONL writer and reader for the query log"""
+
+    def __init__(self, path: str = QUERY_LOG_PATH, max_bytes: int = QUERY_LOG_MAX_BYTES,
+                 backups: int = QUERY_LOG_BACKUPS):
+        self.path = path
+        self.backups = backups
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # A dedicated logger gives thread-safe appends and size-based rotation
+        self._logger = logging.getLogger(f"query_log.{os.path.abspath(path)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def record(self, query: str, query_type: str, latency: float, result: Optional[Dict] = None,
+               experiment: Optional[Dict] = None):
+        """Append one answered question, with its experiment arm and Gemini cost if it ran under one"""
+        entry = {
+            "ts": int(time.time()) // 60 * 60,
+            "q": normalize_query(query),
+            "type": query_type,
+            "ms": round(latency * 1000)
+        }
+        if result:
+            entry["ch"] = [title.replace("# CHAPTER ", "") for title in result.get("routed_chapters", [])]
+            entry["sec"] = result.get("section_ids", [])
+            entry["t"] = {stage: round(seconds * 1000) for stage, seconds in result.get("timings", {}).items()}
+            if result.get("sub_queries"):
+                entry["sub"] = [part["query"] for part in result["sub_queries"]]
+            skipped = [stage for stage, decision in result.get("stage_decisions", {}).items() if not decision["run"]]
+            if skipped:
+                entry["sk"] = skipped
+                entry["sv"] = result.get("saved_ms", 0)
+        if experiment:
+            entry["x"] = experiment
+        self._logger.info(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+
+    def entries(self) -> Iterator[Dict]:
+        """Every logged entry, oldest file first"""
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def top_queries(self, n: int) -> List[Tuple[str, int]]:
+        """
+        The n most frequent answered queries with their counts
+
+        Repeats are counted case- and punctuation-insensitively, and each is returned
+        in its most common spelling, which is the one whose answers are worth caching.
+        Questions that were turned away or failed left nothing worth caching.
+        """
+        counts = Counter()
+        spellings = {}
+        for entry in self.entries():
+            if entry.get("q") and entry.get("type") not in UNANSWERED_TYPES:
+                key = query_key(entry["q"])
+                counts[key] += 1
+                spellings.setdefault(key, Counter())[entry["q"]] += 1
+        return [(spellings[key].most_common(1)[0][0], count) for key, count in counts.most_common(n)]
+
+    def hot_sections(self, n: int) -> List[Tuple[str, int]]:
+        """The n most frequently retrieved section ids with their counts"""
+        return Counter(section for entry in self.entries() for section in entry.get("sec", [])).most_common(n)
+
+
+_query_log = None
+_query_log_lock = threading.Lock()
+
+
+def get_query_log() -> QueryLog:
+    """Return the process-wide query log"""
+    global _query_log
+    with _query_log_lock:
+        if _query_log is None:
+            _query_log = QueryLog()
+    return _query_log
@@ -1,11 +1,23 @@
 """
 Query processing and classification module
 """
-import google.generativeai as genai
-from config import GEMINI_API_KEY, GEMINI_MODEL
+import re
+from llm_cache import generate_content
+from admission import Overloaded
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+GREETINGS = ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']
+SMALL_TALK_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(GREETINGS + ['how are you', 'who are you', 'what are you', 'what can you do',
+                                       'thanks?', 'thank you', 'bye', 'goodbye']) + r')\b'
+)
+
+
+def local_query_classifier(query: str):
+    """Classify without Gemini when it is over quota: short small talk is GENERAL, the rest LEGAL"""
+    query_lower = query.lower().strip()
+    if len(query_lower.split()) <= 6 and SMALL_TALK_PATTERN.search(query_lower):
+        return "GENERAL"
+    return "LEGAL"
 
 
 def query_classifier(query: str):
@@ -32,9 +44,11 @@ def query_classifier(query: str):
     Respond with only one word: either "LEGAL" or "GENERAL"
     """
     
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    response = model.generate_content(CLASSIFICATION_PROMPT)
-    return response.text.strip().upper()
+    try:
+        response = generate_content(CLASSIFICATION_PROMPT)
+    except Overloaded:
+        return local_query_classifier(query)
+    return response.strip().upper()
 
 
 def handle_general_query(query: str):
@@ -42,7 +56,7 @@ def handle_general_query(query: str):
     query_lower = query.lower().strip()
     
     # Common greetings and responses
-    if any(greeting in query_lower for greeting in ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']):
+    if any(greeting in query_lower for greeting in GREETINGS):
         return "Hello! I'm the Pakistan Penal Code AI Assistant. I'm here to help you with legal questions about the Pakistan Penal Code. How can I assist you today?"
     
     elif any(question in query_lower for question in ['how are you', 'how do you do', 'how\'s it going']):
@@ -83,43 +97,31 @@ For legal questions about the PPC, I can provide detailed analysis and cite rele
 Is there anything about Pakistani criminal law or the Pakistan Penal Code you'd like to know?"""
 
 
-def query_parser(query: str):
-    """Parse and optimize the user query for better RAG performance"""
+def query_parser(query: str, chapters=None, fallback=None):
+    """Parse and optimize the user query for better RAG performance
+
+    chapters are the display names picked by the local chapter router; only those
+    are offered to the LLM instead of the full list of 23 chapters. fallback is
+    searched instead when Gemini is over quota, by default the query as asked.
+    """
     user_query = query
 
+    chapter_instructions = ""
+    if chapters:
+        chapter_list = "\n".join(f"    - {chapter}" for chapter in chapters)
+        chapter_instructions = f"""The query most likely relates to the chapters below. Include the complete
+    chapter name like "CHAPTER V: OF ABETMENT" of the relevant ones in the optimized prompt.
+
+    **Relevant Pakistan Penal Code Chapters:**
+{chapter_list}
+"""
+
     PROMPT = f"""You are a query optimization assistant for a Retrieval-Augmented Generation (RAG) system.
     Your task is to rephrase a given user query into a highly effective query for a vector
     database containing sections of the Pakistan Penal Code. The optimized query should remove
     unnecessary conversational elements and focus on the core legal concepts, keywords,
-    and section numbers relevant to the user's intent. When a query relates to a specific
-    topic, include the relevant chapter numbers from the list below to narrow the search. Make sure 
-    you add the complete chapter name like "CHAPTER V: OF ABETMENT" in the optimized prompt.
-
-    **Pakistan Penal Code Chapters:**
-    - CHAPTER I: INTRODUCTION
-    - CHAPTER II: GENERAL EXPLANATIONS
-    - CHAPTER III: OF PUNISHMENTS
-    - CHAPTER IV: GENERAL EXCEPTIONS
-    - CHAPTER V: OF ABETMENT
-    - CHAPTER VI: OF OFFENCES AGAINST THE STATE
-    - CHAPTER VII: OF OFFENCES RELATING TO THE ARMY, NAVY AND AIR FORCE
-    - CHAPTER VIII: OF OFFENCES AGAINST THE PUBLIC TRANQUILLITY
-    - CHAPTER IX: OF OFFENCES BY OR RELATING TO PUBLIC SERVANTS
-    - CHAPTER X: OF CONTEMPTS OF THE LAWFUL AUTHORITY OF PUBLIC SERVANTS
-    - CHAPTER XI: OF FALSE EVIDENCE AND OFFENCES AGAINST PUBLIC JUSTICE
-    - CHAPTER XII: OF OFFENCES RELATING TO COIN AND GOVERNMENT STAMPS
-    - CHAPTER XIII: OF OFFENCES RELATING TO WEIGHTS AND MEASURES
-    - CHAPTER XIV: OF OFFENCES AFFECTING THE PUBLIC HEALTH, SAFETY, CONVENIENCE, DECENCY AND MORALS
-    - CHAPTER XV: OF OFFENCES RELATING TO RELIGION
-    - CHAPTER XVI: OF OFFENCES AFFECTING THE HUMAN BODY
-    - CHAPTER XVII: OF OFFENCES AGAINST PROPERTY
-    - CHAPTER XVIII: OF OFFENCES RELATING TO DOCUMENTS AND TO TRADE OR PROPERTY MARKS
-    - CHAPTER XIX: OF THE CRIMINAL BREACH OF CONTRACTS OF SERVICE
-    - CHAPTER XX: OF OFFENCES RELATING TO MARRIAGE
-    - CHAPTER XXI: OF DEFAMATION
-    - CHAPTER XXII: OF CRIMINAL INTIMIDATION, INSULT AND ANNOYANCE
-    - CHAPTER XXIII: OF ATTEMPTS TO COMMIT OFFENCES
-
+    and section numbers relevant to the user's intent.
+    {chapter_instructions}
     If the Query has a specific section number mentioned, then keep the query very short and format
     it as ### Section 503. The three hashtags and a dot (.) at the end is a must.
 
@@ -127,6 +129,8 @@ def query_parser(query: str):
     {user_query}
     """
 
-    model = genai.GenerativeModel(GEMINI_MODEL)
-    response = model.generate_content(PROMPT)
-    return response.text
+    try:
+        return generate_content(PROMPT)
+    except Overloaded:
+        # The optimisation is only a refinement; search with the question as asked
+        return fallback or user_query
@@ -1,103 +1,598 @@
 """
 Search and retrieval module for the RAG system
 """
+import time
 import streamlit as st
-import google.generativeai as genai
-from sentence_transformers import util
-from database import load_sentence_transformer
+from contextlib import contextmanager
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from weaviate.classes.query import Filter
+from database import (
+    load_sentence_transformer,
+    load_chapter_router,
+    load_cross_reference_graph,
+    load_definitions_index,
+    load_lexical_index,
+    load_vector_store,
+    load_section_digests,
+    load_thesaurus
+)
+from corpus import load_corpus, section_ids_in_text, chunk_section_ids, locate_text, section_at
+from snapshots import snapshot_collection
+from windowing import rerank_by_token_windows, rerank_by_word_windows
+from lexical_index import section_mentions
+from corpora import PRIMARY_CORPUS, load_corpora, route_corpora, rank_scores, get_corpus_metrics
 from query_processing import query_parser
+from decomposition import decompose
+from stage_policy import get_stage_policy, optimize_skip_reason, search_skip_reason, rerank_skip_reason
+from llm_cache import generate_content
+from experiments import experiment_param
+from admission import Overloaded, quiet
 from ui_components import sidebar_spinner
 from config import (
-    COLLECTION_NAME, 
-    GEMINI_MODEL,
-    DEFAULT_SEARCH_LIMIT,
-    DEFAULT_ALPHA,
-    DEFAULT_MAX_CHUNKS,
-    DEFAULT_CHUNK_SIZE,
-    DEFAULT_OVERLAP
+    RERANK_WINDOWING,
+    RERANK_OVERLAP_TOKENS,
+    LEXICAL_SEARCH_MODE,
+    LEXICAL_SEARCH_LIMIT,
+    LEXICAL_SECTION_FAST_PATH,
+    RRF_K,
+    LOCAL_VECTOR_LIMIT,
+    FEDERATED_SEARCH_WORKERS,
+    SECTION_DIGESTS,
+    QUERY_REWRITE,
+    DIGEST_FULL_TEXT_SECTIONS,
+    QUERY_DECOMPOSITION,
+    DECOMPOSITION_WORKERS,
+    DECOMPOSITION_MIN_QUOTA
 )
 
 
-def semantic_reranker(query, relevant_chunks, max_chunks=DEFAULT_MAX_CHUNKS, 
-                     chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
-    """Rerank retrieved documents using semantic search"""
+def semantic_reranker(query, relevant_chunks, max_chunks=None, 
+                     chunk_size=None, overlap=None, query_embedding=None):
+    """Rerank retrieved documents using semantic search; unset sizes come from the request's experiment arm"""
+    max_chunks = max_chunks or experiment_param("max_chunks")
+    chunk_size = chunk_size or experiment_param("chunk_size")
+    overlap = overlap if overlap is not None else experiment_param("overlap")
     sentence_model = load_sentence_transformer()
+    texts = [chunk['content'] for chunk in relevant_chunks if chunk.get('content')]
+    if not texts:
+        return []
+    
+    if query_embedding is None:
+        query_embedding = sentence_model.encode(query)
     
-    all_chunks = []
+    if RERANK_WINDOWING == "tokens":
+        # Windows fit the encoder exactly; passages are widened back to chunk_size words
+        passages = rerank_by_token_windows(
+            sentence_model, query_embedding, texts, max_chunks, chunk_size, RERANK_OVERLAP_TOKENS
+        )
+    else:
+        passages = rerank_by_word_windows(sentence_model, query_embedding, texts, max_chunks, chunk_size, overlap)
     
-    # Stage 1: Chunk the retrieved content
+    return [
+        {'content': passage['content'], 'similarity_score': passage['similarity_score']}
+        for passage in passages
+    ]
+
+
+def chapter_filter(chapter_titles):
+    """Build a Weaviate filter restricting search to the given chapter titles"""
+    filters = [Filter.by_property("chapter_title").equal(title) for title in chapter_titles]
+    return filters[0] if len(filters) == 1 else Filter.any_of(filters)
+
+
+def retrieved_section_ids(relevant_chunks):
+    """Map the retrieved PPC chunks back to the sections they cover, in rank order"""
+    corpus = load_corpus()
+    
+    section_ids = []
     for chunk in relevant_chunks:
-        full_text = chunk.get('content', '')
-        
-        if full_text:
-            # Split text into chunks with overlap
-            words = full_text.split()
-            
-            for i in range(0, len(words), chunk_size - overlap):
-                chunk_text = ' '.join(words[i:i + chunk_size])
-                if len(chunk_text.strip()) > 30:  # Only keep meaningful chunks
-                    all_chunks.append(chunk_text)
-                
-                if i + chunk_size >= len(words):
-                    break
+        if chunk.get("corpus", PRIMARY_CORPUS) != PRIMARY_CORPUS:
+            continue
+        for section_id in chunk_section_ids(chunk["content"], corpus):
+            if section_id not in section_ids:
+                section_ids.append(section_id)
+    return section_ids
+
+
+def lexical_chunks(hits):
+    """Convert lexical index hits to the chunk format used for Weaviate results"""
+    return [
+        {"chapter": hit["chapter"], "content": hit["content"],
+         "score": hit["score"], "retriever": "lexical", "corpus": PRIMARY_CORPUS}
+        for hit in hits
+    ]
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """
+    Merge ranked chunk lists with reciprocal rank fusion
+
+    Chunks are identified by the first section heading they contain, so a section
+    found by both retrievers is kept once, in the form it was first seen.
+    """
+    corpus = load_corpus()
+    fused = {}
+    for ranked in ranked_lists:
+        for rank, chunk in enumerate(ranked):
+            namespace = chunk.get("corpus", PRIMARY_CORPUS)
+            section_ids = section_ids_in_text(chunk["content"], corpus) if namespace == PRIMARY_CORPUS else []
+            key = (namespace, section_ids[0] if section_ids else chunk["content"])
+            entry = fused.setdefault(key, {"chunk": chunk, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank + 1)
     
-    # Stage 2: Use semantic search to filter the best chunks
-    if all_chunks:
-        # Get embeddings for query and chunks
-        query_embedding = sentence_model.encode(query)
-        chunk_embeddings = sentence_model.encode(all_chunks)
-        
-        # Calculate cosine similarities
-        similarities = util.cos_sim(query_embedding, chunk_embeddings)[0]
-        
-        # Get top-k most similar chunks
-        top_indices = similarities.argsort(descending=True)[:max_chunks]
-        
-        # Return chunks with their similarity scores
-        filtered_chunks = []
-        for idx in top_indices:
-            filtered_chunks.append({
-                'content': all_chunks[idx],
-                'similarity_score': float(similarities[idx])
+    ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+    return [entry["chunk"] for entry in ranked]
+
+
+def format_cross_references(cross_references):
+    """Format cited sections as a prompt block; empty when there are none"""
+    if not cross_references:
+        return ""
+    
+    blocks = [
+        f"--- Section {ref['section_id']} ({ref['chapter']}), cited by Section {ref['cited_by']} ---\n{ref['content']}"
+        for ref in cross_references
+    ]
+    return "**Cross-Referenced Sections:**\n" + "\n\n".join(blocks)
+
+
+def format_definitions(definitions):
+    """Format attached Chapter II definitions as a prompt block; empty when there are none"""
+    if not definitions:
+        return ""
+    
+    blocks = [
+        f"--- Definition of {', '.join(definition['terms'])} (CHAPTER II, Section {definition['section_id']}) ---\n{definition['content']}"
+        for definition in definitions
+    ]
+    return "**Definitions:**\n" + "\n\n".join(blocks)
+
+
+def format_digests(digests):
+    """Format the digests sent in place of secondary sections as a prompt block; empty when there are none"""
+    if not digests:
+        return ""
+    
+    blocks = [f"--- Digest of Section {digest['section_id']} ({digest['chapter']}) ---\n{digest['digest']}" for digest in digests]
+    return "**Section Digests:**\n" + "\n\n".join(blocks)
+
+
+def passage_section(content, corpus):
+    """The id of the PPC section a reranked passage starts in, or None if it cannot be placed"""
+    position = locate_text(content, corpus)
+    section_id = section_at(position, corpus) if position is not None else None
+    if section_id:
+        return section_id
+    section_ids = section_ids_in_text(content, corpus)
+    return section_ids[0] if section_ids else None
+
+
+def condense_context(reranked_context, cross_references):
+    """
+    Send full text for the top sections only and digests for the rest
+
+    The passages of the first DIGEST_FULL_TEXT_SECTIONS sections, in reranker order,
+    are kept. Passages of later sections that have a digest are replaced by one
+    digest per section, and so are cross-referenced sections with a digest.
+    Passages that cannot be placed in a section, or whose section is too short to
+    have a digest, are kept in full.
+
+    Returns:
+        (passages, cross_references, digests)
+    """
+    section_digests = load_section_digests() if SECTION_DIGESTS else None
+    if not section_digests:
+        return reranked_context, cross_references, []
+    
+    corpus = load_corpus()
+    full_text = []
+    passages = []
+    digests = {}
+    for passage in reranked_context:
+        section_id = passage_section(passage['content'], corpus)
+        if section_id and section_id not in full_text and len(full_text) < DIGEST_FULL_TEXT_SECTIONS:
+            full_text.append(section_id)
+        digest = section_digests.get(section_id) if section_id and section_id not in full_text else None
+        if digest:
+            digests.setdefault(section_id, {
+                "section_id": section_id,
+                "chapter": corpus['sections_by_id'][section_id]['chapter_title'].lstrip('# '),
+                "digest": digest
             })
-        
-        return filtered_chunks
+        else:
+            passages.append(passage)
+    
+    condensed_references = []
+    for ref in cross_references:
+        digest = section_digests.get(ref['section_id'])
+        condensed_references.append(dict(ref, content=digest) if digest else ref)
+    
+    return passages, condensed_references, list(digests.values())
+
+
+def hybrid_search(collection, query, routed_chapters):
+    """
+    Run the Weaviate hybrid search, falling back to the whole collection if the
+    routed chapters have no match
+
+    Returns:
+        (relevant_chunks, routed_chapters actually searched)
+    """
+    response = collection.query.hybrid(
+        query=query,
+        alpha=experiment_param("alpha"),
+        limit=experiment_param("search_limit"),
+        filters=chapter_filter(routed_chapters) if routed_chapters else None,
+        return_metadata=["score"]
+    )
+    
+    if routed_chapters and not response.objects:
+        routed_chapters = []
+        response = collection.query.hybrid(
+            query=query,
+            alpha=experiment_param("alpha"),
+            limit=experiment_param("search_limit"),
+            return_metadata=["score"]
+        )
+    
+    relevant_chunks = []
+    for obj in response.objects:
+        relevant_chunks.append({
+            "chapter": obj.properties["chapter_title"],
+            "content": obj.properties["content"],
+            "score": obj.metadata.score if obj.metadata else "N/A",
+            "retriever": "vector"
+        })
+    return relevant_chunks, routed_chapters
+
+
+def search_corpus(client, collection_name, namespace, query, routed_chapters):
+    """Hybrid search of one statute's collection; chapter routing only applies to the PPC"""
+    corpus = load_corpora()[namespace]
+    start = time.perf_counter()
+    
+    if namespace == PRIMARY_CORPUS:
+        chunks, routed_chapters = hybrid_search(client.collections.get(collection_name), query, routed_chapters)
+    else:
+        chunks, _ = hybrid_search(client.collections.get(corpus["collection"]), query, [])
+        # Label chunks with their statute so sources and the prompt can tell them apart
+        chunks = [
+            dict(chunk, chapter=f"{corpus['name']} {chunk['chapter']}", content=f"[{corpus['name']}]\n{chunk['content']}")
+            for chunk in chunks
+        ]
+    
+    chunks = [dict(chunk, corpus=namespace) for chunk in chunks]
+    return chunks, routed_chapters, time.perf_counter() - start
+
+
+def federated_search(client, collection_name, query, routed_chapters, namespaces):
+    """
+    Search the PPC and every other statute in namespaces, concurrently
+
+    namespaces are the corpora the user's query routes to (route_corpora). When
+    that is only the PPC, a single search runs in the calling thread. Otherwise
+    each corpus is searched in parallel and the results are merged by weighted
+    reciprocal rank, the PPC first on ties. Per-corpus latency and the number of
+    hits that made the merged top results are recorded.
+
+    Returns:
+        (relevant_chunks, routed_chapters actually searched in the PPC)
+    """
+    metrics = get_corpus_metrics()
+    
+    if len(namespaces) == 1:
+        chunks, routed_chapters, latency = search_corpus(client, collection_name, PRIMARY_CORPUS, query, routed_chapters)
+        metrics.record(PRIMARY_CORPUS, latency, len(chunks), len(chunks))
+        return chunks, routed_chapters
+    
+    # Each search runs in a copy of the request context, so it uses the request's experiment arm
+    with ThreadPoolExecutor(max_workers=min(FEDERATED_SEARCH_WORKERS, len(namespaces))) as executor:
+        futures = {
+            namespace: executor.submit(
+                copy_context().run, search_corpus, client, collection_name, namespace, query, routed_chapters
+            )
+            for namespace in namespaces
+        }
     
-    return []
+    merged = []
+    latencies = {}
+    for namespace, future in futures.items():
+        try:
+            chunks, searched_chapters, latencies[namespace] = future.result()
+        except Exception:
+            # A failing secondary shard must not take down PPC answers
+            if namespace == PRIMARY_CORPUS:
+                raise
+            continue
+        if namespace == PRIMARY_CORPUS:
+            routed_chapters = searched_chapters
+        merged.extend(rank_scores(chunks, load_corpora()[namespace]["weight"]))
+    
+    # Stable sort: the PPC's results come first in merged, so it wins ties
+    merged.sort(key=lambda chunk: chunk["fused_score"], reverse=True)
+    top = merged[:experiment_param("search_limit")]
+    for namespace, latency in latencies.items():
+        metrics.record(
+            namespace, latency,
+            sum(chunk["corpus"] == namespace for chunk in merged),
+            sum(chunk["corpus"] == namespace for chunk in top)
+        )
+    return top, routed_chapters
+
+
+def extractive_answer(reranked_context, hit_sections):
+    """Answer with the best reranked passages verbatim, for when Gemini is over quota"""
+    passages = "\n\n".join(f"> {passage['content'].strip()}".replace("\n", "\n> ") for passage in reranked_context)
+    citation = f"\n\n(Sections {', '.join(hit_sections)})" if hit_sections else ""
+    return ("⚠️ The assistant is at capacity, so this answer could not be written up. "
+            "These are the most relevant passages of the Pakistan Penal Code for your question:\n\n"
+            f"{passages}{citation}")
 
 
-def search_and_generate_response(client, query, collection_name=COLLECTION_NAME):
-    """Search the vector database and generate a response using Gemini API"""
+@contextmanager
+def timed_stage(timings, stage):
+    """Add the wall time of a pipeline stage to timings[stage], in seconds"""
+    start = time.perf_counter()
     try:
-        collection = client.collections.get(collection_name)
-        
-        # Get optimized query
-        with sidebar_spinner("Optimizing query..."):
-            rag_optimized_query = query_parser(query)
-        
-        # Search the database
-        with sidebar_spinner("Searching Pakistan Penal Code..."):
-            response = collection.query.hybrid(
-                query=rag_optimized_query,
-                alpha=DEFAULT_ALPHA,
-                limit=DEFAULT_SEARCH_LIMIT,
-                return_metadata=["score"]
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def retrieve(client, collection_name, query, query_embedding, routed_chapters, indexes, timings, decisions,
+             status=sidebar_spinner):
+    """
+    Retrieve candidate chunks for one query from the local legs and, when the stage policy
+    runs it, the Weaviate search
+
+    indexes holds the "router", "lexical", "vector" and "thesaurus" indexes, loaded by the
+    caller so sub-queries can be retrieved from worker threads. status shows progress.
+
+    Returns:
+        (relevant_chunks, routed_chapters actually searched, optimized query)
+    """
+    router, lexical_index, vector_store, thesaurus = (
+        indexes["router"], indexes["lexical"], indexes["vector"], indexes["thesaurus"]
+    )
+    policy = get_stage_policy()
+    
+    # Everyday words are expanded locally with PPC vocabulary; Gemini may rewrite the query further
+    with timed_stage(timings, "expand_query"):
+        expanded_query = thesaurus.expand_query(query)
+    
+    # The local BM25 and quantized vector legs run first; their scores decide
+    # whether the rewrite and the remote search are worth running
+    with timed_stage(timings, "local_search"):
+        lexical_query = expanded_query
+        lexical_hits = lexical_index.search(
+            lexical_query, LEXICAL_SEARCH_LIMIT, chapter_titles=routed_chapters or None
+        ) if lexical_index else []
+        vector_hits = vector_store.chunks(
+            vector_store.search(query_embedding, LOCAL_VECTOR_LIMIT)
+        ) if vector_store else []
+    
+    if QUERY_REWRITE == "thesaurus":
+        rag_optimized_query = expanded_query
+    elif policy.run("optimize", optimize_skip_reason(query, lexical_hits), decisions):
+        with status("Optimizing query..."), timed_stage(timings, "optimize"):
+            rag_optimized_query = query_parser(
+                query, [router.display_name(title) for title in routed_chapters], fallback=expanded_query
             )
+        if lexical_index:
+            with timed_stage(timings, "local_search"):
+                lexical_query = f"{expanded_query} {rag_optimized_query}"
+                lexical_hits = lexical_index.search(
+                    lexical_query, LEXICAL_SEARCH_LIMIT, chapter_titles=routed_chapters or None
+                )
+    else:
+        rag_optimized_query = expanded_query
+    
+    # Search the database, restricted to the routed chapters when there are any
+    relevant_chunks = []
+    namespaces = route_corpora(query)
+    federated = len(namespaces) > 1
+    if policy.run("search", search_skip_reason(lexical_hits, vector_hits, federated), decisions):
+        searched_chapters = routed_chapters
+        with status("Searching Pakistan Penal Code..."), timed_stage(timings, "search"):
+            relevant_chunks, routed_chapters = federated_search(
+                client, collection_name, rag_optimized_query, routed_chapters, namespaces
+            )
+        # The remote search fell back to every chapter, so the lexical leg does too
+        if lexical_index and routed_chapters != searched_chapters:
+            with timed_stage(timings, "local_search"):
+                lexical_hits = lexical_index.search(lexical_query, LEXICAL_SEARCH_LIMIT)
+    
+    # The local legs are fused with Weaviate's results by rank
+    ranked_lists = [relevant_chunks]
+    if lexical_index:
+        ranked_lists.append(lexical_chunks(lexical_hits))
+    if vector_store:
+        ranked_lists.append([dict(chunk, retriever="local vector", corpus=PRIMARY_CORPUS) for chunk in vector_hits])
+    if len(ranked_lists) > 1:
+        with timed_stage(timings, "local_search"):
+            relevant_chunks = reciprocal_rank_fusion(ranked_lists)
+    
+    return relevant_chunks, routed_chapters, rag_optimized_query
+
+
+@contextmanager
+def no_status(text):
+    """Stand-in for sidebar_spinner in worker threads, which cannot draw to the page"""
+    yield
+
+
+def retrieve_part(client, collection_name, sub_query, sub_embedding, indexes):
+    """Route and retrieve one sub-query of a compound question, with its own timings and stage decisions"""
+    timings = {}
+    decisions = {}
+    with timed_stage(timings, "route"):
+        routed_chapters = [title for title, _ in indexes["router"].route(sub_query, sub_embedding)]
+    # Runs in a worker thread: Gemini calls still queue as the user's session, but silently
+    with quiet():
+        chunks, routed_chapters, optimized_query = retrieve(
+            client, collection_name, sub_query, sub_embedding, routed_chapters, indexes, timings, decisions,
+            status=no_status
+        )
+    return {
+        "query": sub_query,
+        "chunks": chunks,
+        "routed_chapters": routed_chapters,
+        "optimized_query": optimized_query,
+        "timings": timings,
+        "decisions": decisions
+    }
+
+
+def retrieve_parts(client, collection_name, sub_queries, sub_embeddings, indexes):
+    """
+    Retrieve every sub-query of a compound question concurrently
+
+    Each part runs in its own copy of the request context, so the pinned index
+    snapshot, experiment arm and admission session carry over into the worker
+    threads; the admission queue-status callback does not (see retrieve_part). The
+    wall time is close to that of the slowest part rather than the sum.
+    """
+    with ThreadPoolExecutor(max_workers=min(DECOMPOSITION_WORKERS, len(sub_queries))) as executor:
+        futures = [
+            executor.submit(copy_context().run, retrieve_part, client, collection_name, sub_query, sub_embedding, indexes)
+            for sub_query, sub_embedding in zip(sub_queries, sub_embeddings)
+        ]
+    return [future.result() for future in futures]
+
+
+def rerank_parts(parts, sub_embeddings, timings):
+    """
+    Rerank each part's chunks against its own sub-query and interleave the passages
+
+    Every part gets a quota of the arm's max_chunks split evenly, and at least
+    DECOMPOSITION_MIN_QUOTA, so neither side of a comparison crowds out the other.
+    """
+    policy = get_stage_policy()
+    quota = max(DECOMPOSITION_MIN_QUOTA, experiment_param("max_chunks") // len(parts))
+    ranked = []
+    for part, sub_embedding in zip(parts, sub_embeddings):
+        if policy.run("rerank", rerank_skip_reason(part["chunks"], quota, experiment_param("chunk_size")), part["decisions"]):
+            with timed_stage(part["timings"], "rerank"), timed_stage(timings, "rerank"):
+                ranked.append(semantic_reranker(
+                    part["query"], part["chunks"], max_chunks=quota, query_embedding=sub_embedding
+                ))
+        else:
+            ranked.append([
+                {'content': chunk['content'], 'similarity_score': chunk['score']} for chunk in part["chunks"]
+            ])
+    
+    passages = []
+    seen = set()
+    for rank in range(quota):
+        for part_passages in ranked:
+            if rank < len(part_passages) and part_passages[rank]['content'] not in seen:
+                seen.add(part_passages[rank]['content'])
+                passages.append(part_passages[rank])
+    return passages
+
+
+def merge_decisions(parts):
+    """One decision per stage for a decomposed question: run if any part ran it"""
+    merged = {}
+    for part in parts:
+        for stage, decision in part["decisions"].items():
+            entry = merged.setdefault(stage, {"run": False, "reason": []})
+            entry["run"] = entry["run"] or decision["run"]
+            entry["reason"].append(f"{part['query']!r}: {decision['reason']}")
+            if decision.get("would_skip"):
+                entry["would_skip"] = True
+    for entry in merged.values():
+        entry["reason"] = "; ".join(entry["reason"])
+    return merged
+
+
+def search_and_generate_response(client, query, collection_name=None, status=sidebar_spinner):
+    """
+    Search the vector database and generate a response using Gemini API
+
+    collection_name defaults to the PPC collection of the current index snapshot.
+    status shows progress; callers outside the Streamlit script thread pass no_status.
+    The query rewrite, the remote search and the reranker run only when the stage
+    policy finds them worthwhile (see stage_policy.py). Compound questions are
+    split into sub-queries that are retrieved concurrently (see decomposition.py).
+    """
+    collection_name = collection_name or snapshot_collection()
+    timings = {}
+    policy = get_stage_policy()
+    decisions = {}
+    try:
+        # Route the query to its most likely chapters locally
+        with timed_stage(timings, "embed"):
+            query_embedding = load_sentence_transformer().encode(query)
+        with timed_stage(timings, "route"):
+            router = load_chapter_router()
+            routed_chapters = [title for title, _ in router.route(query, query_embedding)]
         
-        relevant_chunks = []
-        for obj in response.objects:
-            relevant_chunks.append({
-                "chapter": obj.properties["chapter_title"],
-                "content": obj.properties["content"],
-                "score": obj.metadata.score if obj.metadata else "N/A"
-            })
+        # Queries that name sections are answered from the local index without a vector search
+        lexical_index = load_lexical_index() if LEXICAL_SEARCH_MODE != "off" else None
+        mentioned_sections = section_mentions(query)
+        parts = []
+        if lexical_index and LEXICAL_SECTION_FAST_PATH and mentioned_sections:
+            with timed_stage(timings, "local_search"):
+                relevant_chunks = lexical_chunks(lexical_index.get_sections(mentioned_sections))
+            rag_optimized_query = f"section lookup: {', '.join(mentioned_sections)}"
+        else:
+            relevant_chunks = []
+        
+        if not relevant_chunks:
+            indexes = {
+                "router": router, "lexical": lexical_index, "vector": load_vector_store(), "thesaurus": load_thesaurus()
+            }
+            
+            # Compound questions are split locally and their parts retrieved concurrently
+            with timed_stage(timings, "decompose"):
+                sub_queries = decompose(query, indexes["thesaurus"]) if QUERY_DECOMPOSITION else [query]
+            if len(sub_queries) == 1:
+                relevant_chunks, routed_chapters, rag_optimized_query = retrieve(
+                    client, collection_name, query, query_embedding, routed_chapters, indexes, timings, decisions,
+                    status=status
+                )
+            else:
+                with timed_stage(timings, "embed"):
+                    sub_embeddings = load_sentence_transformer().encode(sub_queries)
+                with status(f"Searching {len(sub_queries)} parts of your question..."), \
+                        timed_stage(timings, "search_parts"):
+                    parts = retrieve_parts(client, collection_name, sub_queries, sub_embeddings, indexes)
+                relevant_chunks = reciprocal_rank_fusion([part["chunks"] for part in parts])
+                routed_chapters = list(dict.fromkeys(title for part in parts for title in part["routed_chapters"]))
+                rag_optimized_query = " | ".join(part["optimized_query"] for part in parts)
         
         if not relevant_chunks:
             return "No relevant information found in the Pakistan Penal Code."
         
         # Semantic reranking
-        with sidebar_spinner("Analyzing relevant sections..."):
-            reranked_context = semantic_reranker(query, relevant_chunks)
+        with status("Analyzing relevant sections..."):
+            if parts:
+                reranked_context = rerank_parts(parts, sub_embeddings, timings)
+                decisions = merge_decisions(parts)
+            elif policy.run("rerank", rerank_skip_reason(relevant_chunks, experiment_param("max_chunks"),
+                                                         experiment_param("chunk_size")), decisions):
+                with timed_stage(timings, "rerank"):
+                    reranked_context = semantic_reranker(query, relevant_chunks, query_embedding=query_embedding)
+            else:
+                # Few short single-section chunks are sent as they are, in retrieval order
+                reranked_context = [
+                    {'content': chunk['content'], 'similarity_score': chunk['score']} for chunk in relevant_chunks
+                ]
+            with timed_stage(timings, "expand"):
+                hit_sections = retrieved_section_ids(relevant_chunks)
+                cross_references = load_cross_reference_graph().expand(hit_sections)
+                
+                # One pass over all retrieved text attaches the definitions it relies on
+                definitions = load_definitions_index().attach(
+                    [chunk["content"] for chunk in relevant_chunks] + [ref["content"] for ref in cross_references],
+                    exclude_sections=set(hit_sections) | {ref["section_id"] for ref in cross_references}
+                )
+        
+            # Secondary sections are sent as their precomputed digests
+            with timed_stage(timings, "condense"):
+                passages, prompt_references, digests = condense_context(reranked_context, cross_references)
         
         # Create prompt for Gemini
         prompt = f"""You are a legal expert specializing in the Pakistan Penal Code. Your task is to analyze the provided sections and answer the user's legal question.
@@ -106,13 +601,19 @@ def search_and_generate_response(client, query, collection_name=COLLECTION_NAME)
         {query}
 
         **Relevant Legal Text:**
-        {reranked_context}
+        {passages}
+
+        {format_digests(digests)}
+
+        {format_cross_references(prompt_references)}
+
+        {format_definitions(definitions)}
 
         **Instructions:**
-        1.  Formulate a detailed, clear, and comprehensive answer to the user's question using ONLY the provided legal text.
+        1.  Formulate a detailed, clear, and comprehensive answer to the user's question using ONLY the provided legal text. Section digests summarise further relevant sections and may be relied on like the relevant text. Cross-referenced sections are cited by the relevant text and definitions explain the terms it uses; use them to interpret the relevant text.
         2.  If the question cannot be fully addressed with the given information, state that the provided text is insufficient and that other sections of the Pakistan Penal Code may be relevant. Do NOT speculate or provide information from outside the given context.
         3.  Do not use conversational phrases like "Based on the provided context..." or "According to the sections you gave me...".
-        4.  At the end of your response, list the specific sections and their corresponding chapter numbers from the **Relevant Legal Text** that support your answer. Use the format: `(Chapter [Number], Section [Number])`.
+        4.  At the end of your response, list the specific sections and their corresponding chapter numbers from the **Relevant Legal Text** and **Section Digests** that support your answer. Use the format: `(Chapter [Number], Section [Number])`. Text labelled with another statute's name in square brackets comes from that statute; cite it with the statute's name.
 
         **Example:**
         The punishment for murder is death or life imprisonment. (Chapter XVI, Section 302)
@@ -120,15 +621,33 @@ def search_and_generate_response(client, query, collection_name=COLLECTION_NAME)
         """
 
         # Generate response using Gemini
-        with sidebar_spinner("Generating legal analysis..."):
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            gemini_response = model.generate_content(prompt)
+        with status("Generating legal analysis..."), timed_stage(timings, "generate"):
+            try:
+                answer = generate_content(prompt)
+            except Overloaded:
+                answer = extractive_answer(reranked_context, hit_sections)
         
+        if parts:
+            saved = sum(policy.record(part["decisions"], part["timings"]) for part in parts)
+        else:
+            saved = policy.record(decisions, timings)
         return {
-            "answer": gemini_response.text,
+            "answer": answer,
             "sources": [chunk["chapter"] for chunk in relevant_chunks],
             "relevant_chunks": relevant_chunks,
-            "optimized_query": rag_optimized_query
+            "optimized_query": rag_optimized_query,
+            "routed_chapters": routed_chapters,
+            "cross_references": [ref["section_id"] for ref in cross_references],
+            "definitions": [definition["section_id"] for definition in definitions],
+            "digests": [digest["section_id"] for digest in digests],
+            "section_ids": hit_sections,
+            "timings": timings,
+            "stage_decisions": decisions,
+            "saved_ms": round(saved * 1000),
+            "sub_queries": [
+                {"query": part["query"], "optimized_query": part["optimized_query"], "timings": part["timings"]}
+                for part in parts
+            ]
         }
         
     except Exception as e:
@@ -0,0 +1,234 @@
+"""
+Precomputed digests of the long PPC sections
+
+Long sections such as the qisas and diyat provisions around Sections 299-338
+dominate the prompt once retrieved. An offline batch job asks Gemini once per
+long section for a compact digest: the elements of the offence, its punishment
+and the key exceptions. The digests are stored in the index snapshot next to the
+corpus they were written from, so they are versioned with it; a rebuild reuses
+every digest whose section text is unchanged.
+
+At query time search_engine.py sends full text only for the top sections and
+digests for the secondary hits.
+
+    python section_digests.py                       # digest INDEX_DIR
+    python section_digests.py --snapshot 20261019-101500-1a2b3c4d
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+from corpus import load_corpus
+from cross_references import estimate_tokens
+from snapshots import read_pointer, snapshot_dir, is_snapshot, pinned, refresh_files
+from config import INDEX_DIR, GEMINI_MODEL, DIGEST_MIN_WORDS, DIGEST_WORKERS
+
+DIGESTS_FILE = "digests.sqlite"
+
+# Bump when the prompt changes so every digest is regenerated
+DIGEST_PROMPT_VERSION = 1
+
+DIGEST_SESSION = "digests"
+
+COLUMNS = ["section_id", "content_sha256", "elements", "punishment", "exceptions", "digest", "model", "created_at"]
+
+JSON_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+DIGEST_PROMPT = """You are summarising a section of the Pakistan Penal Code for a legal research assistant.
+Return a JSON object with exactly these keys:
+- "elements": the elements of the offence or rule, as a list of short phrases
+- "punishment": the punishment in one sentence, or "" if the section prescribes none
+- "exceptions": the key exceptions, provisos and explanations, as a list of short phrases
+Use the wording of the section, keep every number, term and cross-referenced section, and add nothing.
+
+Section {section_id}. {title}
+{content}"""
+
+
+def content_sha256(section: Dict) -> str:
+    """Hash of what a digest is written from; a digest is reused while it is unchanged"""
+    source = f"{DIGEST_PROMPT_VERSION}\n{GEMINI_MODEL}\n{section['heading']}\n{section['content']}"
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def needs_digest(section: Dict) -> bool:
+    return len(section['content'].split()) >= DIGEST_MIN_WORDS
+
+
+def render_digest(section_id: str, title: str, elements: List[str], punishment: str, exceptions: List[str]) -> str:
+    """The digest as it is sent in prompts"""
+    lines = [f"Section {section_id}. {title}"]
+    if elements:
+        lines.append("Elements: " + "; ".join(elements))
+    if punishment:
+        lines.append(f"Punishment: {punishment}")
+    if exceptions:
+        lines.append("Exceptions: " + "; ".join(exceptions))
+    return "\n".join(lines)
+
+
+def generate_digest(section: Dict) -> Dict:
+    """Ask Gemini for one section's digest, waiting out the admission queue when it is full"""
+    from llm_cache import generate_content
+    from admission import Overloaded, session
+
+    prompt = DIGEST_PROMPT.format(section_id=section['section_id'], title=section['title'], content=section['content'])
+    with session(DIGEST_SESSION):
+        while True:
+            try:
+                response = generate_content(
+                    prompt, GEMINI_MODEL, generation_config={"response_mime_type": "application/json"}
+                )
+                break
+            except Overloaded as e:
+                time.sleep(max(e.retry_after, 1.0))
+
+    fields = json.loads(JSON_FENCE_PATTERN.sub('', response.strip()))
+    elements = [str(item) for item in fields.get("elements") or []]
+    punishment = str(fields.get("punishment") or "")
+    exceptions = [str(item) for item in fields.get("exceptions") or []]
+    return {
+        "section_id": section['section_id'],
+        "content_sha256": content_sha256(section),
+        "elements": elements,
+        "punishment": punishment,
+        "exceptions": exceptions,
+        "digest": render_digest(section['section_id'], section['title'], elements, punishment, exceptions),
+        "model": GEMINI_MODEL,
+        "created_at": time.time()
+    }
+
+
+def read_digests(index_dir: str) -> Dict[str, Dict]:
+    """Stored digests by section id; empty when index_dir has none"""
+    path = os.path.join(index_dir, DIGESTS_FILE)
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    digests = {}
+    for row in conn.execute("SELECT * FROM digests"):
+        digest = dict(row)
+        digest["elements"] = json.loads(digest["elements"])
+        digest["exceptions"] = json.loads(digest["exceptions"])
+        digests[digest["section_id"]] = digest
+    conn.close()
+    return digests
+
+
+def published_dir() -> str:
+    """Directory of the published snapshot, whose digests a new build can reuse"""
+    pointer = read_pointer()
+    return snapshot_dir(pointer["version"]) if pointer else INDEX_DIR
+
+
+def save_section_digests(index_dir: str = INDEX_DIR, generate: bool = True,
+                         workers: int = DIGEST_WORKERS) -> str:
+    """
+    Write the digests of every long section to a SQLite file in index_dir
+
+    Digests whose section text is unchanged are carried over from index_dir itself
+    or the published snapshot. The rest are generated with Gemini, or left out when
+    generate is False so a build never spends quota unasked; those sections are
+    then sent in full.
+    """
+    corpus = load_corpus()
+    sections = []
+    seen = set()
+    for section in corpus['sections']:
+        if section['section_id'] not in seen and needs_digest(section):
+            seen.add(section['section_id'])
+            sections.append(section)
+
+    previous = {**read_digests(published_dir()), **read_digests(index_dir)}
+    digests = []
+    missing = []
+    for section in sections:
+        digest = previous.get(section['section_id'])
+        if digest and digest["content_sha256"] == content_sha256(section):
+            digests.append(digest)
+        else:
+            missing.append(section)
+
+    if generate and missing:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            digests.extend(executor.map(generate_digest, missing))
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, DIGESTS_FILE)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute(f"CREATE TABLE digests ({', '.join(COLUMNS)}, PRIMARY KEY (section_id))")
+    conn.executemany(
+        f"INSERT INTO digests VALUES ({', '.join('?' for _ in COLUMNS)})",
+        [
+            [json.dumps(digest[column]) if column in ("elements", "exceptions") else digest[column] for column in COLUMNS]
+            for digest in digests
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    # Swap the finished file in so readers never see a half-written table
+    os.replace(tmp_path, path)
+    return path
+
+
+class SectionDigests:
+    """Digests of the long sections of one index snapshot"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.digests = read_digests(index_dir)
+
+    def __len__(self):
+        return len(self.digests)
+
+    def get(self, section_id: str) -> Optional[str]:
+        """The rendered digest of a section, or None if it has none"""
+        digest = self.digests.get(section_id)
+        return digest["digest"] if digest else None
+
+    def stats(self) -> Dict:
+        """Estimated prompt tokens of the digested sections in full and as digests"""
+        sections = load_corpus()['sections_by_id']
+        return {
+            "sections": len(self.digests),
+            "full_tokens": sum(
+                estimate_tokens(sections[section_id]['content']) for section_id in self.digests if section_id in sections
+            ),
+            "digest_tokens": sum(estimate_tokens(digest["digest"]) for digest in self.digests.values())
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate digests of the long PPC sections")
+    parser.add_argument("--snapshot", help="Unpublished snapshot to digest (default: INDEX_DIR)")
+    parser.add_argument("--workers", type=int, default=DIGEST_WORKERS, help="Concurrent Gemini calls")
+    args = parser.parse_args()
+
+    index_dir = snapshot_dir(args.snapshot) if args.snapshot else INDEX_DIR
+    if not is_snapshot(index_dir) and read_pointer():
+        print("⚠️  Indexes are served from snapshots; digest a new one with: python build_indexes.py --digests")
+        return
+
+    with pinned(index_dir):
+        path = save_section_digests(index_dir, workers=args.workers)
+        stats = SectionDigests(index_dir).stats()
+    if args.snapshot:
+        refresh_files(args.snapshot)
+
+    print(f"✅ {path}")
+    print(f"📝 {stats['sections']} sections of {DIGEST_MIN_WORDS}+ words digested: "
+          f"~{stats['full_tokens']} tokens in full, ~{stats['digest_tokens']} as digests")
+
+
+if __name__ == "__main__":
+    main()
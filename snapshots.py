@@ -0,0 +1,254 @@
+"""
+Immutable, versioned snapshots of the local indexes
+
+build_indexes.py writes every index into a fresh directory under
+index/snapshots/<version>/ and finishes it with a manifest. Publishing a
+snapshot rewrites the small index/CURRENT pointer file with os.replace, which
+is atomic, so serving processes see either the old snapshot or the new one and
+never a half-built mix. Each request pins the snapshot that was current when it
+started, the loaders in database.py keep the current and previous snapshots
+resident, and rolling back is just pointing CURRENT at the previous version.
+
+A snapshot can also name the Weaviate collection it was ingested into, so the
+collection is switched together with the local indexes instead of the live one
+being deleted and re-populated.
+
+Without a CURRENT pointer everything is read from INDEX_DIR itself, as before.
+
+    python snapshots.py list
+    python snapshots.py activate 20261019-101500-1a2b3c4d
+    python snapshots.py rollback
+    python snapshots.py prune --keep 3
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Optional
+from config import (
+    INDEX_DIR,
+    CORPUS_ARTIFACT_PATH,
+    COLLECTION_NAME,
+    PPC_FILE_PATH,
+    SNAPSHOTS_DIR,
+    SNAPSHOT_POINTER,
+    SNAPSHOTS_KEEP
+)
+
+MANIFEST_FILE = "manifest.json"
+
+# The snapshot directory pinned by the request or build running in this context
+_pinned: ContextVar[Optional[str]] = ContextVar("pinned_snapshot", default=None)
+
+# CURRENT is re-read only when it is replaced or modified
+_pointer_cache = {"stat": None, "pointer": None}
+_pointer_lock = threading.Lock()
+
+
+def snapshot_dir(version: str) -> str:
+    return os.path.join(SNAPSHOTS_DIR, version)
+
+
+def read_pointer() -> Optional[Dict]:
+    """The published pointer {"version", "previous", "activated_at"}, or None before the first publish"""
+    try:
+        stat = os.stat(SNAPSHOT_POINTER)
+    except FileNotFoundError:
+        return None
+
+    with _pointer_lock:
+        if _pointer_cache["stat"] != (stat.st_ino, stat.st_mtime_ns):
+            with open(SNAPSHOT_POINTER, 'r', encoding='utf-8') as f:
+                _pointer_cache["pointer"] = json.load(f)
+            _pointer_cache["stat"] = (stat.st_ino, stat.st_mtime_ns)
+        return _pointer_cache["pointer"]
+
+
+def current_snapshot_dir() -> str:
+    """Directory the indexes are read from: the pinned snapshot, the published one, or INDEX_DIR"""
+    pinned = _pinned.get()
+    if pinned:
+        return pinned
+    pointer = read_pointer()
+    return snapshot_dir(pointer["version"]) if pointer else INDEX_DIR
+
+
+def is_snapshot(index_dir: str) -> bool:
+    return os.path.abspath(os.path.dirname(index_dir)) == os.path.abspath(SNAPSHOTS_DIR)
+
+
+def artifact_path(index_dir: Optional[str] = None) -> str:
+    """Path of the corpus artifact belonging to an index directory"""
+    index_dir = index_dir or current_snapshot_dir()
+    if is_snapshot(index_dir):
+        return os.path.join(index_dir, os.path.basename(CORPUS_ARTIFACT_PATH))
+    return CORPUS_ARTIFACT_PATH
+
+
+@contextmanager
+def pinned(index_dir: Optional[str] = None):
+    """Read every index from one snapshot for the duration of the block"""
+    token = _pinned.set(index_dir or current_snapshot_dir())
+    try:
+        yield _pinned.get()
+    finally:
+        _pinned.reset(token)
+
+
+def read_manifest(version: str) -> Optional[Dict]:
+    """A snapshot's manifest, or None if the snapshot is missing or unfinished"""
+    path = os.path.join(snapshot_dir(version), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Dict):
+    """Write JSON next to its destination and rename it into place"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def create_snapshot(file_path: str = PPC_FILE_PATH) -> str:
+    """Create an empty directory for a new snapshot of file_path and return its version"""
+    with open(file_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+    os.makedirs(snapshot_dir(version))
+    return version
+
+
+def finish_snapshot(version: str, file_path: str = PPC_FILE_PATH, collection: Optional[str] = None) -> Dict:
+    """Write the manifest that marks a snapshot complete; it is never modified after publishing"""
+    directory = snapshot_dir(version)
+    with open(file_path, 'rb') as f:
+        source_sha256 = hashlib.sha256(f.read()).hexdigest()
+    manifest = {
+        "version": version,
+        "created_at": time.time(),
+        "source": file_path,
+        "source_sha256": source_sha256,
+        "collection": collection,
+        "files": sorted(name for name in os.listdir(directory) if name != MANIFEST_FILE)
+    }
+    _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+    return manifest
+
+
+def _unpublished_manifest(version: str) -> Dict:
+    """The manifest of a finished snapshot that may still be changed"""
+    manifest = read_manifest(version)
+    if manifest is None:
+        raise ValueError(f"Snapshot {version} does not exist or is unfinished")
+    pointer = read_pointer()
+    if pointer and version in (pointer["version"], pointer.get("previous")):
+        raise ValueError(f"Snapshot {version} is published and immutable; build a new one")
+    return manifest
+
+
+def set_collection(version: str, collection: str):
+    """Record the Weaviate collection ingested for an unpublished snapshot"""
+    manifest = _unpublished_manifest(version)
+    manifest["collection"] = collection
+    _write_json(os.path.join(snapshot_dir(version), MANIFEST_FILE), manifest)
+
+
+def refresh_files(version: str):
+    """Re-list the files of an unpublished snapshot after an index was added to it"""
+    manifest = _unpublished_manifest(version)
+    directory = snapshot_dir(version)
+    manifest["files"] = sorted(name for name in os.listdir(directory) if name != MANIFEST_FILE)
+    _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+
+
+def snapshot_collection() -> str:
+    """Weaviate collection of the current snapshot, or COLLECTION_NAME when it names none"""
+    index_dir = current_snapshot_dir()
+    if is_snapshot(index_dir):
+        manifest = read_manifest(os.path.basename(index_dir))
+        if manifest and manifest.get("collection"):
+            return manifest["collection"]
+    return COLLECTION_NAME
+
+
+def activate(version: str) -> Dict:
+    """Atomically publish a finished snapshot; the one it replaces becomes the rollback target"""
+    if read_manifest(version) is None:
+        raise ValueError(f"Snapshot {version} does not exist or is unfinished")
+    pointer = read_pointer()
+    previous = pointer["version"] if pointer else None
+    new_pointer = {
+        "version": version,
+        "previous": previous if previous != version else pointer.get("previous"),
+        "activated_at": time.time()
+    }
+    _write_json(SNAPSHOT_POINTER, new_pointer)
+    return new_pointer
+
+
+def rollback() -> Dict:
+    """Publish the snapshot that was current before the last activation"""
+    pointer = read_pointer()
+    if not pointer or not pointer.get("previous"):
+        raise ValueError("There is no previous snapshot to roll back to")
+    return activate(pointer["previous"])
+
+
+def list_snapshots() -> List[Dict]:
+    """Finished snapshots, newest first"""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        return []
+    manifests = [read_manifest(version) for version in os.listdir(SNAPSHOTS_DIR)]
+    return sorted((manifest for manifest in manifests if manifest), key=lambda m: m["created_at"], reverse=True)
+
+
+def prune(keep: int = SNAPSHOTS_KEEP) -> List[str]:
+    """Delete all but the newest keep snapshots, never the current or previous one"""
+    pointer = read_pointer() or {}
+    protected = {pointer.get("version"), pointer.get("previous")}
+    removed = []
+    for manifest in list_snapshots()[keep:]:
+        if manifest["version"] not in protected:
+            shutil.rmtree(snapshot_dir(manifest["version"]))
+            removed.append(manifest["version"])
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, publish and roll back index snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show finished snapshots")
+    activate_parser = commands.add_parser("activate", help="Publish a snapshot")
+    activate_parser.add_argument("version")
+    commands.add_parser("rollback", help="Publish the previously active snapshot")
+    prune_parser = commands.add_parser("prune", help="Delete old snapshots")
+    prune_parser.add_argument("--keep", type=int, default=SNAPSHOTS_KEEP)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        pointer = read_pointer() or {}
+        for manifest in list_snapshots():
+            marker = "*" if manifest["version"] == pointer.get("version") else " "
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(manifest["created_at"]))
+            print(f"{marker} {manifest['version']}  {created}  collection: {manifest.get('collection') or COLLECTION_NAME}")
+    elif args.command == "activate":
+        print(f"✅ Active snapshot: {activate(args.version)['version']}")
+    elif args.command == "rollback":
+        print(f"↩️  Rolled back to {rollback()['version']}")
+    elif args.command == "prune":
+        removed = prune(args.keep)
+        print(f"🗑️  Removed {len(removed)} snapshots" + (f": {', '.join(removed)}" if removed else ""))
+
+
+if __name__ == "__main__":
+    main()
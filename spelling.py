@@ -0,0 +1,289 @@
+"""
+Fast spelling correction of legal terms and section ids
+
+Users misspell transliterated terms ("diyyat", "qisaas", "punishmnt") and section
+ids ("489F", "sec 302A" when there is no 302-A). Left alone, the section fast path,
+the punishment table and the lexical index all miss, and only the Gemini rewrite
+can repair the query.
+
+This is a SymSpell-style symmetric-delete index built at ingest. Every target
+term is stored under the strings obtained by deleting up to two characters from
+its prefix, so looking up a word only generates the deletes of the word itself
+and verifies the few terms stored under them. Targets are the legal vocabulary:
+the words of the section titles and the thesaurus. Words the corpus, the
+everyday and legal word lists or the general English word list (SPELLING_WORDLIST)
+already know are never corrected, and neither are capitalised words inside a
+sentence, which are usually names.
+
+Run this module directly to check the corrector against REGRESSION_CASES.
+"""
+import os
+import re
+import json
+from itertools import combinations
+from typing import List, Dict, Tuple, Optional
+from corpus import load_corpus, STOPWORDS, normalize_section_id
+from lexical_index import SECTION_MENTION_PATTERN
+from thesaurus import SYNONYM_GROUPS, EVERYDAY_TERMS
+from config import INDEX_DIR, SPELLING_MAX_DISTANCE, SPELLING_WORDLIST
+
+SPELLING_INDEX_FILE = "spelling.json"
+
+WORD_PATTERN = re.compile(r"[A-Za-z]+")
+# "489F" or "489-F" without a "section" prefix, which SECTION_MENTION_PATTERN handles
+BARE_SECTION_PATTERN = re.compile(r'(?<!section )(?<!sec )(?<!sec\.)(?<!s\. )\b\d{1,3}-?[a-z]\b', re.I)
+
+# Only the first characters of a term are indexed, which keeps the index small;
+# candidates are verified against the whole word
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 5
+
+# Everyday words that appear in questions but not in the statute, so they are not
+# "corrected" into the nearest legal term (prison -> poison, fight -> right)
+EVERYDAY_WORDS = {
+    "someone", "somebody", "anyone", "friend", "friends", "phone", "mobile", "online", "internet",
+    "boyfriend", "girlfriend", "neighbour", "neighbor", "social", "media", "facebook", "whatsapp",
+    "email", "message", "messages", "video", "photo", "photos", "picture", "pictures", "station",
+    "lawyer", "advocate", "judge", "prison", "jail", "bail", "divorce", "sister", "brother",
+    "mother", "father", "daughter", "school", "office", "business", "company", "account", "loan",
+    "landlord", "tenant", "bike", "motorcycle", "accident", "accidents", "hospital", "doctor",
+    "medicine", "drugs", "alcohol", "drunk", "knife", "fight", "fighting", "slap", "slapped",
+    "beat", "beaten", "stalking", "stalker", "abused", "abusive", "raped", "missing", "underage",
+    "protest", "protests", "tax", "taxes", "dispute", "inheritance", "happened", "happens",
+    "trying", "tried", "cheated", "lied", "scam", "scammed", "fake", "robbed", "threatened",
+    "threatening", "stabbing", "stabbed", "shooting", "crash", "crashed", "blackmailing", "blackmailed",
+    "hacked", "hacking", "cyber", "acid", "honour", "honor", "karo", "kari", "dowry", "thief", "thieves", "mugged", "killed", "killer", "murdered",
+    "sentenced", "jailed", "arrested", "arrest", "police", "policeman", "complaint", "lodge",
+    "innocent", "guilty", "please", "explain", "about", "tell", "know", "want", "need", "should",
+    "would", "could", "there", "their", "where", "while", "after", "before", "without", "against",
+    "between", "because", "years", "months", "maximum", "minimum", "difference", "meaning",
+    "smuggling", "smuggled", "smuggler", "trafficking", "trafficked", "bullying", "trolling",
+}
+
+# Pakistani legal terms that are not in the PPC text, so they are not "corrected"
+# into the nearest PPC word
+LEGAL_WORDS = {
+    "hudood", "hudud", "hadd", "qazf", "zina", "tazir", "sharia", "shariah", "ordinance", "nikah",
+    "nikahnama", "talaq", "khula", "mehr", "jirga", "panchayat", "challan", "thana", "tehsil",
+}
+
+# Queries the corrector must return unchanged, and misspellings it must repair
+REGRESSION_CASES = [
+    ("my neighbour Ahmed hit me with a stick", "my neighbour Ahmed hit me with a stick"),
+    ("what did Ahmed do", "what did Ahmed do"),
+    ("is smuggling of goods a crime", "is smuggling of goods a crime"),
+    ("punishment under the hudood ordinance", "punishment under the hudood ordinance"),
+    ("hudud and tazir punishments", "hudud and tazir punishments"),
+    ("section 3020", "section 3020"),
+    ("my landlord Imran threatened me", "my landlord Imran threatened me"),
+    ("human trafficking", "human trafficking"),
+    ("section 302", "section 302"),
+    ("punishmnt for diyyat", "punishment for diyat"),
+    ("Kidnaping of a child", "Kidnapping of a child"),
+    ("what is qisaas", "what is qisas"),
+    ("sec 302A", "Section 302"),
+    ("what does 489F say", "what does Section 489-F say"),
+    ("explain s. 498f", "explain Section 489-F"),
+]
+
+
+def load_wordlist(path: str = SPELLING_WORDLIST) -> set:
+    """The lowercase alphabetic words of a word list file; empty if the file is missing"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return {word.lower() for word in (line.strip() for line in f) if word.isalpha()}
+
+
+def deletes(word: str, max_distance: int) -> set:
+    """The word's prefix and every string left by deleting up to max_distance characters from it"""
+    prefix = word[:PREFIX_LENGTH]
+    variants = {prefix}
+    for count in range(1, min(max_distance, len(prefix) - 1) + 1):
+        for positions in combinations(range(len(prefix)), count):
+            variants.add(''.join(char for i, char in enumerate(prefix) if i not in positions))
+    return variants
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count once); max_distance + 1 if further"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def build_delete_index(terms: List[str], max_distance: int) -> Dict[str, List[str]]:
+    index = {}
+    for term in terms:
+        for variant in deletes(term, max_distance):
+            index.setdefault(variant, []).append(term)
+    return index
+
+
+def build_spelling_index(corpus: Dict, max_distance: int = SPELLING_MAX_DISTANCE) -> Dict:
+    """
+    Compile the symmetric-delete indexes of the legal vocabulary and the section ids
+
+    Returns:
+        {"counts": target term -> corpus frequency, "known": words never corrected,
+         "deletes": delete variant -> target terms, "section_ids": compact id -> section id,
+         "section_deletes": delete variant -> compact ids}
+    """
+    counts = {}
+    for word in WORD_PATTERN.findall(corpus['text'].lower()):
+        counts[word] = counts.get(word, 0) + 1
+
+    legal = set()
+    for section in corpus['sections']:
+        legal.update(word for word in WORD_PATTERN.findall(section['title'].lower()))
+    for term in [term for group in SYNONYM_GROUPS for term in group] + \
+                [term for key, terms in EVERYDAY_TERMS.items() for term in [key] + terms]:
+        legal.update(WORD_PATTERN.findall(term.lower()))
+    legal = {word for word in legal if len(word) >= MIN_WORD_LENGTH - 1}
+
+    # Compact ids such as "489f" so "489F" and "498f" are one edit away
+    section_ids = {section_id.replace('-', '').lower(): section_id for section_id in corpus['sections_by_id']}
+
+    return {
+        "counts": {word: counts.get(word, 1) for word in sorted(legal)},
+        "known": sorted(set(counts) | legal | EVERYDAY_WORDS | LEGAL_WORDS | STOPWORDS),
+        "deletes": build_delete_index(sorted(legal), max_distance),
+        "section_ids": section_ids,
+        "section_deletes": build_delete_index(sorted(section_ids), 1)
+    }
+
+
+def save_spelling_index(index_dir: str = INDEX_DIR) -> str:
+    """Build the spelling index from ppc.md and write it to the index directory"""
+    spelling_index = build_spelling_index(load_corpus())
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, SPELLING_INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(spelling_index, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+class SpellingCorrector:
+    """Correct misspelt legal terms and section ids in a query"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        path = os.path.join(index_dir, SPELLING_INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                spelling_index = json.load(f)
+        else:
+            spelling_index = build_spelling_index(load_corpus())
+        self.counts = spelling_index["counts"]
+        self.known = set(spelling_index["known"]) | load_wordlist()
+        self.deletes = spelling_index["deletes"]
+        self.section_ids = spelling_index["section_ids"]
+        self.section_deletes = spelling_index["section_deletes"]
+
+    def lookup(self, word: str, max_distance: int = SPELLING_MAX_DISTANCE) -> Optional[Tuple[str, int]]:
+        """The closest legal term to word, most frequent first on ties, with its distance; None if none is close"""
+        best = None
+        for variant in deletes(word, max_distance):
+            for term in self.deletes.get(variant, []):
+                distance = edit_distance(word, term, max_distance)
+                if distance <= max_distance and (
+                    best is None or (distance, -self.counts[term]) < (best[1], -self.counts[best[0]])
+                ):
+                    best = (term, distance)
+        return best
+
+    def correct_word(self, word: str) -> str:
+        lower = word.lower()
+        if len(lower) < MIN_WORD_LENGTH or lower in self.known or (lower.endswith('s') and lower[:-1] in self.known):
+            return word
+        # One edit for short words, where two would reach too many unrelated terms
+        match = self.lookup(lower, 1 if len(lower) < 8 else SPELLING_MAX_DISTANCE)
+        if match is None:
+            return word
+        return match[0].capitalize() if word[0].isupper() else match[0]
+
+    def correct_section_id(self, mention: str) -> Optional[str]:
+        """
+        The section id a mention refers to: itself if it exists, else the nearest id one edit away
+
+        The nearest id must have as many digits as the mention, so "3020" is not
+        read as "300" or "302".
+        """
+        section_id = normalize_section_id(mention)
+        if section_id is None:
+            return None
+        compact = section_id.replace('-', '').lower()
+        if compact in self.section_ids:
+            return self.section_ids[compact]
+
+        number = re.match(r'\d+', compact).group(0)
+        candidates = {
+            candidate for variant in deletes(compact, 1) for candidate in self.section_deletes.get(variant, [])
+            if edit_distance(compact, candidate, 1) <= 1 and len(re.match(r'\d+', candidate).group(0)) == len(number)
+        }
+        if not candidates:
+            return None
+        # Prefer ids that keep the number ("302A" -> "302"), then the shortest
+        best = min(candidates, key=lambda candidate: (not candidate.startswith(number), len(candidate), candidate))
+        return self.section_ids[best]
+
+    def correct(self, query: str) -> str:
+        """The query with bare and misspelt section ids rewritten and misspelt legal terms replaced"""
+        def mention(match):
+            section_id = self.correct_section_id(match.group(1))
+            if section_id is None or section_id == normalize_section_id(match.group(1)):
+                return match.group(0)
+            return f"Section {section_id}"
+
+        def bare(match):
+            section_id = normalize_section_id(match.group(0))
+            return f"Section {section_id}" if section_id and section_id.replace('-', '').lower() in self.section_ids \
+                else match.group(0)
+
+        def word(match):
+            # A capital inside a sentence marks a name ("Ahmed"), which is left as typed
+            text = match.group(0)
+            before = query[:match.start()].rstrip()
+            if text[0].isupper() and before and before[-1] not in ".!?":
+                return text
+            return self.correct_word(text)
+
+        query = SECTION_MENTION_PATTERN.sub(mention, query)
+        query = BARE_SECTION_PATTERN.sub(bare, query)
+        return WORD_PATTERN.sub(word, query)
+
+
+def main():
+    """Run the corrector over REGRESSION_CASES and report every query it gets wrong"""
+    print("="*60)
+    print("Spelling Correction Regression Check")
+    print("="*60)
+
+    corrector = SpellingCorrector()
+    failures = 0
+    for query, expected in REGRESSION_CASES:
+        corrected = corrector.correct(query)
+        if corrected != expected:
+            failures += 1
+            print(f"❌ {query!r} -> {corrected!r}, expected {expected!r}")
+
+    print(f"\n📊 {len(REGRESSION_CASES) - failures}/{len(REGRESSION_CASES)} queries corrected as expected")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
@@ -0,0 +1,263 @@
+"""
+Per-request choice of the optional stages of the answer pipeline
+
+search_and_generate_response used to run every stage for every question. Three
+of them are often wasted:
+
+- optimize: the Gemini query rewrite, for crisp keyword queries the local
+  lexical index already answers decisively
+- search: the remote Weaviate search, when the local BM25 and vector legs agree
+  on a clear best section
+- rerank: re-windowing and re-encoding retrieved chunks that are already short
+  single sections, few enough to send as they are
+
+The policy decides from signals that cost nothing extra: query length, the BM25
+score margin between the top two lexical hits, the similarity gap between the
+top two local vector hits, and the length and section count of the chunks.
+Every decision is returned with the answer, written to the query log and added
+to running totals of the time the skipped stages would have taken.
+
+STAGE_POLICY=shadow records the decisions but runs every stage, so the policy
+can be checked on live traffic; `python stage_policy.py` checks it offline.
+"""
+import time
+import argparse
+import threading
+from typing import List, Dict, Optional
+from corpus import load_corpus, chunk_section_ids
+from config import (
+    STAGE_POLICY,
+    POLICY_KEYWORD_WORDS,
+    POLICY_LEXICAL_MARGIN,
+    POLICY_SEARCH_MARGIN,
+    POLICY_VECTOR_GAP,
+    DEFAULT_MAX_CHUNKS,
+    DEFAULT_CHUNK_SIZE
+)
+
+STAGES = ("optimize", "search", "rerank")
+
+
+def lexical_margin(lexical_hits: List[Dict]) -> float:
+    """How many times the top BM25 score exceeds the second; infinite for a single hit, 0 for none"""
+    if not lexical_hits:
+        return 0.0
+    if len(lexical_hits) == 1 or lexical_hits[1]['score'] <= 0:
+        return float('inf')
+    return lexical_hits[0]['score'] / lexical_hits[1]['score']
+
+
+def optimize_skip_reason(query: str, lexical_hits: List[Dict]) -> Optional[str]:
+    """Why the Gemini rewrite can be skipped, or None to run it"""
+    words = len(query.split())
+    margin = lexical_margin(lexical_hits)
+    if words <= POLICY_KEYWORD_WORDS and margin >= POLICY_LEXICAL_MARGIN:
+        return f"{words}-word keyword query, lexical margin {margin:.1f}"
+    return None
+
+
+def search_skip_reason(lexical_hits: List[Dict], vector_chunks: List[Dict], federated: bool) -> Optional[str]:
+    """Why the remote search can be skipped, or None to run it"""
+    if federated or not lexical_hits or not vector_chunks:
+        return None
+    margin = lexical_margin(lexical_hits)
+    gap = vector_chunks[0]['score'] - vector_chunks[1]['score'] if len(vector_chunks) > 1 else 1.0
+    if (lexical_hits[0]['section_id'] == vector_chunks[0]['section_id']
+            and margin >= POLICY_SEARCH_MARGIN and gap >= POLICY_VECTOR_GAP):
+        return f"local legs agree on Section {lexical_hits[0]['section_id']} (margin {margin:.1f}, gap {gap:.2f})"
+    return None
+
+
+def rerank_skip_reason(chunks: List[Dict], max_chunks: int = DEFAULT_MAX_CHUNKS,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[str]:
+    """Why reranking can be skipped, or None to run it"""
+    if not chunks or len(chunks) > max_chunks:
+        return None
+    corpus = load_corpus()
+    for chunk in chunks:
+        if len(chunk['content'].split()) > chunk_size or len(chunk_section_ids(chunk['content'], corpus)) > 1:
+            return None
+    return f"{len(chunks)} short single-section chunks"
+
+
+class StagePolicy:
+    """Apply stage decisions according to the policy mode and total the time skipping saved"""
+
+    def __init__(self, mode: str = STAGE_POLICY):
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._stats = {stage: {"ran": 0, "skipped": 0, "seconds": 0.0, "saved": 0.0} for stage in STAGES}
+
+    def run(self, stage: str, skip_reason: Optional[str], decisions: Dict) -> bool:
+        """Record the decision for a stage in decisions and return whether to run it"""
+        if self.mode == "off":
+            return True
+        skip = skip_reason is not None and self.mode == "adaptive"
+        decisions[stage] = {"run": not skip, "reason": skip_reason or "no skip signal"}
+        if skip_reason and self.mode == "shadow":
+            decisions[stage]["would_skip"] = True
+        return not skip
+
+    def record(self, decisions: Dict, timings: Dict) -> float:
+        """
+        Add one request's decisions to the totals
+
+        A skipped stage is credited with the average time the stage took when it ran.
+
+        Returns:
+            Estimated seconds saved by this request
+        """
+        saved = 0.0
+        with self._lock:
+            for stage, decision in decisions.items():
+                stats = self._stats[stage]
+                if decision["run"]:
+                    if stage in timings:
+                        stats["ran"] += 1
+                        stats["seconds"] += timings[stage]
+                else:
+                    stats["skipped"] += 1
+                    estimate = stats["seconds"] / stats["ran"] if stats["ran"] else 0.0
+                    stats["saved"] += estimate
+                    saved += estimate
+        return saved
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-stage runs, skips, average run time in ms and estimated ms saved"""
+        with self._lock:
+            return {
+                stage: {
+                    "ran": stats["ran"],
+                    "skipped": stats["skipped"],
+                    "avg_ms": stats["seconds"] / stats["ran"] * 1000 if stats["ran"] else 0.0,
+                    "saved_ms": stats["saved"] * 1000
+                }
+                for stage, stats in self._stats.items()
+            }
+
+
+_policy = StagePolicy()
+
+
+def get_stage_policy() -> StagePolicy:
+    """Process-wide stage policy"""
+    return _policy
+
+
+def main():
+    """
+    Replay labelled and logged questions through the local pipeline with every stage
+    and with the policy, and compare what reaches the prompt
+
+    The remote search needs a Weaviate cluster, so both runs use only the local
+    legs; for it the evaluation reports how often a skip was signalled and whether
+    the local legs' best section was then the one the full run ranked first.
+    """
+    from sentence_transformers import SentenceTransformer
+    from lexical_index import LexicalIndex
+    from vector_store import QuantizedVectorStore
+    from chapter_router import ChapterRouter
+    from thesaurus import Thesaurus, EVAL_QUERIES
+    from windowing import rerank_by_token_windows
+    from query_processing import query_parser
+    from config import SENTENCE_TRANSFORMER_MODEL, LEXICAL_SEARCH_LIMIT, LOCAL_VECTOR_LIMIT, RRF_K, \
+        RERANK_OVERLAP_TOKENS
+
+    parser = argparse.ArgumentParser(description="Evaluate the adaptive stage policy offline")
+    parser.add_argument("--log", type=int, default=0, help="Also replay the top N logged queries (unlabelled)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("Adaptive Stage Policy Evaluation")
+    print("="*60)
+
+    sentence_model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+    lexical_index = LexicalIndex()
+    vector_store = QuantizedVectorStore()
+    router = ChapterRouter()
+    thesaurus = Thesaurus()
+
+    def fuse(*ranked_lists):
+        scores = {}
+        chunks = {}
+        for ranked in ranked_lists:
+            for rank, chunk in enumerate(ranked):
+                chunks.setdefault(chunk['section_id'], chunk)
+                scores[chunk['section_id']] = scores.get(chunk['section_id'], 0.0) + 1.0 / (RRF_K + rank + 1)
+        return [chunks[section_id] for section_id in sorted(scores, key=scores.get, reverse=True)]
+
+    def passage_sections(chunks, rerank):
+        if not rerank:
+            return [chunk['section_id'] for chunk in chunks[:DEFAULT_MAX_CHUNKS]]
+        passages = rerank_by_token_windows(
+            sentence_model, query_embedding, [chunk['content'] for chunk in chunks],
+            DEFAULT_MAX_CHUNKS, DEFAULT_CHUNK_SIZE, RERANK_OVERLAP_TOKENS
+        )
+        return list(dict.fromkeys(chunks[passage['chunk_index']]['section_id'] for passage in passages))
+
+    queries = [(query, expected) for query, expected in EVAL_QUERIES]
+    if args.log:
+        from query_log import get_query_log
+        queries += [(query, None) for query, _ in get_query_log().top_queries(args.log)]
+
+    skipped = {stage: 0 for stage in STAGES}
+    saved = {stage: 0.0 for stage in STAGES}
+    agree = 0
+    search_skips_agreeing = 0
+    hits = {"full": 0, "policy": 0}
+    labelled = 0
+    for query, expected in queries:
+        query_embedding = sentence_model.encode(query)
+        expanded = thesaurus.expand_query(query)
+        vector_chunks = vector_store.chunks(vector_store.search(query_embedding, LOCAL_VECTOR_LIMIT))
+        first_lexical = lexical_index.search(expanded, LEXICAL_SEARCH_LIMIT)
+
+        # Every stage
+        start = time.perf_counter()
+        routed = [title for title, _ in router.route(query, query_embedding)]
+        rewrite = query_parser(query, [router.display_name(title) for title in routed], fallback=expanded)
+        optimize_seconds = time.perf_counter() - start
+        full_chunks = fuse(lexical_index.search(f"{expanded} {rewrite}", LEXICAL_SEARCH_LIMIT), vector_chunks)
+        start = time.perf_counter()
+        full_sections = passage_sections(full_chunks, rerank=True)
+        rerank_seconds = time.perf_counter() - start
+
+        # With the policy
+        optimize = optimize_skip_reason(query, first_lexical) is None
+        lexical_hits = lexical_index.search(f"{expanded} {rewrite}", LEXICAL_SEARCH_LIMIT) if optimize else first_lexical
+        if search_skip_reason(lexical_hits, vector_chunks, federated=False):
+            skipped["search"] += 1
+            search_skips_agreeing += bool(full_sections) and lexical_hits[0]['section_id'] == full_sections[0]
+        policy_chunks = fuse(lexical_hits, vector_chunks)
+        rerank = rerank_skip_reason(policy_chunks) is None
+        policy_sections = passage_sections(policy_chunks, rerank)
+        if not optimize:
+            skipped["optimize"] += 1
+            saved["optimize"] += optimize_seconds
+        if not rerank:
+            skipped["rerank"] += 1
+            saved["rerank"] += rerank_seconds
+
+        agree += bool(full_sections) and bool(policy_sections) and full_sections[0] == policy_sections[0]
+        if expected:
+            labelled += 1
+            hits["full"] += bool(set(full_sections) & set(expected))
+            hits["policy"] += bool(set(policy_sections) & set(expected))
+        if set(full_sections) != set(policy_sections):
+            print(f"↔️  {query!r}: full {full_sections}, policy {policy_sections} "
+                  f"(optimize {'run' if optimize else 'skipped'}, rerank {'run' if rerank else 'skipped'})")
+
+    total = len(queries)
+    print(f"\n📄 {total} queries ({labelled} labelled)")
+    for stage in ("optimize", "rerank"):
+        print(f"⏭️  {stage:<8} skipped on {skipped[stage] / total:.0%}, saving {saved[stage] * 1000:.0f} ms in total")
+    print(f"⏭️  search   skip signalled on {skipped['search'] / total:.0%}; the local best section was the full "
+          f"run's first on {search_skips_agreeing}/{skipped['search']}")
+    print(f"📊 Same first section as the full pipeline on {agree / total:.0%} of queries")
+    if labelled:
+        print(f"📊 hit@{DEFAULT_MAX_CHUNKS}: full pipeline {hits['full'] / labelled:.0%}, "
+              f"with the policy {hits['policy'] / labelled:.0%}")
+
+
+if __name__ == "__main__":
+    main()
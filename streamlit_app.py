@@ -4,8 +4,14 @@ Pakistan Penal Code AI Assistant - Main Streamlit Application
 This is the main entry point for the PPC RAG Chatbot application.
 The app has been modularized for better maintainability and organization.
 """
+import time
+import uuid
 import streamlit as st
-from database import initialize_weaviate_client
+from collections import deque
+from database import initialize_weaviate_client, load_punishment_table, load_spelling_corrector, load_section_browser
+from browse import parse_browse_request, is_more_command
+from corpus import load_corpus, chunk_section_ids
+from corpora import PRIMARY_CORPUS
 from query_processing import query_classifier, handle_general_query
 from search_engine import search_and_generate_response
 from ui_components import (
@@ -13,9 +19,21 @@ from ui_components import (
     render_header, 
     render_sidebar, 
     render_chat_interface,
-    render_debug_info,
-    sidebar_spinner
+    render_message,
+    render_profile,
+    profiling_enabled,
+    compact_chat_history,
+    sidebar_spinner,
+    queue_status
 )
+from profiler import RequestProfiler
+from query_log import get_query_log
+from admission import Overloaded, get_admission_controller, session
+from snapshots import pinned
+from experiments import experiment_arm, current_arm, usage_cost, get_experiment_metrics
+from llm_cache import track_usage, current_usage
+from warmup import start_background_warmup
+from config import WARMUP_ON_STARTUP, SPELLING_CORRECTION
 
 def initialize_app():
     """Initialize the Streamlit application"""
@@ -33,25 +51,162 @@ def initialize_app():
     # Initialize session state
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "archived_messages" not in st.session_state:
+        st.session_state.archived_messages = []
+    if "history_pages" not in st.session_state:
+        st.session_state.history_pages = 1
+    if "render_times" not in st.session_state:
+        st.session_state.render_times = deque(maxlen=50)
     if "client" not in st.session_state:
         st.session_state.client = None
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     
     # Initialize client in the background
     if st.session_state.client is None:
         st.session_state.client = initialize_weaviate_client()
+    
+    # Replay the most frequent logged questions once per process
+    if WARMUP_ON_STARTUP:
+        start_background_warmup(st.session_state.client)
+
+
+def add_message(message):
+    """Append a message to the chat history and render it below the existing ones"""
+    st.session_state.messages.append(message)
+    render_message(message)
+
+
+def chunk_summaries(chunks):
+    """What the debug panel shows of the retrieved chunks; their text is not kept in the session"""
+    corpus = load_corpus()
+    return [
+        {
+            "chapter": chunk["chapter"],
+            "retriever": chunk.get("retriever", "vector"),
+            "score": chunk["score"],
+            "section_ids": chunk_section_ids(chunk["content"], corpus)
+                           if chunk.get("corpus", PRIMARY_CORPUS) == PRIMARY_CORPUS else []
+        }
+        for chunk in chunks
+    ]
+
+
+def add_result_message(result):
+    """Add an assistant answer with its sources and debug information to the chat history"""
+    add_message({
+        "role": "assistant", 
+        "content": result["answer"],
+        "sources": result["sources"],
+        "debug": {
+            "optimized_query": result["optimized_query"],
+            "sub_queries": result.get("sub_queries", []),
+            "routed_chapters": result["routed_chapters"],
+            "cross_references": result["cross_references"],
+            "definitions": result["definitions"],
+            "corrected_query": result.get("corrected_query"),
+            "digests": result.get("digests", []),
+            "relevant_chunks": chunk_summaries(result["relevant_chunks"]),
+            "timings": result.get("timings", {}),
+            "stage_decisions": result.get("stage_decisions", {}),
+            "saved_ms": result.get("saved_ms", 0)
+        }
+    })
+
+
+def log_query(user_question, query_type, start, result=None):
+    """Record an answered question in the query log and its arm's metrics; logging never interrupts the chat"""
+    try:
+        latency = time.perf_counter() - start
+        arm = current_arm()
+        experiment = None
+        if arm:
+            cost = usage_cost(current_usage())
+            get_experiment_metrics().record(arm, latency, cost)
+            experiment = {
+                "arm": f"{arm['experiment']}/{arm['arm']}", "in": cost["input_tokens"], "out": cost["output_tokens"],
+                "cached": cost["cached"], "calls": cost["calls"], "usd": round(cost["usd"], 6)
+            }
+        get_query_log().record(user_question, query_type, latency, result, experiment)
+    except Exception:
+        pass
+
+
+def correct_spelling(user_question):
+    """The question with misspelt legal terms and section ids corrected, so the local paths can answer it"""
+    if not SPELLING_CORRECTION:
+        return user_question
+    try:
+        return load_spelling_corrector().correct(user_question)
+    except Exception:
+        return user_question
+
+
+def show_browse_page(request, page):
+    """
+    Stream one page of a section range or chapter into the chat
+
+    The request and page are kept in the session so "/more" continues where it stopped.
+    """
+    browser = load_section_browser()
+    result = browser.page(request, page)
+    with st.chat_message("assistant"):
+        content = st.write_stream(browser.stream(result))
+    st.session_state.messages.append({"role": "assistant", "content": content})
+    st.session_state.browse = {"request": request, "page": result["page"]} if result["page"] < result["pages"] else None
 
 
 def process_user_input(user_question):
     """Process user input and generate appropriate response"""
+    start = time.perf_counter()
+    
     # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": user_question})
+    add_message({"role": "user", "content": user_question})
+    search_question = correct_spelling(user_question)
+    
+    # Section ranges and chapters are read straight from the section index, a page at a time
+    browse_request = parse_browse_request(search_question)
+    if browse_request or (is_more_command(user_question) and st.session_state.get("browse")):
+        if browse_request:
+            show_browse_page(browse_request, 1)
+        else:
+            show_browse_page(st.session_state.browse["request"], st.session_state.browse["page"] + 1)
+        log_query(user_question, "browse", start)
+        compact_chat_history()
+        return
+    
+    # "What is the punishment for X" is answered straight from the punishment table
+    try:
+        result = load_punishment_table().answer(search_question)
+    except Exception:
+        result = None
+    if result:
+        if search_question != user_question:
+            result["corrected_query"] = search_question
+        add_result_message(result)
+        log_query(user_question, "punishment", start, result)
+        compact_chat_history()
+        return
     
     # Check if client is available
     if not st.session_state.client:
         st.error("Database connection not available. Please refresh the page.")
         return
     
+    # Sessions asking faster than SESSION_RATE_LIMIT are turned away before spending quota
+    controller = get_admission_controller()
+    if controller:
+        try:
+            controller.check_session(st.session_state.session_id)
+        except Overloaded as e:
+            add_message({"role": "assistant", "content": f"⏳ {e}"})
+            log_query(user_question, "rate_limited", start)
+            compact_chat_history()
+            return
+    
     # First, classify the query
+    query_type = "error"
+    result = None
     try:
         with sidebar_spinner("Analyzing your question..."):
             query_type = query_classifier(user_question)
@@ -59,46 +214,55 @@ def process_user_input(user_question):
         if query_type == "GENERAL":
             # Handle general conversational queries
             response = handle_general_query(user_question)
-            st.session_state.messages.append({
+            add_message({
                 "role": "assistant", 
                 "content": response
             })
         
         elif query_type == "LEGAL":
             # Generate response using RAG system
-            result = search_and_generate_response(st.session_state.client, user_question)
+            result = search_and_generate_response(st.session_state.client, search_question)
             
             if isinstance(result, dict):
-                # Add assistant message to chat history
-                assistant_message = {
-                    "role": "assistant", 
-                    "content": result["answer"],
-                    "sources": result["sources"]
-                }
-                st.session_state.messages.append(assistant_message)
-                
-                # Show debug information
-                render_debug_info(result)
+                if search_question != user_question:
+                    result["corrected_query"] = search_question
+                # Add assistant message with its debug information to chat history
+                add_result_message(result)
                 
             else:
                 # Error occurred
-                st.session_state.messages.append({
+                add_message({
                     "role": "assistant", 
                     "content": f"❌ {result}"
                 })
+                query_type, result = "error", None
         
         else:
             # Fallback for unclear classification
-            st.session_state.messages.append({
+            add_message({
                 "role": "assistant", 
                 "content": "I'm not sure how to handle that query. Could you please ask a question about the Pakistan Penal Code or try rephrasing your question?"
             })
             
     except Exception as e:
-        st.session_state.messages.append({
+        query_type, result = "error", None
+        add_message({
             "role": "assistant", 
             "content": f"❌ An error occurred while processing your question: {e}"
         })
+    
+    finally:
+        log_query(user_question, query_type.lower(), start, result)
+        compact_chat_history()
+
+
+def attach_profile(profile):
+    """Store a request profile on the answer it belongs to and show it below the answer"""
+    for message in reversed(st.session_state.messages):
+        if message["role"] == "assistant":
+            message["profile"] = profile
+            break
+    render_profile(profile)
 
 
 def main():
@@ -115,9 +279,18 @@ def main():
     user_question = st.chat_input("Ask a question about the PPC...")
     
     if user_question:
-        process_user_input(user_question)
-        # Rerun to show the new messages
-        st.rerun()
+        # New messages are rendered in place, so no extra full rerun is needed
+        # Gemini calls of this request queue under this session and report their place in the sidebar;
+        # the whole request reads one index snapshot even if another is published meanwhile,
+        # and runs with the settings of the session's experiment arm
+        with session(st.session_state.session_id, on_wait=queue_status()), pinned(), \
+                experiment_arm(st.session_state.session_id), track_usage():
+            if profiling_enabled():
+                with RequestProfiler() as profiler:
+                    process_user_input(user_question)
+                attach_profile(profiler.result)
+            else:
+                process_user_input(user_question)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,374 @@
+"""
+Local legal thesaurus for query expansion
+
+Most of what the Gemini query rewrite adds is PPC vocabulary for everyday words:
+"abduction" for "kidnap", "qatl-i-amd" for "murder", "cheating" for "fraud".
+This module compiles the same mapping ahead of time from two sources:
+
+- the section titles of ppc.md: every spelling of a transliterated term
+  ("qatl-i-amd", "Qatl-e-Amd", "qatl amd") and the inflections of title words
+  ("kidnapped" -> "kidnapping")
+- a hand-maintained list of everyday terms and their PPC equivalents
+
+Expansion is a handful of dictionary lookups, so it runs before lexical and
+dense retrieval in microseconds. With QUERY_REWRITE=thesaurus it replaces the
+Gemini rewrite entirely; `python thesaurus.py` measures how often that retrieves
+as well as the rewrite does.
+"""
+import os
+import re
+import json
+import time
+import argparse
+from typing import List, Dict, Tuple
+from corpus import load_corpus, tokenize, TOKEN_PATTERN
+from punishments import stem
+from config import INDEX_DIR, THESAURUS_MAX_TERMS
+
+THESAURUS_FILE = "thesaurus.json"
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Joining particles of transliterated terms; "qatl-i-amd", "qatl-e-amd" and "qatl amd" all match
+CONNECTORS = {"i", "e", "bis", "bil", "ul"}
+
+MAX_PHRASE_WORDS = 3
+MAX_STEM_FORMS = 2
+
+# Everyday terms and the PPC vocabulary they should also be searched by.
+# Groups are equivalent both ways; mappings only add the PPC terms.
+SYNONYM_GROUPS = [
+    ["kidnapping", "abduction", "abducting", "kidnap", "abduct"],
+    ["punishment", "penalty", "sentence"],
+    ["cheating", "fraud", "fraudulently"],
+    ["rape", "zina-bil-jabr"],
+    ["defamation", "slander", "libel"],
+    ["extortion", "blackmail"],
+    ["qisas", "retaliation"],
+    ["afw", "waiver", "pardon"],
+    ["sulh", "compounding", "compromise", "settlement"],
+    ["isqat-i-haml", "abortion", "miscarriage"],
+    ["unnatural offences", "sodomy"],
+    ["false evidence", "perjury"],
+    ["rioting", "riot"],
+    ["forgery", "forged", "forging", "fake document", "false document"],
+]
+
+EVERYDAY_TERMS = {
+    "murder": ["qatl-i-amd", "qatl"],
+    "kill": ["qatl-i-amd", "qatl"],
+    "killing": ["qatl-i-amd", "qatl"],
+    "killed": ["qatl-i-amd", "qatl"],
+    "homicide": ["qatl-i-amd", "qatl"],
+    "manslaughter": ["qatl shibh-i-amd", "qatl-i-khata"],
+    "accidental killing": ["qatl-i-khata"],
+    "by accident": ["qatl-i-khata", "khata"],
+    "by mistake": ["qatl-i-khata", "khata"],
+    "blood money": ["diyat", "arsh", "daman"],
+    "compensation": ["diyat", "arsh", "daman"],
+    "ransom": ["extorting property", "kidnapping", "abducting"],
+    "steal": ["theft"],
+    "stealing": ["theft"],
+    "stole": ["theft"],
+    "stolen": ["theft", "stolen property"],
+    "shoplifting": ["theft"],
+    "pickpocket": ["theft"],
+    "thief": ["theft"],
+    "car": ["motor vehicles"],
+    "employer": ["clerk or servant", "master"],
+    "mugging": ["robbery"],
+    "mugged": ["robbery"],
+    "snatching": ["robbery"],
+    "armed robbery": ["robbery", "dacoity", "deadly weapon"],
+    "gang robbery": ["dacoity"],
+    "bribe": ["bribery", "gratification"],
+    "bribing": ["bribery", "gratification"],
+    "kickback": ["bribery", "gratification"],
+    "corruption": ["gratification", "bribery"],
+    "injury": ["hurt"],
+    "injure": ["hurt"],
+    "wound": ["hurt", "jaifah", "shajjah"],
+    "beating": ["hurt", "assault"],
+    "threat": ["criminal intimidation"],
+    "threaten": ["criminal intimidation"],
+    "threatening": ["criminal intimidation"],
+    "bounce": ["dishonestly issuing a cheque"],
+    "bounced": ["dishonestly issuing a cheque"],
+    "dishonoured cheque": ["dishonestly issuing a cheque"],
+    "fake currency": ["counterfeit", "currency-notes"],
+    "fake notes": ["counterfeit", "currency-notes"],
+    "counterfeit money": ["counterfeit", "currency-notes"],
+    "embezzlement": ["criminal breach of trust", "misappropriation"],
+    "embezzle": ["criminal breach of trust", "misappropriation"],
+    "burglary": ["house-breaking", "lurking house-trespass"],
+    "break in": ["house-breaking", "house-trespass"],
+    "breaking into": ["house-breaking", "house-trespass"],
+    "trespassing": ["criminal trespass", "house-trespass"],
+    "harassment": ["insult the modesty of a woman", "outrage her modesty"],
+    "harassing": ["insult the modesty of a woman", "outrage her modesty"],
+    "eve teasing": ["insult the modesty of a woman"],
+    "illegal detention": ["wrongful confinement"],
+    "detention": ["wrongful confinement"],
+    "hostage": ["wrongful confinement"],
+    "self defence": ["private defence"],
+    "self defense": ["private defence"],
+    "second marriage": ["marrying again during lifetime of husband or wife"],
+    "bigamy": ["marrying again during lifetime of husband or wife"],
+    "blasphemy": ["derogatory remarks", "holy prophet", "insult the religion"],
+    "police officer": ["public servant"],
+    "government official": ["public servant"],
+    "official": ["public servant"],
+    "conspiracy": ["criminal conspiracy"],
+    "drunk": ["drunken", "intoxication"],
+    "insane": ["unsound mind"],
+    "mental illness": ["unsound mind"],
+    "minor": ["child"],
+}
+
+
+def words(text: str) -> List[str]:
+    """Lowercase words of text with hyphens split and joining particles dropped"""
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in CONNECTORS]
+
+
+def phrase_key(text: str) -> str:
+    return " ".join(words(text))
+
+
+def compile_thesaurus(corpus: Dict) -> Dict:
+    """
+    Compile the phrase and inflection maps from the section titles and the hand-maintained lists
+
+    Returns:
+        {"phrases": phrase key -> terms to add, "stems": word stem -> title words}
+    """
+    phrases = {}
+
+    def add(key: str, terms: List[str]):
+        entry = phrases.setdefault(key, [])
+        for term in terms:
+            if term not in entry:
+                entry.append(term)
+
+    # Every hyphenated title term under the key shared by all its spellings,
+    # most frequent spelling first
+    spellings = {}
+    stem_forms = {}
+    for section in corpus['sections']:
+        title = section['title'].lower()
+        for token in TOKEN_PATTERN.findall(title):
+            if '-' in token and len(words(token)) >= 2:
+                counts = spellings.setdefault(phrase_key(token), {})
+                counts[token] = counts.get(token, 0) + 1
+        for token in tokenize(title):
+            if '-' not in token and not token.isdigit():
+                forms = stem_forms.setdefault(stem(token), [])
+                if token not in forms:
+                    forms.append(token)
+    for key, counts in spellings.items():
+        add(key, sorted(counts, key=counts.get, reverse=True))
+
+    for group in SYNONYM_GROUPS:
+        for term in group:
+            add(phrase_key(term), group)
+    for term, ppc_terms in EVERYDAY_TERMS.items():
+        add(phrase_key(term), ppc_terms)
+
+    return {
+        "phrases": phrases,
+        "stems": stem_forms
+    }
+
+
+def save_thesaurus(index_dir: str = INDEX_DIR) -> str:
+    """Compile the thesaurus from ppc.md and write it to the index directory"""
+    thesaurus = compile_thesaurus(load_corpus())
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, THESAURUS_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(thesaurus, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class Thesaurus:
+    """Expand queries with PPC vocabulary from the precompiled maps"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        path = os.path.join(index_dir, THESAURUS_FILE)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                thesaurus = json.load(f)
+        else:
+            thesaurus = compile_thesaurus(load_corpus())
+        self.phrases = thesaurus["phrases"]
+        self.stems = thesaurus["stems"]
+
+    def expand(self, query: str, max_terms: int = THESAURUS_MAX_TERMS) -> List[str]:
+        """
+        PPC terms to add to a query, at most max_terms
+
+        The longest known phrase at each position wins. A word that starts no
+        phrase is looked up by its stem, and otherwise adds the title words that
+        share its stem. Terms the query already contains are not added.
+        """
+        query_lower = query.lower()
+        query_words = words(query)
+        added = []
+        i = 0
+        while i < len(query_words) and len(added) < max_terms:
+            for n in range(min(MAX_PHRASE_WORDS, len(query_words) - i), 0, -1):
+                terms = self.phrases.get(" ".join(query_words[i:i + n]))
+                if terms:
+                    break
+            else:
+                n = 1
+                word_stem = stem(query_words[i])
+                terms = self.phrases.get(word_stem) or self.stems.get(word_stem, [])[:MAX_STEM_FORMS]
+            for term in terms:
+                if term not in query_lower and term not in added:
+                    added.append(term)
+            i += n
+        return added[:max_terms]
+
+    def knows(self, term: str) -> bool:
+        """Whether term is PPC vocabulary: a known phrase, or words whose stems the section titles use"""
+        if phrase_key(term) in self.phrases:
+            return True
+        tokens = tokenize(term)
+        return bool(tokens) and all(phrase_key(token) in self.phrases or stem(token) in self.stems for token in tokens)
+
+    def expand_query(self, query: str) -> str:
+        """The query followed by the terms it expands to"""
+        added = self.expand(query)
+        return f"{query} {' '.join(added)}" if added else query
+
+
+# Everyday questions and the sections that answer them
+EVAL_QUERIES: List[Tuple[str, List[str]]] = [
+    ("What is the penalty for murder?", ["302"]),
+    ("What happens if someone kills another person by accident?", ["318", "319"]),
+    ("punishment for killing someone while driving", ["320"]),
+    ("Is abduction for ransom a crime?", ["365-A"]),
+    ("what if someone tries to kidnap a child", ["364-A", "363", "369"]),
+    ("sentence for rape", ["376", "375"]),
+    ("what is zina bil jabr", ["375", "376"]),
+    ("cheating someone out of money", ["415", "417", "420"]),
+    ("fraud penalty", ["415", "417", "420"]),
+    ("stealing a car", ["381-A"]),
+    ("stealing from my employer", ["381"]),
+    ("mugging on the street", ["390", "392"]),
+    ("armed gang robbery", ["391", "395", "398"]),
+    ("bribing a government official", ["161", "171-B", "171-E"]),
+    ("my cheque bounced", ["489-F"]),
+    ("bounced cheque", ["489-F"]),
+    ("printing fake currency notes", ["489-A", "489-B", "489-C"]),
+    ("forging a document", ["463", "464", "465"]),
+    ("embezzlement by an employee", ["405", "406", "408"]),
+    ("someone is blackmailing me", ["383", "384"]),
+    ("threatening someone to kill them", ["503", "506"]),
+    ("slander and libel", ["499", "500"]),
+    ("breaking into a house at night", ["446", "456", "457"]),
+    ("is abortion illegal", ["338", "338-A"]),
+    ("blood money for murder", ["323", "330", "331"]),
+    ("illegal detention of a person", ["340", "342"]),
+    ("killing in self defence", ["96", "97", "100"]),
+    ("harassing a woman in public", ["509", "354"]),
+    ("perjury in court", ["191", "193"]),
+    ("qatl e amd punishment", ["302"]),
+    ("second marriage without telling first wife", ["494", "495"]),
+    ("blasphemy against the prophet", ["295-C"]),
+    ("assaulting a police officer", ["353"]),
+]
+
+
+def main():
+    """
+    Compare retrieval with the raw query, the thesaurus expansion and the Gemini rewrite
+
+    As in search_engine.retrieve, the rewrites only change the BM25 query: the
+    dense leg always encodes the question as asked, and the Gemini rewrite is
+    searched together with the thesaurus expansion.
+    """
+    from sentence_transformers import SentenceTransformer
+    from lexical_index import LexicalIndex
+    from vector_store import QuantizedVectorStore
+    from chapter_router import ChapterRouter
+    from query_processing import query_parser
+    from config import SENTENCE_TRANSFORMER_MODEL, RRF_K
+
+    parser = argparse.ArgumentParser(description="Evaluate thesaurus query expansion against the Gemini rewrite")
+    parser.add_argument("--k", type=int, default=5, help="Sections retrieved per query")
+    parser.add_argument("--log", type=int, default=0, help="Also compare on the top N logged queries (unlabelled)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("Thesaurus Query Expansion Evaluation")
+    print("="*60)
+
+    thesaurus = Thesaurus()
+    sentence_model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+    lexical_index = LexicalIndex()
+    vector_store = QuantizedVectorStore()
+    router = ChapterRouter()
+
+    def retrieve(query: str, lexical_query: str) -> List[str]:
+        """Top-k section ids of the local BM25 leg on lexical_query and the vector leg on query, fused by rank"""
+        scores = {}
+        lexical = [hit['section_id'] for hit in lexical_index.search(lexical_query, args.k * 2)]
+        embedding = sentence_model.encode(query)
+        dense = [chunk['section_id'] for chunk in vector_store.chunks(vector_store.search(embedding, args.k * 2))]
+        for ranked in (lexical, dense):
+            for rank, section_id in enumerate(ranked):
+                scores[section_id] = scores.get(section_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(scores, key=scores.get, reverse=True)[:args.k]
+
+    def rewrite(query: str) -> str:
+        """The BM25 query of the Gemini rewrite path: the expansion followed by the rewrite"""
+        routed = [title for title, _ in router.route(query, sentence_model.encode(query))]
+        expanded_query = thesaurus.expand_query(query)
+        rewritten = query_parser(query, [router.display_name(title) for title in routed], fallback=expanded_query)
+        return f"{expanded_query} {rewritten}"
+
+    start = time.perf_counter()
+    expanded = {query: thesaurus.expand_query(query) for query, _ in EVAL_QUERIES}
+    print(f"📖 {len(thesaurus.phrases)} phrases, {len(thesaurus.stems)} stems; "
+          f"expansion {(time.perf_counter() - start) / len(EVAL_QUERIES) * 1e6:.0f} µs/query\n")
+
+    hits = {"raw": 0, "thesaurus": 0, "llm": 0}
+    matched = 0
+    for query, expected in EVAL_QUERIES:
+        results = {
+            "raw": retrieve(query, query),
+            "thesaurus": retrieve(query, expanded[query]),
+            "llm": retrieve(query, rewrite(query))
+        }
+        found = {name: bool(set(result) & set(expected)) for name, result in results.items()}
+        for name in hits:
+            hits[name] += found[name]
+        matched += found["thesaurus"] >= found["llm"]
+        if found["thesaurus"] != found["llm"]:
+            print(f"{'✅' if found['thesaurus'] else '❌'} {query!r} -> {expanded[query]!r} "
+                  f"(thesaurus {found['thesaurus']}, Gemini {found['llm']})")
+
+    total = len(EVAL_QUERIES)
+    print(f"\n📊 hit@{args.k} over {total} labelled queries: raw {hits['raw'] / total:.0%}, "
+          f"thesaurus {hits['thesaurus'] / total:.0%}, Gemini rewrite {hits['llm'] / total:.0%}")
+    print(f"📊 Thesaurus matches or beats the Gemini rewrite on {matched}/{total} queries ({matched / total:.0%})")
+
+    if args.log:
+        from query_log import get_query_log
+        logged = [query for query, _ in get_query_log().top_queries(args.log)]
+        overlaps = [
+            len(set(retrieve(query, thesaurus.expand_query(query))) & set(retrieve(query, rewrite(query)))) / args.k
+            for query in logged
+        ]
+        if overlaps:
+            print(f"📊 Top-{args.k} overlap with the Gemini rewrite on {len(logged)} logged queries: "
+                  f"{sum(overlaps) / len(overlaps):.0%}")
+
+
+if __name__ == "__main__":
+    main()
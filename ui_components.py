@@ -1,21 +1,22 @@
 """
 UI components and styling for the Streamlit app
 """
+import time
+import html
+import zlib
 import streamlit as st
 from contextlib import contextmanager
+from llm_cache import get_cache
+from admission import get_admission_controller
+from corpora import load_corpora, get_corpus_metrics
+from profiler import flame_graph_rows
+from stage_policy import get_stage_policy
+from experiments import get_experiment_registry, get_experiment_metrics
+from config import MAX_CHAT_HISTORY, CHAT_PAGE_SIZE, ARCHIVED_PREVIEW_CHARS, MAX_ARCHIVED_MESSAGES, PROFILING_ALLOWED
 
 
-@contextmanager
-def sidebar_spinner(text):
-    """Context manager for displaying spinners in the sidebar"""
-    with st.sidebar:
-        with st.spinner(text):
-            yield
-
-
-def apply_custom_css():
-    """Apply custom CSS styling to the Streamlit app"""
-    st.markdown("""
+# Built once at import; emitted on full reruns only, never on chat fragment reruns
+CUSTOM_CSS = """
     <style>
         .main-header {
             text-align: center;
@@ -119,7 +120,33 @@ def apply_custom_css():
             }
         }
     </style>
-    """, unsafe_allow_html=True)
+"""
+
+
+@contextmanager
+def sidebar_spinner(text):
+    """Context manager for displaying spinners in the sidebar"""
+    with st.sidebar:
+        with st.spinner(text):
+            yield
+
+
+def queue_status():
+    """Sidebar placeholder and callback that show this session's place in the Gemini queue"""
+    placeholder = st.sidebar.empty()
+    
+    def on_wait(position, eta):
+        if position:
+            placeholder.warning(f"⏳ Waiting for capacity: position {position} in queue, about {eta:.0f}s")
+        else:
+            placeholder.empty()
+    
+    return on_wait
+
+
+def apply_custom_css():
+    """Apply custom CSS styling to the Streamlit app"""
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 def render_header():
@@ -150,37 +177,233 @@ def render_sidebar():
         st.subheader("🔄 Processing Status")
         st.caption("AI processing updates will appear here")
         
+        cache_stats = get_cache().stats()
+        st.caption(f"💾 Response cache: {cache_stats['hit_rate']:.0%} hit rate "
+                   f"({cache_stats['entries']} cached responses)")
+        
+        controller = get_admission_controller()
+        if controller:
+            admission = controller.snapshot()
+            st.caption(f"🚦 Gemini quota: {admission['queue']}/{admission['max_queue']} queued, "
+                       f"{admission['tokens']:.0f} calls available, {admission['shed']} shed")
+        
+        # Per-statute search cost and how often its hits make the final results
+        corpus_metrics = get_corpus_metrics().snapshot()
+        if len(load_corpora()) > 1 and corpus_metrics:
+            with st.expander("📚 Corpus metrics"):
+                for namespace, metrics in corpus_metrics.items():
+                    st.caption(f"**{load_corpora()[namespace]['name']}**: {metrics['searches']} searches, "
+                               f"{metrics['avg_latency_ms']:.0f} ms avg, "
+                               f"{metrics['contribution_rate']:.0%} of {metrics['hits']} hits used")
+        
+        # Stages the adaptive policy skipped and the time they would have taken
+        policy_stats = get_stage_policy().snapshot()
+        skipped = {stage: stats for stage, stats in policy_stats.items() if stats["skipped"]}
+        if skipped:
+            st.caption("⏭️ Skipped stages: " + ", ".join(
+                f"{stage} {stats['skipped']}/{stats['skipped'] + stats['ran']}" for stage, stats in skipped.items()
+            ) + f", ~{sum(stats['saved_ms'] for stats in skipped.values()) / 1000:.1f} s saved")
+        
+        # Per-arm latency and Gemini cost of the running experiment
+        registry = get_experiment_registry()
+        experiment = registry.current()
+        if experiment or registry.error:
+            with st.expander(f"🧪 Experiment: {experiment['name'] if experiment else 'none'}"):
+                if registry.error:
+                    st.caption(f"⚠️ {registry.error}; the last valid experiment keeps running")
+                for arm, metrics in get_experiment_metrics().snapshot().items():
+                    st.caption(f"**{arm}**: {metrics['requests']} requests, p50 {metrics['p50_ms']:.0f} ms, "
+                               f"p95 {metrics['p95_ms']:.0f} ms, {metrics['input_tokens']:.0f}/{metrics['output_tokens']:.0f} "
+                               f"tokens, ${metrics['usd_per_1k']:.3f} per 1k")
+        
+        render_times = st.session_state.get("render_times")
+        if render_times:
+            st.caption(f"⏱️ Chat render: {render_times[-1] * 1000:.1f} ms last, "
+                       f"{sum(render_times) / len(render_times) * 1000:.1f} ms avg")
+        
+        if PROFILING_ALLOWED:
+            st.toggle("🔬 Profile requests", key="profile_requests",
+                      help="Profile each answer (CPU samples and memory); also enabled by ?profile=1")
+        
         if st.button("🗑️ Clear Chat History"):
             st.session_state.messages = []
+            st.session_state.archived_messages = []
+            st.session_state.history_pages = 1
             st.rerun()
 
 
+def compact_chat_history():
+    """
+    Move the oldest messages out of the live history once it exceeds MAX_CHAT_HISTORY
+
+    Profiles are dropped once their answer leaves the first page, and only the
+    newest MAX_ARCHIVED_MESSAGES archived messages are kept.
+    """
+    messages = st.session_state.messages
+    for message in messages[:-CHAT_PAGE_SIZE]:
+        message.pop("profile", None)
+    
+    overflow = len(messages) - MAX_CHAT_HISTORY
+    if overflow <= 0:
+        return
+    
+    # Archived turns keep a short preview and their sources; debug payloads are dropped
+    for message in messages[:overflow]:
+        content = message["content"]
+        if len(content) > ARCHIVED_PREVIEW_CHARS:
+            content = content[:ARCHIVED_PREVIEW_CHARS] + "..."
+        archived = {"role": message["role"], "content": content}
+        if "sources" in message:
+            archived["sources"] = message["sources"]
+        st.session_state.archived_messages.append(archived)
+    
+    del messages[:overflow]
+    del st.session_state.archived_messages[:-MAX_ARCHIVED_MESSAGES]
+
+
+def render_message(message):
+    """Render a single chat message with its sources and debug information"""
+    with st.chat_message(message["role"]):
+        st.write(message["content"])
+        
+        # Show sources if available
+        if "sources" in message:
+            st.info(f"📚 **Sources:** {', '.join(message['sources'])}")
+        
+        if "debug" in message:
+            render_debug_info(message["debug"])
+        
+        if "profile" in message:
+            render_profile(message["profile"])
+
+
 def render_chat_interface():
     """Render the main chat interface"""
     st.markdown('<h1 style="text-align: center; margin-bottom: 1.5rem;">💬 Ask Your Legal Question</h1>', 
                 unsafe_allow_html=True)
+    render_chat_history()
+
+
+@st.fragment
+def render_chat_history():
+    """Render the most recent page of chat messages; paging reruns only this fragment"""
+    start = time.perf_counter()
+    messages = st.session_state.messages
+    visible = CHAT_PAGE_SIZE * st.session_state.history_pages
+    hidden = len(messages) - visible
     
-    # Display chat messages
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            with st.chat_message("user"):
-                st.write(message["content"])
-        else:
-            with st.chat_message("assistant"):
-                st.write(message["content"])
-                
-                # Show sources if available
-                if "sources" in message:
-                    st.info(f"📚 **Sources:** {', '.join(message['sources'])}")
+    if hidden > 0:
+        if st.button(f"⬆️ Show earlier messages ({hidden} hidden)"):
+            st.session_state.history_pages += 1
+            st.rerun(scope="fragment")
+    elif st.session_state.archived_messages:
+        with st.expander(f"🗄️ {len(st.session_state.archived_messages)} archived messages"):
+            for message in st.session_state.archived_messages:
+                st.markdown(f"**{message['role'].title()}:** {message['content']}")
+    
+    for message in messages[max(hidden, 0):]:
+        render_message(message)
+    
+    st.session_state.render_times.append(time.perf_counter() - start)
 
 
 def render_debug_info(result):
     """Render debug information in an expander"""
     with st.expander("🔍 Debug Information"):
         st.write("**Query Type:** Legal (Using RAG)")
+        if result.get("corrected_query"):
+            st.write("**Corrected Query:**", result["corrected_query"])
         st.write("**Optimized Query:**", result.get("optimized_query", "N/A"))
+        sub_queries = result.get("sub_queries")
+        if sub_queries:
+            st.write("**Sub-Queries:**", "; ".join(
+                f"{part['query']} ({sum(part['timings'].values()) * 1000:.0f} ms)" for part in sub_queries
+            ))
+        st.write("**Routed Chapters:**", ", ".join(result.get("routed_chapters", [])) or "All chapters")
+        st.write("**Cross-Referenced Sections:**", ", ".join(result.get("cross_references", [])) or "None")
+        st.write("**Attached Definitions:**", ", ".join(result.get("definitions", [])) or "None")
+        st.write("**Sent as Digests:**", ", ".join(result.get("digests", [])) or "None")
+        timings = result.get("timings")
+        if timings:
+            st.write("**Stage Timings:**", ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in timings.items()))
+        decisions = result.get("stage_decisions")
+        if decisions:
+            st.write("**Stage Policy:**", "; ".join(
+                f"{stage} {'run' if decision['run'] else 'skipped'}"
+                f"{' (would skip)' if decision.get('would_skip') else ''}: {decision['reason']}"
+                for stage, decision in decisions.items()
+            ))
+            if result.get("saved_ms"):
+                st.write("**Estimated Time Saved:**", f"{result['saved_ms']} ms")
         st.write("**Retrieved Chunks:**")
         for i, chunk in enumerate(result.get("relevant_chunks", []), 1):
-            st.write(f"**Chunk {i} ({chunk['chapter']})** - Score: {chunk['score']}")
-            st.write(chunk['content'][:500] + "..." if len(chunk['content']) > 500 else chunk['content'])
-            st.write("---")
+            sections = f" - Sections {', '.join(chunk['section_ids'])}" if chunk.get('section_ids') else ""
+            st.write(f"**Chunk {i} ({chunk['chapter']}, {chunk.get('retriever', 'vector')})** - "
+                     f"Score: {chunk['score']}{sections}")
+
+
+def profiling_enabled():
+    """
+    Whether the sidebar switch or the ?profile=1 query parameter asks for request profiling
+
+    Profiling slows the request and writes files, so both are ignored unless
+    PROFILING_ALLOWED is set.
+    """
+    if not PROFILING_ALLOWED:
+        return False
+    return bool(st.session_state.get("profile_requests")) or st.query_params.get("profile") in ("1", "true")
+
+
+def render_flame_graph(folded, row_height=18):
+    """Render folded stacks as an icicle-style flame graph, root at the top"""
+    rows = flame_graph_rows(folded)
+    boxes = []
+    for depth, row in enumerate(rows):
+        for label, start, width in row:
+            hue = zlib.crc32(label.split(" (")[0].encode()) % 60
+            boxes.append(
+                f'<div title="{html.escape(label)} ({width:.1%})" style="position:absolute; '
+                f'left:{start * 100:.3f}%; width:{width * 100:.3f}%; top:{depth * row_height}px; '
+                f'height:{row_height - 1}px; background:hsl({hue}, 80%, 60%); border-right:1px solid #fff; '
+                f'overflow:hidden; white-space:nowrap; font-size:11px; line-height:{row_height - 1}px; '
+                f'padding-left:2px; color:#222;">{html.escape(label)}</div>'
+            )
+    st.markdown(
+        f'<div style="position:relative; height:{len(rows) * row_height}px; width:100%;">{"".join(boxes)}</div>',
+        unsafe_allow_html=True
+    )
+
+
+def render_profile(profile):
+    """Render a request profile: flame graph, hot functions and peak allocations"""
+    with st.expander("🔬 Request Profile"):
+        st.write(f"**Wall time:** {profile['duration_ms']:.0f} ms "
+                 f"({profile['samples']} samples every {profile['interval_ms']:.0f} ms)")
+        st.write(f"**Peak memory:** {profile['peak_kb'] / 1024:.1f} MB above start, "
+                 f"{profile['retained_kb'] / 1024:.1f} MB retained")
+        if profile.get("overlapped"):
+            st.caption("Another request was profiled at the same time; its allocations count towards the peak.")
+        
+        if profile["folded"]:
+            st.write("**Flame graph:**")
+            render_flame_graph(profile["folded"])
+        
+        st.write("**Hot functions:**")
+        st.table([
+            {
+                "Function": row["function"],
+                "Self (ms)": f"{row['self_ms']:.0f}",
+                "Total (ms)": f"{row['total_ms']:.0f}",
+                "Total (%)": f"{row['total_pct']:.0%}"
+            }
+            for row in profile["hot_functions"]
+        ])
+        
+        st.write("**Largest allocations:**")
+        st.table([
+            {"Location": row["location"], "Size (KB)": f"{row['size_kb']:.1f}", "Blocks": row["count"]}
+            for row in profile["allocations"]
+        ])
+        
+        if profile.get("paths"):
+            st.caption(f"Saved to {profile['paths']['json']} and {profile['paths']['folded']}")
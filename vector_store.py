@@ -0,0 +1,217 @@
+"""
+Quantized local vector store over the chunk embeddings in the corpus artifact
+
+Float32 chunk matrices become the dominant per-worker memory cost once every
+sub-window and statute has precomputed vectors. This store keeps only compact
+codes in memory, either int8 (one signed byte per dimension with a per-dimension
+scale) or binary (one sign bit per dimension), and uses them to shortlist
+candidates. The shortlist is then rescored exactly against the float32 matrix,
+which stays on disk in the memory-mapped artifact and is only paged in for the
+rows that are touched.
+
+Run this module directly to benchmark memory, QPS and recall against float search.
+"""
+import os
+import time
+from typing import List, Dict, Tuple
+import numpy as np
+from corpus_artifact import CorpusArtifact
+from config import INDEX_DIR, CORPUS_ARTIFACT_PATH, VECTOR_QUANTIZATION, VECTOR_RESCORE_FACTOR
+
+VECTOR_STORE_FILE = "vector_codes.npz"
+
+MODES = ("float", "int8", "binary")
+
+# Rows of int8 codes converted to float32 at a time, bounding the scratch memory per search
+SCORE_BLOCK_ROWS = 4096
+
+# Set bits in every byte value, for Hamming distances over packed sign bits
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension int8 quantization; returns (codes, scales)"""
+    scales = np.abs(embeddings).max(axis=0) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(embeddings: np.ndarray) -> np.ndarray:
+    """Pack the sign of every dimension into bits, 8 dimensions per byte"""
+    return np.packbits(embeddings > 0, axis=-1)
+
+
+def save_vector_store(index_dir: str = INDEX_DIR, artifact_path: str = CORPUS_ARTIFACT_PATH) -> str:
+    """Quantize the artifact's chunk embeddings and store the codes in the index directory"""
+    artifact = CorpusArtifact(artifact_path)
+    if artifact.embeddings is None:
+        raise ValueError(f"{artifact_path} was built without chunk embeddings")
+
+    embeddings = np.asarray(artifact.embeddings, dtype=np.float32)
+    int8_codes, scales = quantize_int8(embeddings)
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, VECTOR_STORE_FILE)
+    np.savez(
+        path,
+        int8_codes=int8_codes,
+        scales=scales,
+        binary_codes=quantize_binary(embeddings),
+        source_sha256=np.array(artifact.meta['source_sha256'])
+    )
+    return path
+
+
+class QuantizedVectorStore:
+    """Nearest-chunk search with quantized candidates and exact float rescoring"""
+
+    def __init__(self, mode: str = VECTOR_QUANTIZATION, index_dir: str = INDEX_DIR,
+                 artifact_path: str = CORPUS_ARTIFACT_PATH):
+        if mode not in MODES:
+            raise ValueError(f"Unknown vector quantization '{mode}', expected one of {MODES}")
+
+        self.mode = mode
+        self.artifact = CorpusArtifact(artifact_path)
+        if self.artifact.embeddings is None:
+            raise ValueError(f"{artifact_path} was built without chunk embeddings")
+
+        # Float rows stay in the memory-mapped artifact until a search touches them
+        self.full = self.artifact.embeddings
+        self.codes = None
+        self.scales = None
+
+        if mode != "float":
+            path = os.path.join(index_dir, VECTOR_STORE_FILE)
+            if not os.path.exists(path):
+                save_vector_store(index_dir, artifact_path)
+            data = np.load(path)
+            if (str(data['source_sha256']) != self.artifact.meta['source_sha256']
+                    or len(data['binary_codes']) != len(self.full)):
+                path = save_vector_store(index_dir, artifact_path)
+                data = np.load(path)
+            if mode == "int8":
+                self.codes, self.scales = data['int8_codes'], data['scales']
+            else:
+                self.codes = data['binary_codes']
+
+    def __len__(self) -> int:
+        return len(self.full)
+
+    def memory_bytes(self) -> int:
+        """Bytes held in process memory for candidate generation"""
+        if self.mode == "float":
+            return self.full.nbytes
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _candidate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to every chunk (higher is better)"""
+        if self.mode == "int8":
+            # q . (codes * scales) == (q * scales) . codes, one float32 block at a time
+            # so the int8 matrix is never upcast whole
+            weights = query * self.scales
+            scores = np.empty(len(self.codes), dtype=np.float32)
+            for start in range(0, len(self.codes), SCORE_BLOCK_ROWS):
+                block = self.codes[start:start + SCORE_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ weights
+            return scores
+        if self.mode == "binary":
+            query_bits = quantize_binary(query[np.newaxis, :])
+            distances = POPCOUNT[np.bitwise_xor(self.codes, query_bits)].sum(axis=1, dtype=np.int32)
+            return -distances
+        return self.full @ query
+
+    def search(self, query_embedding, k: int = 4,
+               rescore_factor: int = VECTOR_RESCORE_FACTOR) -> List[Tuple[int, float]]:
+        """
+        Return the k nearest chunks as (chunk_index, cosine similarity) pairs
+
+        The quantized codes shortlist k * rescore_factor candidates, which are
+        rescored with the float embeddings; rescore_factor=0 skips rescoring.
+        """
+        if len(self) == 0 or k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = self._candidate_scores(query)
+        shortlist_size = min(len(scores), k * rescore_factor if self.mode != "float" and rescore_factor else k)
+        shortlist = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+
+        if self.mode != "float" and rescore_factor:
+            # Sorted rows read the memory-mapped float matrix front to back
+            shortlist = np.sort(shortlist)
+            exact = self.full[shortlist] @ query
+            order = np.argsort(-exact)[:k]
+            return [(int(shortlist[i]), float(exact[i])) for i in order]
+
+        order = shortlist[np.argsort(-scores[shortlist])][:k]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def chunks(self, results: List[Tuple[int, float]]) -> List[Dict]:
+        """
+        Resolve search results to their sections in the format used for Weaviate results
+
+        Chunks are sized for the encoder rather than for the prompt, so each hit
+        returns its whole section, once, like the lexical index does.
+        """
+        corpus_sections = self.artifact.meta['sections']
+        section_rows = self.artifact.blocks['sections']
+        chunks = []
+        seen = set()
+        for index, score in results:
+            chunk = self.artifact.chunk(index)
+            section_index = int(self.artifact.blocks['chunks'][index][2])
+            if section_index in seen:
+                continue
+            seen.add(section_index)
+            heading_byte, content_byte = (int(value) for value in section_rows[section_index][:2])
+            heading = self.artifact.text(heading_byte, content_byte).strip()
+            chunks.append({
+                "chapter": chunk['chapter_title'],
+                "content": f"{heading}\n{self.artifact.section_content(section_index)}",
+                "score": round(score, 4),
+                "section_id": corpus_sections[section_index]['section_id']
+            })
+        return chunks
+
+
+def main(num_queries: int = 200, k: int = 4):
+    """Benchmark memory, QPS and recall@k of each mode against exact float search"""
+    from sentence_transformers import SentenceTransformer
+    from corpus import load_corpus
+    from config import SENTENCE_TRANSFORMER_MODEL
+
+    print("="*60)
+    print("Quantized Vector Store Benchmark")
+    print("="*60)
+
+    # Section titles make realistic short queries against the chunk embeddings
+    sections = load_corpus()['sections']
+    step = max(1, len(sections) // num_queries)
+    titles = [section['title'] for section in sections[::step]][:num_queries]
+    sentence_model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+    queries = sentence_model.encode(titles, normalize_embeddings=True)
+
+    baseline = QuantizedVectorStore("float")
+    truth = [{index for index, _ in baseline.search(query, k)} for query in queries]
+    print(f"📄 {len(baseline)} chunks, {len(queries)} queries, recall@{k} against exact float search\n")
+
+    runs = [("float", 0)] + [(mode, factor) for mode in ("int8", "binary") for factor in (0, VECTOR_RESCORE_FACTOR)]
+    for mode, factor in runs:
+        store = QuantizedVectorStore(mode)
+        start = time.perf_counter()
+        results = [store.search(query, k, rescore_factor=factor) for query in queries]
+        elapsed = time.perf_counter() - start
+
+        recall = np.mean([
+            len({index for index, _ in result} & expected) / k for result, expected in zip(results, truth)
+        ])
+        label = f"{mode}{' + rescore x' + str(factor) if factor else ''}"
+        print(f"📊 {label:<22} memory {store.memory_bytes() / 1024:8.1f} KiB   "
+              f"{len(queries) / elapsed:8.0f} QPS   recall {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
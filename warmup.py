@@ -0,0 +1,190 @@
+"""
+Startup warm-up from historical traffic
+
+A fresh process starts with an unloaded sentence model and cold index pages, and
+a new node also starts with an empty LLM response cache. warm_up() loads every
+model and index, pages in the sections the query log shows are retrieved most
+often, and replays the most frequent logged questions through the same path as
+the app. Their classifications, optimised queries and answers are then cached
+before users arrive.
+
+Run it before a node takes traffic:
+    python warmup.py --top 50
+
+The app also runs it once per process in a background thread when
+WARMUP_ON_STARTUP is set.
+"""
+import time
+import argparse
+import threading
+from typing import List, Dict
+import numpy as np
+import streamlit as st
+from query_log import get_query_log
+from admission import session
+from config import WARMUP_TOP_N, SPELLING_CORRECTION
+
+WARMUP_SESSION = "warmup"
+
+
+def load_resources() -> float:
+    """Load every cached model and index and run the encoder once; returns seconds taken"""
+    from corpus import load_corpus
+    from database import (
+        load_sentence_transformer, load_chapter_router, load_cross_reference_graph,
+        load_definitions_index, load_punishment_table, load_lexical_index, load_vector_store,
+        load_thesaurus, load_spelling_corrector, load_section_browser, load_section_digests
+    )
+
+    start = time.perf_counter()
+    load_corpus()
+    load_sentence_transformer().encode("warm up")
+    for loader in (load_chapter_router, load_cross_reference_graph, load_definitions_index,
+                   load_punishment_table, load_lexical_index, load_vector_store, load_thesaurus,
+                   load_spelling_corrector, load_section_browser, load_section_digests):
+        loader()
+    return time.perf_counter() - start
+
+
+def page_in_sections(section_ids: List[str]) -> int:
+    """Read the hottest sections' index rows and chunk embeddings into the page cache"""
+    from database import load_lexical_index, load_vector_store
+
+    if not section_ids:
+        return 0
+    load_lexical_index().get_sections(section_ids)
+
+    vector_store = load_vector_store()
+    if vector_store:
+        artifact = vector_store.artifact
+        wanted = set(section_ids)
+        indexes = [i for i, section in enumerate(artifact.meta['sections']) if section['section_id'] in wanted]
+        for index in indexes:
+            artifact.section_content(index)
+        rows = np.flatnonzero(np.isin(artifact.blocks['chunks'][:, 2], indexes))
+        # Summing the rows touches every page that holds them
+        float(vector_store.full[rows].sum())
+    return len(section_ids)
+
+
+def replay_query(client, query: str) -> str:
+    """
+    Answer one question the way process_user_input does; returns how it was answered
+
+    As in the app, the spelling-corrected question is browsed, looked up and
+    searched, while the question as typed is classified and answered when general,
+    so the replay fills the same cache entries.
+    """
+    from database import load_punishment_table, load_lexical_index, load_sentence_transformer, load_spelling_corrector
+    from query_processing import query_classifier, handle_general_query
+    from search_engine import search_and_generate_response, no_status
+    from browse import parse_browse_request
+
+    search_query = load_spelling_corrector().correct(query) if SPELLING_CORRECTION else query
+    if parse_browse_request(search_query):
+        return "browse"
+    if load_punishment_table().answer(search_query):
+        return "punishment"
+
+    query_type = query_classifier(query)
+    if query_type == "GENERAL":
+        handle_general_query(query)
+        return "general"
+
+    if client is None:
+        # Without Weaviate only the local retrieval stages can be warmed
+        load_sentence_transformer().encode(search_query)
+        load_lexical_index().search(search_query)
+        return "local"
+
+    # The warm-up thread has no Streamlit script context, so nothing may be drawn from it
+    result = search_and_generate_response(client, search_query, status=no_status)
+    if not isinstance(result, dict):
+        raise RuntimeError(result)
+    return "legal"
+
+
+def warm_up(client=None, top_n: int = WARMUP_TOP_N, verbose: bool = False) -> Dict:
+    """
+    Load resources, page in hot sections and replay the top logged questions
+
+    Returns:
+        Dictionary with the seconds spent loading, the number of sections paged in,
+        the number of questions replayed and failed, and the total seconds
+    """
+    start = time.perf_counter()
+    query_log = get_query_log()
+
+    load_seconds = load_resources()
+    if verbose:
+        print(f"✅ Models and indexes loaded in {load_seconds:.1f}s")
+
+    hot_sections = [section_id for section_id, _ in query_log.hot_sections(top_n * 4)]
+    paged = page_in_sections(hot_sections)
+    if verbose:
+        print(f"📄 Paged in {paged} frequently retrieved sections")
+
+    replayed = 0
+    failed = 0
+    for query, count in query_log.top_queries(top_n):
+        query_start = time.perf_counter()
+        try:
+            # Replays queue for Gemini quota as a single session and so take one session's
+            # share of the quota while users are waiting
+            with session(WARMUP_SESSION):
+                outcome = replay_query(client, query)
+            replayed += 1
+            if verbose:
+                print(f"🔁 {outcome:<10} {time.perf_counter() - query_start:6.2f}s  x{count}  {query[:70]}")
+        except Exception as e:
+            failed += 1
+            if verbose:
+                print(f"❌ {query[:70]}: {e}")
+
+    return {
+        "load_seconds": load_seconds,
+        "sections": paged,
+        "replayed": replayed,
+        "failed": failed,
+        "seconds": time.perf_counter() - start
+    }
+
+
+@st.cache_resource
+def start_background_warmup(_client):
+    """Warm this process once, in a daemon thread so the first page load is not held up"""
+    thread = threading.Thread(target=warm_up, args=(_client,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm models, indexes and the answer cache from the query log")
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_N, help="Number of most frequent questions to replay")
+    parser.add_argument("--local-only", action="store_true",
+                        help="Do not connect to Weaviate; warm only the local stages")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("Pakistan Penal Code - Startup Warm-up")
+    print("="*60)
+
+    client = None
+    if not args.local_only:
+        from database import initialize_weaviate_client
+        client = initialize_weaviate_client()
+        if client is None:
+            print("⚠️  Could not connect to Weaviate; warming only the local stages")
+
+    try:
+        summary = warm_up(client, args.top, verbose=True)
+    finally:
+        if client is not None:
+            client.close()
+
+    print(f"\n✅ Warm-up finished in {summary['seconds']:.1f}s: {summary['replayed']} questions replayed, "
+          f"{summary['failed']} failed, {summary['sections']} sections paged in")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,16 @@ from weaviate.classes.config import Configure, Property, DataType
 import os
 import re
 import time
+import queue
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple
+from corpora import PRIMARY_CORPUS, load_corpora
+from amendments import normalize_amendments
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +22,14 @@ WEAVIATE_URL = os.getenv("WEAVIATE_URL")
 WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
 COHERE_APIKEY = os.getenv("COHERE_APIKEY")
 
+# Streaming ingest pipeline
+INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Chunking processes
+INGEST_QUEUE_SIZE = 8                               # Upload batches buffered between chunking and upload
+UPLOAD_CONCURRENCY = 4                              # Batches in flight to Weaviate at once
+UPLOAD_RETRIES = 2
+UPLOAD_RETRY_DELAY = 15.0
+PROGRESS_INTERVAL = 5.0
+
 def clean_text(text: str) -> str:
     """Clean and normalize text content"""
     # Remove extra whitespace and normalize line breaks
@@ -102,37 +118,27 @@ def extract_sections_from_chapter(content: str, chapter_title: str) -> List[Dict
     
     return sections
 
-def chunk_markdown_advanced(markdown_file_path: str, chunk_size: int = 500, overlap: int = 50) -> List[Dict]:
+CHAPTER_NAMES = [
+    "# CHAPTER I", "# CHAPTER II", "# CHAPTER III", "# CHAPTER IV", "# CHAPTER V",
+    "# CHAPTER VI", "# CHAPTER VII", "# CHAPTER VIII", "# CHAPTER IX", "# CHAPTER X",
+    "# CHAPTER XI", "# CHAPTER XII", "# CHAPTER XIII", "# CHAPTER XIV", "# CHAPTER XV",
+    "# CHAPTER XVI", "# CHAPTER XVII", "# CHAPTER XVIII", "# CHAPTER XIX", "# CHAPTER XX",
+    "# CHAPTER XXI", "# CHAPTER XXII", "# CHAPTER XXIII"
+]
+
+def iter_chapters(markdown_text: str, detect_chapters: bool = False) -> Iterator[Tuple[str, str]]:
     """
-    Advanced chunking that creates smaller, more granular chunks
+    Yield (chapter_title, chapter_content) pairs in file order
     
     Args:
-        markdown_file_path: Path to the markdown file
-        chunk_size: Target number of words per chunk
-        overlap: Number of words to overlap between chunks
-    
-    Returns:
-        List of chunk dictionaries
+        markdown_text: Full markdown text
+        detect_chapters: Find "# CHAPTER ..." headings in the text instead of using the 23 PPC chapters
     """
+    chapter_names = CHAPTER_NAMES
+    if detect_chapters:
+        chapter_names = list(dict.fromkeys(re.findall(r'^# CHAPTER [IVXLC]+(?=[ \t]*$)', markdown_text, re.M)))
     
-    chapter_names = [
-        "# CHAPTER I", "# CHAPTER II", "# CHAPTER III", "# CHAPTER IV", "# CHAPTER V",
-        "# CHAPTER VI", "# CHAPTER VII", "# CHAPTER VIII", "# CHAPTER IX", "# CHAPTER X",
-        "# CHAPTER XI", "# CHAPTER XII", "# CHAPTER XIII", "# CHAPTER XIV", "# CHAPTER XV",
-        "# CHAPTER XVI", "# CHAPTER XVII", "# CHAPTER XVIII", "# CHAPTER XIX", "# CHAPTER XX",
-        "# CHAPTER XXI", "# CHAPTER XXII", "# CHAPTER XXIII"
-    ]
-
-    try:
-        with open(markdown_file_path, 'r', encoding='utf-8') as f:
-            markdown_text = f.read()
-    except FileNotFoundError:
-        print(f"Error: The file '{markdown_file_path}' was not found.")
-        return []
-
-    all_chunks = []
     start_index = 0
-    
     for i, chapter_title in enumerate(chapter_names):
         try:
             current_chapter_start = markdown_text.index(chapter_title, start_index)
@@ -152,47 +158,81 @@ def chunk_markdown_advanced(markdown_file_path: str, chunk_size: int = 500, over
 
         # Extract chapter content
         chapter_content = markdown_text[current_chapter_start + len(chapter_title):next_chapter_start].strip()
+        start_index = next_chapter_start
         
-        if not chapter_content:
-            continue
-        
-        # Method 1: Extract by sections first
-        sections = extract_sections_from_chapter(chapter_content, chapter_title)
+        if chapter_content:
+            yield chapter_title, chapter_content
+
+def chunk_chapter(chapter_title: str, chapter_content: str, chunk_size: int = 500, overlap: int = 50,
+                  namespace: str = "") -> List[Dict]:
+    """
+    Split one chapter into section and subsection chunks
+    
+    A module-level function so that a process pool can run it for many chapters at once.
+    """
+    id_prefix = f"{namespace}:" if namespace else ""
+    chunks = []
+    
+    # Method 1: Extract by sections first
+    sections = extract_sections_from_chapter(chapter_content, chapter_title)
+    
+    chunk_counter = 1
+    for section in sections:
+        section_content = section['content']
         
-        chunk_counter = 1
-        for section in sections:
-            section_content = section['content']
+        if len(section_content.split()) <= chunk_size:
+            # Section is small enough, use as single chunk
+            chunks.append({
+                'chapter_title': chapter_title,
+                'section_number': section['section_number'],
+                'chunk_id': f"{id_prefix}{chapter_title.split()[-1]}-{section['section_number']}-{chunk_counter}",
+                'content': section_content,
+                'word_count': len(section_content.split()),
+                'chunk_type': 'section'
+            })
+            chunk_counter += 1
+        else:
+            # Section is too large, split into smaller chunks
+            text_chunks = chunk_text_by_size(section_content, chunk_size, overlap)
             
-            if len(section_content.split()) <= chunk_size:
-                # Section is small enough, use as single chunk
-                chunk = {
+            for j, text_chunk in enumerate(text_chunks):
+                chunks.append({
                     'chapter_title': chapter_title,
-                    'section_number': section['section_number'],
-                    'chunk_id': f"{chapter_title.split()[-1]}-{section['section_number']}-{chunk_counter}",
-                    'content': section_content,
-                    'word_count': len(section_content.split()),
-                    'chunk_type': 'section'
-                }
-                all_chunks.append(chunk)
+                    'section_number': f"{section['section_number']}-part{j+1}",
+                    'chunk_id': f"{id_prefix}{chapter_title.split()[-1]}-{section['section_number']}-{chunk_counter}",
+                    'content': text_chunk,
+                    'word_count': len(text_chunk.split()),
+                    'chunk_type': 'subsection'
+                })
                 chunk_counter += 1
-            else:
-                # Section is too large, split into smaller chunks
-                text_chunks = chunk_text_by_size(section_content, chunk_size, overlap)
-                
-                for j, text_chunk in enumerate(text_chunks):
-                    chunk = {
-                        'chapter_title': chapter_title,
-                        'section_number': f"{section['section_number']}-part{j+1}",
-                        'chunk_id': f"{chapter_title.split()[-1]}-{section['section_number']}-{chunk_counter}",
-                        'content': text_chunk,
-                        'word_count': len(text_chunk.split()),
-                        'chunk_type': 'subsection'
-                    }
-                    all_chunks.append(chunk)
-                    chunk_counter += 1
-        
-        start_index = next_chapter_start
+    
+    return chunks
+
+def chunk_markdown_advanced(markdown_file_path: str, chunk_size: int = 500, overlap: int = 50,
+                            detect_chapters: bool = False, namespace: str = "") -> List[Dict]:
+    """
+    Advanced chunking that creates smaller, more granular chunks
+    
+    Args:
+        markdown_file_path: Path to the markdown file
+        chunk_size: Target number of words per chunk
+        overlap: Number of words to overlap between chunks
+        detect_chapters: Find "# CHAPTER ..." headings in the file instead of using the 23 PPC chapters
+        namespace: Corpus namespace prefixed to chunk ids of statutes other than the PPC
+    
+    Returns:
+        List of chunk dictionaries
+    """
+    try:
+        with open(markdown_file_path, 'r', encoding='utf-8') as f:
+            markdown_text, _ = normalize_amendments(f.read())
+    except FileNotFoundError:
+        print(f"Error: The file '{markdown_file_path}' was not found.")
+        return []
 
+    all_chunks = []
+    for chapter_title, chapter_content in iter_chapters(markdown_text, detect_chapters):
+        all_chunks.extend(chunk_chapter(chapter_title, chapter_content, chunk_size, overlap, namespace))
     return all_chunks
 
 def create_weaviate_collection(client, collection_name: str = "PPC-2"):
@@ -223,6 +263,17 @@ def create_weaviate_collection(client, collection_name: str = "PPC-2"):
     print(f"Collection '{collection_name}' created successfully!")
     return collection
 
+def chunk_properties(chunk: Dict) -> Dict:
+    """Weaviate object properties of a chunk"""
+    return {
+        "chapter_title": chunk["chapter_title"],
+        "section_number": chunk["section_number"],
+        "chunk_id": chunk["chunk_id"],
+        "content": chunk["content"],
+        "word_count": chunk["word_count"],
+        "chunk_type": chunk["chunk_type"]
+    }
+
 def upload_chunks_to_weaviate(client, chunks: List[Dict], collection_name: str = "PPC-2", batch_size: int = 50):
     """Upload chunks to Weaviate collection with rate limiting"""
     
@@ -240,16 +291,7 @@ def upload_chunks_to_weaviate(client, chunks: List[Dict], collection_name: str =
         try:
             with collection.batch.dynamic() as batch_upload:
                 for chunk in batch:
-                    batch_upload.add_object(
-                        properties={
-                            "chapter_title": chunk["chapter_title"],
-                            "section_number": chunk["section_number"],
-                            "chunk_id": chunk["chunk_id"],
-                            "content": chunk["content"],
-                            "word_count": chunk["word_count"],
-                            "chunk_type": chunk["chunk_type"]
-                        }
-                    )
+                    batch_upload.add_object(properties=chunk_properties(chunk))
             
             print(f"✅ Uploaded batch {i//batch_size + 1} ({len(batch)} objects)")
             
@@ -267,16 +309,7 @@ def upload_chunks_to_weaviate(client, chunks: List[Dict], collection_name: str =
             try:
                 with collection.batch.dynamic() as batch_upload:
                     for chunk in batch:
-                        batch_upload.add_object(
-                            properties={
-                                "chapter_title": chunk["chapter_title"],
-                                "section_number": chunk["section_number"],
-                                "chunk_id": chunk["chunk_id"],
-                                "content": chunk["content"],
-                                "word_count": chunk["word_count"],
-                                "chunk_type": chunk["chunk_type"]
-                            }
-                        )
+                        batch_upload.add_object(properties=chunk_properties(chunk))
                 print(f"✅ Retry successful for batch {i//batch_size + 1}")
             except Exception as retry_error:
                 print(f"❌ Retry failed for batch {i//batch_size + 1}: {retry_error}")
@@ -289,12 +322,298 @@ def upload_chunks_to_weaviate(client, chunks: List[Dict], collection_name: str =
     except Exception as e:
         print(f"Warning: Could not verify total count: {e}")
 
-def main():
-    """Main function to process and upload PPC data"""
+_DONE = object()
+
+class StageStats:
+    """Items, busy time and backpressure of one ingest stage, shared across threads"""
+    
+    def __init__(self, name: str, unit: str, parallelism: int = 1):
+        self.name = name
+        self.unit = unit
+        self.parallelism = parallelism
+        self.items = 0
+        self.busy = 0.0     # Seconds spent working, summed over workers
+        self.blocked = 0.0  # Seconds spent waiting for room in the downstream queue
+        self._lock = threading.Lock()
+    
+    def record(self, items: int, busy: float = 0.0, blocked: float = 0.0):
+        with self._lock:
+            self.items += items
+            self.busy += busy
+            self.blocked += blocked
+    
+    def summary(self, wall_time: float) -> Dict:
+        """Throughput over the whole run and the share of the run the stage was working"""
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "unit": self.unit,
+            "throughput": self.items / wall_time if wall_time else 0.0,
+            "busy_s": self.busy,
+            "blocked_s": self.blocked,
+            "utilization": self.busy / (self.parallelism * wall_time) if wall_time else 0.0
+        }
+
+def _timed_chunk_chapter(args: Tuple) -> Tuple[List[Dict], float]:
+    """Process pool entry point: chunk one chapter and report the CPU time it took"""
+    start = time.perf_counter()
+    chunks = chunk_chapter(*args)
+    return chunks, time.perf_counter() - start
+
+def _put(out_queue: queue.Queue, item, stats: StageStats):
+    """Blocking put that records time spent waiting on a full queue as backpressure"""
+    start = time.perf_counter()
+    out_queue.put(item)
+    stats.record(0, blocked=time.perf_counter() - start)
+
+def produce_batches(markdown_text: str, batch_queue: queue.Queue, stats: Dict[str, StageStats],
+                    errors: List[Exception], chunk_size: int, overlap: int, detect_chapters: bool,
+                    namespace: str, workers: int, batch_size: int):
+    """
+    Parse and chunk stages: stream chapters from the generator into a process pool
+    and cut the chunks into upload batches, in file order
+    
+    At most 2 * workers chapters are in flight, and a full batch queue blocks this
+    thread, so a slow uploader throttles parsing and chunking instead of letting
+    chunks pile up in memory.
+    """
+    pending = deque()
+    batch = []
+    
+    def drain_one():
+        nonlocal batch
+        chunks, seconds = pending.popleft().result()
+        stats["chunk"].record(len(chunks), busy=seconds)
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                _put(batch_queue, batch, stats["chunk"])
+                batch = []
+    
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chapters = iter_chapters(markdown_text, detect_chapters)
+            while True:
+                start = time.perf_counter()
+                chapter = next(chapters, None)
+                if chapter is None:
+                    break
+                stats["parse"].record(1, busy=time.perf_counter() - start)
+                
+                pending.append(pool.submit(_timed_chunk_chapter, (*chapter, chunk_size, overlap, namespace)))
+                if len(pending) >= 2 * workers:
+                    drain_one()
+            while pending:
+                drain_one()
+        if batch:
+            _put(batch_queue, batch, stats["chunk"])
+    except Exception as e:
+        errors.append(e)
+    finally:
+        batch_queue.put(_DONE)
+
+async def upload_batch(collection, batch: List[Dict], semaphore: asyncio.Semaphore,
+                       stats: StageStats, failed: List[str]):
+    """Insert one batch, retrying on errors, and release its upload slot"""
+    start = time.perf_counter()
+    try:
+        for attempt in range(UPLOAD_RETRIES + 1):
+            try:
+                result = await collection.data.insert_many([chunk_properties(chunk) for chunk in batch])
+                failed.extend(batch[index]["chunk_id"] for index in result.errors)
+                break
+            except Exception as e:
+                if attempt == UPLOAD_RETRIES:
+                    print(f"❌ Batch starting at {batch[0]['chunk_id']} failed: {e}")
+                    failed.extend(chunk["chunk_id"] for chunk in batch)
+                else:
+                    await asyncio.sleep(UPLOAD_RETRY_DELAY * (attempt + 1))
+        stats.record(len(batch), busy=time.perf_counter() - start)
+    finally:
+        semaphore.release()
+
+async def upload_batches(batch_queue: queue.Queue, collection_name: str, stats: StageStats,
+                         concurrency: int, min_interval: float) -> List[str]:
+    """
+    Upload stage: keep up to `concurrency` batches in flight on the async Weaviate client
+    
+    Weaviate vectorizes the content with Cohere on insert, so this stage is both the
+    embedding and the storage step. min_interval spaces batch starts to stay under
+    the Cohere rate limit. Returns the ids of chunks that could not be stored.
+    """
+    client = weaviate.use_async_with_weaviate_cloud(
+        cluster_url=WEAVIATE_URL,
+        auth_credentials=Auth.api_key(WEAVIATE_API_KEY),
+        headers={"X-Cohere-Api-Key": COHERE_APIKEY}
+    )
+    await client.connect()
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    failed = []
+    last_start = 0.0
+    
+    try:
+        collection = client.collections.get(collection_name)
+        while True:
+            # Take a batch only once an upload slot is free, so the batch queue fills up behind us
+            await semaphore.acquire()
+            batch = await loop.run_in_executor(None, batch_queue.get)
+            if batch is _DONE:
+                semaphore.release()
+                break
+            
+            delay = last_start + min_interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            last_start = time.perf_counter()
+            
+            task = asyncio.create_task(upload_batch(collection, batch, semaphore, stats, failed))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        await asyncio.gather(*tasks)
+    finally:
+        await client.close()
+    return failed
+
+def report_progress(stats: Dict[str, StageStats], batch_queue: queue.Queue, start: float, stop: threading.Event):
+    """Print per-stage counts and throughput until the pipeline finishes"""
+    while not stop.wait(PROGRESS_INTERVAL):
+        elapsed = time.perf_counter() - start
+        stages = " | ".join(
+            f"{stage.name} {stage.items} {stage.unit} ({stage.items / elapsed:.1f}/s)" for stage in stats.values()
+        )
+        print(f"⏱️  {elapsed:6.1f}s | {stages} | queue {batch_queue.qsize()}/{batch_queue.maxsize}")
+
+def run_ingest_pipeline(markdown_file_path: str, collection_name: str, chunk_size: int = 500,
+                        overlap: int = 50, detect_chapters: bool = False, namespace: str = "",
+                        workers: int = INGEST_WORKERS, batch_size: int = 30,
+                        queue_size: int = INGEST_QUEUE_SIZE, concurrency: int = UPLOAD_CONCURRENCY,
+                        min_interval: float = 0.0) -> Dict:
+    """
+    Stream a statute into an existing collection: parse -> chunk -> embed/upload
+    
+    Parsing runs on a generator, chunking in a process pool and uploading on the
+    async Weaviate client. The stages overlap and are joined by a bounded queue, so
+    the run takes about as long as its slowest stage.
+    
+    Returns:
+        Dictionary with the wall time, per-stage statistics, the bottleneck stage
+        and the ids of chunks that failed to upload
+    """
+    with open(markdown_file_path, 'r', encoding='utf-8') as f:
+        markdown_text, _ = normalize_amendments(f.read())
+    
+    stats = {
+        "parse": StageStats("parse", "chapters"),
+        "chunk": StageStats("chunk", "chunks", workers),
+        "upload": StageStats("upload", "objects", concurrency)
+    }
+    batch_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+    start = time.perf_counter()
+    
+    producer = threading.Thread(
+        target=produce_batches,
+        args=(markdown_text, batch_queue, stats, errors, chunk_size, overlap, detect_chapters,
+              namespace, workers, batch_size),
+        daemon=True
+    )
+    stop = threading.Event()
+    reporter = threading.Thread(target=report_progress, args=(stats, batch_queue, start, stop), daemon=True)
+    producer.start()
+    reporter.start()
+    
+    try:
+        failed = asyncio.run(upload_batches(batch_queue, collection_name, stats["upload"], concurrency, min_interval))
+    finally:
+        stop.set()
+        # Unblock the producer if the uploader stopped early
+        while producer.is_alive():
+            try:
+                batch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        reporter.join()
+    
+    if errors:
+        raise errors[0]
+    
+    wall_time = time.perf_counter() - start
+    summaries = [stage.summary(wall_time) for stage in stats.values()]
+    return {
+        "wall_time": wall_time,
+        "stages": summaries,
+        "bottleneck": max(summaries, key=lambda summary: summary["utilization"])["stage"],
+        "failed": failed
+    }
+
+def record_snapshot_collection(snapshot: str, collection_name: str):
+    """Point an unpublished snapshot at the collection just ingested for it"""
+    if not snapshot:
+        return
+    from snapshots import set_collection
+    set_collection(snapshot, collection_name)
+    print(f"📸 Snapshot {snapshot} now serves '{collection_name}'; publish it with: python snapshots.py activate {snapshot}")
+
+def print_pipeline_summary(summary: Dict):
+    print(f"\n📊 Pipeline finished in {summary['wall_time']:.1f}s")
+    for stage in summary["stages"]:
+        print(f"   - {stage['stage']:<7} {stage['items']:>6} {stage['unit']:<9} "
+              f"{stage['throughput']:8.1f}/s   busy {stage['busy_s']:6.1f}s   "
+              f"utilization {stage['utilization']:5.1%}   blocked {stage['blocked_s']:5.1f}s")
+    print(f"🐢 Slowest stage: {summary['bottleneck']}")
+    if summary["failed"]:
+        print(f"❌ {len(summary['failed'])} chunks failed to upload, e.g. {', '.join(summary['failed'][:5])}")
+
+def snapshot_collection_name(collection_name: str, version: str) -> str:
+    """Name of the collection ingested for an index snapshot, e.g. PPC_2_20261019_101500_1a2b3c4d"""
+    return f"{collection_name}_{re.sub(r'[^0-9A-Za-z]', '_', version)}"
+
+def check_section_coverage(markdown_file_path: str = 'ppc.md', chunk_size: int = 300, overlap: int = 50) -> bool:
+    """
+    Chunk the PPC as the ingest does and check every chunk maps back to the sections it covers
+    
+    Chunks lose their line breaks, so this guards the search side's section lookup
+    (cross-references, fusion, digests) against changes to chunking or parsing.
+    """
+    from corpus import load_corpus, chunk_section_ids, section_ids_in_text
+    
+    corpus = load_corpus()
+    chunks = chunk_markdown_advanced(markdown_file_path, chunk_size, overlap)
+    unresolved = [chunk for chunk in chunks if not chunk_section_ids(chunk['content'], corpus)]
+    headings = set()
+    for chunk in chunks:
+        headings.update(section_ids_in_text(chunk['content'], corpus))
+    
+    print(f"📊 {len(chunks) - len(unresolved)}/{len(chunks)} chunks resolve to PPC sections")
+    print(f"📊 {len(headings)}/{len(corpus['sections_by_id'])} section headings found in chunk text")
+    for chunk in unresolved[:5]:
+        print(f"❌ {chunk['chunk_id']}: {chunk['content'][:100]}...")
+    return not unresolved and len(headings) == len(corpus['sections_by_id'])
+
+def main(namespace: str = PRIMARY_CORPUS, sequential: bool = False, workers: int = INGEST_WORKERS,
+         concurrency: int = UPLOAD_CONCURRENCY, min_interval: float = 0.0, snapshot: str = None):
+    """Main function to process and upload PPC data, or another registered statute"""
     
     # Configuration
     MARKDOWN_FILE_PATH = 'ppc.md'  # Update this path as needed
     COLLECTION_NAME = "PPC_2"
+    if namespace != PRIMARY_CORPUS:
+        corpus = load_corpora()[namespace]
+        MARKDOWN_FILE_PATH = corpus["file"]
+        COLLECTION_NAME = corpus["collection"]
+    if snapshot:
+        # A new collection per snapshot; the live one keeps serving until the snapshot is published
+        from snapshots import read_manifest
+        if namespace != PRIMARY_CORPUS:
+            print("❌ --snapshot only applies to the PPC collection")
+            return
+        if read_manifest(snapshot) is None:
+            print(f"❌ Snapshot {snapshot} does not exist; build it with build_indexes.py --no-activate")
+            return
+        COLLECTION_NAME = snapshot_collection_name(COLLECTION_NAME, snapshot)
     CHUNK_SIZE = 300  # Words per chunk (adjust as needed)
     OVERLAP = 50   # Word overlap between chunks
     
@@ -322,10 +641,34 @@ def main():
         print(f"\nProcessing markdown file: {MARKDOWN_FILE_PATH}")
         print(f"Chunk size: {CHUNK_SIZE} words, Overlap: {OVERLAP} words")
         
+        if not sequential:
+            create_weaviate_collection(client, COLLECTION_NAME)
+            print(f"🚀 Streaming ingest: {workers} chunking processes, {concurrency} concurrent uploads")
+            summary = run_ingest_pipeline(
+                MARKDOWN_FILE_PATH,
+                COLLECTION_NAME,
+                chunk_size=CHUNK_SIZE,
+                overlap=OVERLAP,
+                detect_chapters=namespace != PRIMARY_CORPUS,
+                namespace="" if namespace == PRIMARY_CORPUS else namespace,
+                workers=workers,
+                batch_size=30,
+                concurrency=concurrency,
+                min_interval=min_interval
+            )
+            print_pipeline_summary(summary)
+            
+            total_objects = client.collections.get(COLLECTION_NAME).aggregate.over_all(total_count=True).total_count
+            print(f"\n✅ Collection '{COLLECTION_NAME}' now holds {total_objects} objects")
+            record_snapshot_collection(snapshot, COLLECTION_NAME)
+            return
+        
         chunks = chunk_markdown_advanced(
             MARKDOWN_FILE_PATH, 
             chunk_size=CHUNK_SIZE, 
-            overlap=OVERLAP
+            overlap=OVERLAP,
+            detect_chapters=namespace != PRIMARY_CORPUS,
+            namespace="" if namespace == PRIMARY_CORPUS else namespace
         )
         
         if not chunks:
@@ -354,6 +697,7 @@ def main():
         upload_chunks_to_weaviate(client, chunks, COLLECTION_NAME, batch_size=30)  # Reduced batch size
         
         print(f"\n✅ Successfully uploaded {len(chunks)} chunks to '{COLLECTION_NAME}'!")
+        record_snapshot_collection(snapshot, COLLECTION_NAME)
         
     except Exception as e:
         print(f"❌ Error during processing: {e}")
@@ -363,4 +707,22 @@ def main():
         print("\n🔌 Disconnected from Weaviate")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chunk a statute and upload it to Weaviate")
+    parser.add_argument("--corpus", default=PRIMARY_CORPUS,
+                        help="Namespace of the statute to ingest, as registered in CORPORA_FILE")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Chunk everything first, then upload batch by batch (the old behaviour)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Chunking processes")
+    parser.add_argument("--concurrency", type=int, default=UPLOAD_CONCURRENCY,
+                        help="Upload batches in flight at once")
+    parser.add_argument("--min-interval", type=float, default=0.0,
+                        help="Minimum seconds between batch uploads, to respect embedding rate limits")
+    parser.add_argument("--snapshot",
+                        help="Ingest the PPC into a new collection for this unpublished index snapshot "
+                             "instead of replacing the live collection")
+    parser.add_argument("--check-sections", action="store_true",
+                        help="Only chunk the PPC and check every chunk maps back to its sections; no upload")
+    args = parser.parse_args()
+    if args.check_sections:
+        raise SystemExit(0 if check_section_coverage() else 1)
+    main(args.corpus, args.sequential, args.workers, args.concurrency, args.min_interval, args.snapshot)
@@ -0,0 +1,286 @@
+"""
+Encoder-sized windows for semantic reranking and chunk embeddings
+
+all-MiniLM-L12-v2 reads at most max_seq_length tokens and silently drops the
+rest, so word windows of DEFAULT_CHUNK_SIZE words are scored on their first few
+sentences while the whole text is still tokenized. Token windows measure length
+in the encoder's own tokenizer instead: text is split into sentences, sentences
+that are too long into clauses, and clauses that are too long into words, and
+these units are packed into windows that fit the encoder exactly.
+
+For reranking, each window is scored on its own. The passage handed to the LLM
+is the best window widened with its neighbouring units up to the old word
+budget, so the prompt keeps the same amount of context.
+
+Run this module directly to benchmark encode time and ranking quality of word
+and token windows.
+"""
+import re
+import time
+from typing import List, Dict, Tuple
+from sentence_transformers import util
+
+# Unit boundaries, from coarse to fine
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!])\s+(?=[A-Z(\d"\'])|\s*\n\s*')
+CLAUSE_BOUNDARY = re.compile(r'(?<=[;:,—])\s*(?=\S)|\s+(?=\((?:[ivx]+|[a-z]|\d+)\)\s)')
+WORD_BOUNDARY = re.compile(r'\s+')
+BOUNDARIES = [SENTENCE_BOUNDARY, CLAUSE_BOUNDARY, WORD_BOUNDARY]
+
+# Units without any word character (table rules, separators) are never put in a window
+WORD_CHARACTER = re.compile(r'\w')
+
+# Windows shorter than this many characters are not worth scoring
+MIN_WINDOW_CHARS = 30
+
+
+def encoder_token_budget(sentence_model) -> int:
+    """Tokens of text the encoder reads once its special tokens are added"""
+    return sentence_model.max_seq_length - sentence_model.tokenizer.num_special_tokens_to_add()
+
+
+def token_counts(tokenizer, texts: List[str]) -> List[int]:
+    """Number of tokenizer tokens in each text, without special tokens"""
+    if not texts:
+        return []
+    encoded = tokenizer(texts, add_special_tokens=False, verbose=False)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def _split(text: str, start: int, end: int, pattern: re.Pattern) -> List[Tuple[int, int]]:
+    """Split text[start:end] at the pattern's matches into whitespace-trimmed spans"""
+    cuts = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > position:
+            cuts.append((position, match.start()))
+        position = max(position, match.end())
+    cuts.append((position, end))
+
+    spans = []
+    for span_start, span_end in cuts:
+        piece = text[span_start:span_end]
+        if piece.strip():
+            leading = len(piece) - len(piece.lstrip())
+            trailing = len(piece) - len(piece.rstrip())
+            spans.append((span_start + leading, span_end - trailing))
+    return spans
+
+
+def split_units(text: str, tokenizer, max_tokens: int) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    Split text into units no longer than max_tokens, snapping to the coarsest boundary
+
+    Returns:
+        (spans, counts): character spans of the units in order and their token counts,
+        None for units that hold no words
+    """
+    spans = []
+    counts = []
+
+    def refine(pieces: List[Tuple[int, int]], level: int):
+        for span, count in zip(pieces, token_counts(tokenizer, [text[s:e] for s, e in pieces])):
+            if count > max_tokens and level < len(BOUNDARIES):
+                refine(_split(text, *span, BOUNDARIES[level]), level + 1)
+            else:
+                # A single word longer than the budget is left for the encoder to truncate,
+                # but one without any letters or digits breaks the windows instead
+                spans.append(span)
+                counts.append(count if WORD_CHARACTER.search(text, *span) else None)
+
+    refine(_split(text, 0, len(text), BOUNDARIES[0]), 1)
+    return spans, counts
+
+
+def pack_windows(counts: List[int], max_tokens: int, overlap_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Greedily pack consecutive units into windows of at most max_tokens
+
+    Each window after the first starts with the trailing units of the previous one
+    that fit in overlap_tokens. Units counted as None end a window and are skipped.
+    Returns (first unit, end unit) index pairs.
+    """
+    windows = []
+    start = 0
+    while start < len(counts):
+        if counts[start] is None:
+            start += 1
+            continue
+        end = start
+        total = 0
+        while end < len(counts) and counts[end] is not None and (end == start or total + counts[end] <= max_tokens):
+            total += counts[end]
+            end += 1
+        windows.append((start, end))
+        if end >= len(counts) or counts[end] is None:
+            start = end
+            continue
+
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + counts[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += counts[next_start]
+        start = next_start
+    return windows
+
+
+def token_window_spans(text: str, tokenizer, max_tokens: int, overlap_tokens: int) -> List[Tuple[int, int]]:
+    """Character spans of the encoder-sized windows of a text"""
+    spans, counts = split_units(text, tokenizer, max_tokens)
+    return [(spans[start][0], spans[end - 1][1]) for start, end in pack_windows(counts, max_tokens, overlap_tokens)]
+
+
+def word_windows(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """Overlapping windows of chunk_size words, the original reranker windowing"""
+    windows = []
+    words = text.split()
+    for i in range(0, len(words), chunk_size - overlap):
+        window = ' '.join(words[i:i + chunk_size])
+        if len(window.strip()) > MIN_WINDOW_CHARS:
+            windows.append(window)
+        if i + chunk_size >= len(words):
+            break
+    return windows
+
+
+def rerank_by_word_windows(sentence_model, query_embedding, texts: List[str], max_chunks: int,
+                           chunk_size: int, overlap: int) -> List[Dict]:
+    """Score word windows of the texts and return the best ones"""
+    windows = [(index, window) for index, text in enumerate(texts) for window in word_windows(text, chunk_size, overlap)]
+    if not windows:
+        return []
+
+    embeddings = sentence_model.encode([window for _, window in windows])
+    similarities = util.cos_sim(query_embedding, embeddings)[0]
+    return [
+        {'content': windows[idx][1], 'similarity_score': float(similarities[idx]), 'chunk_index': windows[idx][0]}
+        for idx in similarities.argsort(descending=True)[:max_chunks]
+    ]
+
+
+def _widen(text: str, spans: List[Tuple[int, int]], start: int, end: int, max_words: int) -> Tuple[int, int]:
+    """Grow a window by whole units on both sides while the passage stays within max_words"""
+    words = sum(len(text[s:e].split()) for s, e in spans[start:end])
+    grown = True
+    while grown:
+        grown = False
+        for candidate in (end, start - 1):
+            if 0 <= candidate < len(spans):
+                unit_words = len(text[spans[candidate][0]:spans[candidate][1]].split())
+                if words + unit_words <= max_words:
+                    words += unit_words
+                    start, end = min(start, candidate), max(end, candidate + 1)
+                    grown = True
+    return start, end
+
+
+def rerank_by_token_windows(sentence_model, query_embedding, texts: List[str], max_chunks: int,
+                            context_words: int, overlap_tokens: int) -> List[Dict]:
+    """
+    Score encoder-sized windows of the texts and return the passages around the best ones
+
+    Passages are the winning windows widened to at most context_words words. A window
+    whose passage overlaps one already chosen from the same text is skipped.
+    """
+    max_tokens = encoder_token_budget(sentence_model)
+    windows = []
+    units = []
+    for index, text in enumerate(texts):
+        spans, counts = split_units(text, sentence_model.tokenizer, max_tokens)
+        units.append(spans)
+        for start, end in pack_windows(counts, max_tokens, overlap_tokens):
+            if spans[end - 1][1] - spans[start][0] > MIN_WINDOW_CHARS:
+                windows.append((index, start, end))
+    if not windows:
+        return []
+
+    embeddings = sentence_model.encode([
+        texts[index][units[index][start][0]:units[index][end - 1][1]] for index, start, end in windows
+    ])
+    similarities = util.cos_sim(query_embedding, embeddings)[0]
+
+    passages = []
+    chosen = {}
+    for idx in similarities.argsort(descending=True):
+        index, start, end = windows[int(idx)]
+        start, end = _widen(texts[index], units[index], start, end, context_words)
+        if any(start < taken_end and taken_start < end for taken_start, taken_end in chosen.get(index, [])):
+            continue
+        chosen.setdefault(index, []).append((start, end))
+        passages.append({
+            'content': texts[index][units[index][start][0]:units[index][end - 1][1]],
+            'similarity_score': float(similarities[idx]),
+            'chunk_index': index
+        })
+        if len(passages) == max_chunks:
+            break
+    return passages
+
+
+def main(num_queries: int = 100, candidates: int = 8):
+    """Compare word and token windows on encode time and on finding the section a title names"""
+    import random
+    from sentence_transformers import SentenceTransformer
+    from corpus import load_corpus
+    from lexical_index import LexicalIndex
+    from config import (
+        SENTENCE_TRANSFORMER_MODEL, DEFAULT_MAX_CHUNKS, DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, RERANK_OVERLAP_TOKENS
+    )
+
+    print("="*60)
+    print("Reranker Windowing Benchmark")
+    print("="*60)
+
+    sentence_model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+    max_tokens = encoder_token_budget(sentence_model)
+    sections = {section['section_id']: section for section in load_corpus()['sections']}
+    lexical_index = LexicalIndex()
+
+    # Each query is a section title; the candidates are that section's text without
+    # its heading plus the sections BM25 ranks highest for the title
+    rng = random.Random(0)
+    long_sections = [section for section in sections.values() if len(section['content'].split()) > 60]
+    cases = []
+    for section in rng.sample(long_sections, min(num_queries, len(long_sections))):
+        others = [hit['section_id'] for hit in lexical_index.search(section['title'], candidates)
+                  if hit['section_id'] != section['section_id']][:candidates - 1]
+        texts = [section['content']] + [sections[section_id]['content'] for section_id in others]
+        order = list(range(len(texts)))
+        rng.shuffle(order)
+        cases.append((section['title'], [texts[i] for i in order], order.index(0)))
+
+    window_counts = token_counts(sentence_model.tokenizer, [
+        window for _, texts, _ in cases for text in texts
+        for window in word_windows(text, DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP)
+    ])
+    word_tokens = sum(window_counts)
+    read_tokens = sum(min(count, max_tokens) for count in window_counts)
+    print(f"📄 {len(cases)} queries x {candidates} candidate sections, encoder budget {max_tokens} tokens")
+    print(f"✂️  Word windows tokenize {word_tokens} tokens, of which the encoder reads {read_tokens} "
+          f"({read_tokens / word_tokens:.0%})\n")
+
+    query_embeddings = sentence_model.encode([title for title, _, _ in cases])
+    runs = {
+        "words": lambda q, texts: rerank_by_word_windows(
+            sentence_model, q, texts, DEFAULT_MAX_CHUNKS, DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP),
+        "tokens": lambda q, texts: rerank_by_token_windows(
+            sentence_model, q, texts, DEFAULT_MAX_CHUNKS, DEFAULT_CHUNK_SIZE, RERANK_OVERLAP_TOKENS)
+    }
+    for name, rerank in runs.items():
+        start = time.perf_counter()
+        results = [rerank(q, texts) for q, (_, texts, _) in zip(query_embeddings, cases)]
+        elapsed = time.perf_counter() - start
+
+        ranks = []
+        for result, (_, _, target) in zip(results, cases):
+            positions = [i for i, passage in enumerate(result) if passage['chunk_index'] == target]
+            ranks.append(positions[0] + 1 if positions else None)
+        hit_at_1 = sum(rank == 1 for rank in ranks) / len(ranks)
+        mrr = sum(1 / rank for rank in ranks if rank) / len(ranks)
+        context_words = sum(len(p['content'].split()) for result in results for p in result) / len(results)
+        print(f"📊 {name:<7} {elapsed / len(cases) * 1000:7.1f} ms/query   hit@1 {hit_at_1:.3f}   "
+              f"MRR@{DEFAULT_MAX_CHUNKS} {mrr:.3f}   context {context_words:6.0f} words")
+
+
+if __name__ == "__main__":
+    main()